@@ -1,6 +1,26 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from dj_react_chat.admin import ScalableAdminMixin
 
 from .models import Account
 
-admin.site.register(Account, UserAdmin)
+
+@admin.register(Account)
+class AccountAdmin(ScalableAdminMixin, UserAdmin):
+    """
+    ``UserAdmin`` for large account tables, also used by the member autocompletes.
+
+    The search matches the start of the username, looked up as a range on its unique
+    index, instead of ``LIKE '%term%'`` over the username, names and email.
+    """
+
+    search_fields = ["username"]
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return (
+            queryset.filter(username__gte=term, username__lt=term + "\U0010ffff"),
+            False,
+        )
@@ -0,0 +1,73 @@
+# dj_react_chat\account\authentication.py
+"""
+Signed stateless tokens for API clients that do not keep a session cookie.
+
+A token is ``Authorization: Token <token>``, where the token is signed with
+``SECRET_KEY`` and names the account plus a fingerprint of its session auth hash. No
+token is stored: changing the password (or ``SECRET_KEY``) revokes every token of the
+account, otherwise a token is valid for ``AUTH_TOKEN_MAX_AGE`` seconds. The account is
+read through the user cache, so a warm request runs no query.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .cache import get_user_cache
+
+TOKEN_SALT = "account.authentication.SignedTokenAuthentication"
+
+
+def fingerprint(user):
+    return user.get_session_auth_hash()[:16]
+
+
+def make_token(user):
+    """Return a signed token for ``user``, checked by ``SignedTokenAuthentication``."""
+    return signing.dumps({"u": user.pk, "h": fingerprint(user)}, salt=TOKEN_SALT)
+
+
+def token_max_age():
+    return getattr(settings, "AUTH_TOKEN_MAX_AGE", 3600)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    keyword = "Token"
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed("Invalid token header")
+
+        try:
+            payload = signing.loads(
+                header[1].decode(), salt=TOKEN_SALT, max_age=token_max_age()
+            )
+            user_id, user_fingerprint = payload["u"], payload["h"]
+        except (signing.BadSignature, UnicodeDecodeError, KeyError, TypeError):
+            raise AuthenticationFailed("Invalid or expired token")
+
+        user = self.get_user(user_id)
+        if user is None or not constant_time_compare(
+            user_fingerprint, fingerprint(user)
+        ):
+            raise AuthenticationFailed("Invalid or expired token")
+        return user, header[1].decode()
+
+    def get_user(self, user_id):
+        cache = get_user_cache()
+        key = f"token:{user_id}"
+        user = cache.get(key)
+        if user is None:
+            user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+            if user is not None:
+                cache.set(key, user)
+        return user
+
+    def authenticate_header(self, request):
+        return self.keyword
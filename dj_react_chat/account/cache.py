@@ -0,0 +1,156 @@
+# dj_react_chat\account\cache.py
+"""
+In-process cache of authenticated users, so a warm request resolves ``request.user``
+without querying ``account_account``.
+
+Sessions are cached by the ``cached_db`` session engine, ``cached_user`` then finds the
+user of a session here instead of in the database. An entry is only used while the
+session still names the same user with the same session auth hash, so a logout (the
+session is flushed) or a password change made through this session takes effect on the
+next request. Any save or delete of an account drops its entries in this process,
+other processes notice after at most ``AUTH_USER_CACHE_TTL`` seconds.
+
+Both caches are only enabled when the settings configure a shared cache (Redis),
+``AUTH_USER_CACHE_TTL = 0`` turns this one off.
+"""
+
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.utils.crypto import constant_time_compare
+
+
+class UserCache:
+    """
+    A thread-safe TTL cache of user instances, bounded to ``max_entries``.
+
+    Entries are stored under a key (a session key or a token key) and indexed by user,
+    so every entry of a user can be dropped at once. A copy of the cached user is
+    returned, requests never share an instance.
+
+    Attributes:
+        ttl (float): Seconds an entry is used for.
+        max_entries (int): The oldest entries are evicted beyond this size.
+    """
+
+    def __init__(self, ttl=30, max_entries=10_000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = {}  # key -> (user, expires), in insertion order
+        self.by_user = {}  # user id -> set of keys
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires <= self.clock():
+                self._discard(key)
+                return None
+        return copy.copy(user)
+
+    def set(self, key, user):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self._discard(key)
+            while len(self.entries) >= self.max_entries:
+                self._discard(next(iter(self.entries)))
+            self.entries[key] = (copy.copy(user), self.clock() + self.ttl)
+            self.by_user.setdefault(user.pk, set()).add(key)
+
+    def delete(self, key):
+        with self.lock:
+            self._discard(key)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for key in list(self.by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_user.clear()
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self.by_user.get(entry[0].pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_user[entry[0].pk]
+
+
+_user_cache = None
+
+
+def get_user_cache():
+    """Return the process-wide ``UserCache``, configured from the settings."""
+    global _user_cache
+    if _user_cache is None:
+        _user_cache = UserCache(
+            ttl=getattr(settings, "AUTH_USER_CACHE_TTL", 30),
+            max_entries=getattr(settings, "AUTH_USER_CACHE_MAX_ENTRIES", 10_000),
+        )
+    return _user_cache
+
+
+def session_key(session):
+    return f"session:{session.session_key}"
+
+
+def _matches(user, user_id, session_hash):
+    # A login cycles the session key, so the backend of an entry cannot change.
+    return (
+        user is not None
+        and str(user.pk) == str(user_id)
+        and bool(session_hash)
+        and constant_time_compare(session_hash, user.get_session_auth_hash())
+    )
+
+
+def cached_user(request):
+    """
+    Return the user of the request's session, from the cache when possible.
+
+    Falls back to ``django.contrib.auth.get_user``, which also verifies the session
+    hash and flushes sessions that no longer match, and caches what it returns.
+    """
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    if user_id is None:
+        return auth.get_user(request)
+    cache = get_user_cache()
+    user = cache.get(session_key(session))
+    if _matches(user, user_id, session.get(HASH_SESSION_KEY)):
+        return user
+    user = auth.get_user(request)
+    if user.is_authenticated and session.session_key:
+        cache.set(session_key(session), user)
+    return user
+
+
+async def acached_user(request):
+    """Async version of ``cached_user``, a cache hit does not leave the event loop."""
+    session = request.session
+    user_id = await session.aget(SESSION_KEY)
+    if user_id is None:
+        return await auth.aget_user(request)
+    cache = get_user_cache()
+    user = cache.get(session_key(session))
+    if _matches(user, user_id, await session.aget(HASH_SESSION_KEY)):
+        return user
+    user = await auth.aget_user(request)
+    if user.is_authenticated and session.session_key:
+        cache.set(session_key(session), user)
+    return user
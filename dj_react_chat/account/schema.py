@@ -0,0 +1,26 @@
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from drf_spectacular.utils import extend_schema, OpenApiResponse
+from .serializer import TokenRequestSerializer, TokenSerializer
+
+token_docs = extend_schema(
+    request=TokenRequestSerializer,
+    responses={
+        200: TokenSerializer,
+        403: OpenApiResponse(description="Missing or wrong credentials"),
+    },
+)
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """Documents ``SignedTokenAuthentication``, registered by being imported."""
+
+    target_class = "account.authentication.SignedTokenAuthentication"
+    name = "signedToken"
+
+    def get_security_definition(self, auto_schema):
+        return {
+            "type": "apiKey",
+            "in": "header",
+            "name": "Authorization",
+            "description": "Token from /api/v1/account/token/, as 'Token <token>'",
+        }
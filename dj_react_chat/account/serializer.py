@@ -0,0 +1,27 @@
+from rest_framework import serializers
+
+
+class TokenRequestSerializer(serializers.Serializer):
+    """Serializer for the credentials exchanged for a token.
+
+    Both fields may be left out by a client that is already logged in with a session.
+
+    Attributes:
+        username: The username of the account.
+        password: Its password.
+    """
+
+    username = serializers.CharField(required=False)
+    password = serializers.CharField(required=False, style={"input_type": "password"})
+
+
+class TokenSerializer(serializers.Serializer):
+    """Serializer for an issued token.
+
+    Attributes:
+        token: The value of the ``Authorization: Token <token>`` header.
+        expires_in: Seconds until the token expires.
+    """
+
+    token = serializers.CharField()
+    expires_in = serializers.IntegerField()
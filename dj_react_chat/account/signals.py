@@ -0,0 +1,25 @@
+# dj_react_chat\account\signals.py
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import get_user_cache, session_key
+
+
+###########################
+# Cached users
+###########################
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_account(sender, instance, **kwargs):
+    """A saved account may have a new password or lost its access, reload it."""
+    get_user_cache().delete_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_session(sender, request, user, **kwargs):
+    session = getattr(request, "session", None)
+    if session is not None and session.session_key:
+        get_user_cache().delete(session_key(session))
@@ -1,3 +1,177 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model, update_session_auth_hash
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import override_settings
 
-# Create your tests here.
+from server.cache import get_cache
+
+from . import cache as account_cache
+from .authentication import make_token
+from .cache import UserCache
+
+SERVER_SELECT_URL = "/api/v1/server/select/"
+TOKEN_URL = "/api/v1/account/token/"
+
+# The settings used with a shared (Redis) cache, where sessions and users are cached.
+shared_cache_settings = override_settings(
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    AUTH_USER_CACHE_TTL=30,
+)
+
+
+class FakeUser:
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class UserCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = UserCache(ttl=10, max_entries=2, clock=lambda: self.now)
+
+    def test_entries_expire(self):
+        self.cache.set("a", FakeUser(1))
+        self.now = 9.9
+        self.assertEqual(self.cache.get("a").pk, 1)
+        self.now = 10
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_returns_copies(self):
+        self.cache.set("a", FakeUser(1))
+        self.cache.get("a").pk = 2
+        self.assertEqual(self.cache.get("a").pk, 1)
+
+    def test_oldest_entry_is_evicted(self):
+        for key in ("a", "b", "c"):
+            self.cache.set(key, FakeUser(1))
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_delete_user(self):
+        self.cache.set("a", FakeUser(1))
+        self.cache.set("b", FakeUser(1))
+        self.cache.set("c", FakeUser(2))
+        self.cache.delete_user(1)
+        self.assertEqual(list(self.cache.entries), ["c"])
+        self.assertEqual(list(self.cache.by_user), [2])
+
+
+@shared_cache_settings
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        account_cache._user_cache = None
+        self.user = get_user_model().objects.create_user(username="u", password="pw")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get_by_user(self, client=None):
+        return (client or self.client).get(SERVER_SELECT_URL, {"by_user": "true"})
+
+    def test_warm_request_runs_no_auth_query(self):
+        # user, ETag aggregate, servers (the session was cached by the login)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get_by_user().status_code, 200)
+        # everything, listing included, is served from the caches
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_by_user().status_code, 200)
+
+    def test_not_cached_without_a_shared_cache(self):
+        account_cache._user_cache = None
+        with override_settings(
+            SESSION_ENGINE="django.contrib.sessions.backends.db",
+            AUTH_USER_CACHE_TTL=0,
+        ):
+            client = Client()
+            client.force_login(self.user)
+            self.get_by_user(client)
+            # session and user are read from the database on every request
+            with self.assertNumQueries(2):
+                self.assertEqual(self.get_by_user(client).status_code, 200)
+        account_cache._user_cache = None
+
+    def test_logout(self):
+        self.get_by_user()
+        cookies = self.client.cookies
+        self.client.logout()
+        other = Client()
+        other.cookies = cookies
+        self.assertEqual(self.get_by_user(other).status_code, 403)
+
+    def test_password_changed_elsewhere(self):
+        self.get_by_user()
+        self.user.set_password("new")
+        self.user.save()
+        self.assertEqual(self.get_by_user().status_code, 403)
+
+    def test_password_changed_in_this_session(self):
+        self.get_by_user()
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.session = self.client.session
+        self.user.set_password("new")
+        self.user.save()
+        update_session_auth_hash(request, self.user)
+        request.session.save()
+        self.client.cookies["sessionid"] = request.session.session_key
+        self.assertEqual(self.get_by_user().status_code, 200)
+
+
+@shared_cache_settings
+class SignedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        account_cache._user_cache = None
+        self.user = get_user_model().objects.create_user(username="u", password="pw")
+        self.client = Client()
+
+    def get_by_user(self, token):
+        return self.client.get(
+            SERVER_SELECT_URL, {"by_user": "true"}, HTTP_AUTHORIZATION=f"Token {token}"
+        )
+
+    def test_issue_with_credentials(self):
+        response = self.client.post(TOKEN_URL, {"username": "u", "password": "pw"})
+        self.assertEqual(response.status_code, 200)
+        token = response.json()["token"]
+        self.assertEqual(self.get_by_user(token).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_by_user(token).status_code, 200)
+
+    def test_wrong_credentials(self):
+        response = self.client.post(TOKEN_URL, {"username": "u", "password": "no"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_issue_for_session(self):
+        self.client.force_login(self.user)
+        response = self.client.post(TOKEN_URL)
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_cannot_issue_tokens(self):
+        token = make_token(self.user)
+        response = self.client.post(TOKEN_URL, HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.status_code, 403)
+
+    def test_async_listing(self):
+        url = "/api/v1/server/select-async/"
+        token = make_token(self.user)
+        response = self.client.get(
+            url, {"by_user": "true"}, HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            url, {"by_user": "true"}, HTTP_AUTHORIZATION=f"Token {token}x"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_password_change_revokes(self):
+        token = make_token(self.user)
+        self.assertEqual(self.get_by_user(token).status_code, 200)
+        self.user.set_password("new")
+        self.user.save()
+        self.assertEqual(self.get_by_user(token).status_code, 403)
+
+    def test_tampered_and_expired(self):
+        token = make_token(self.user)
+        self.assertEqual(self.get_by_user(token + "x").status_code, 403)
+        with override_settings(AUTH_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.get_by_user(token).status_code, 403)
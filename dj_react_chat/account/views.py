@@ -1 +1,54 @@
-from django.shortcuts import render
+# dj_react_chat\account\views.py
+
+from django.contrib.auth import authenticate
+from rest_framework import viewsets
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from .authentication import make_token, token_max_age
+from .schema import token_docs
+from .serializer import TokenRequestSerializer, TokenSerializer
+
+
+class TokenViewSet(viewsets.ViewSet):
+    """
+    **TokenViewSet**
+
+    A Django REST Framework ViewSet issuing signed stateless tokens.
+
+    ### Methods:
+    - `create(request)`: Returns a token for the logged in user or for the given credentials.
+    """
+
+    @token_docs
+    def create(self, request):
+        """
+        **Issues a token for `Authorization: Token <token>`.**
+
+        Tokens are not stored, they expire after `AUTH_TOKEN_MAX_AGE` seconds and are
+        revoked by changing the password. A token cannot be used to issue another one,
+        which would extend it forever: only a session or the credentials can.
+
+        ### Request Body:
+        - `username` **(str, optional)**: Required unless logged in with a session.
+        - `password` **(str, optional)**: Required unless logged in with a session.
+
+        ### Raises:
+        - **AuthenticationFailed**: Raised for missing or wrong credentials.
+
+        ### Returns:
+        - **Response**: `{"token": <token>, "expires_in": <seconds>}`
+        """
+        user = request.user
+        if not isinstance(request.successful_authenticator, SessionAuthentication):
+            credentials = TokenRequestSerializer(data=request.data)
+            credentials.is_valid(raise_exception=True)
+            user = authenticate(
+                request,
+                username=credentials.validated_data.get("username"),
+                password=credentials.validated_data.get("password"),
+            )
+            if user is None:
+                raise AuthenticationFailed("Invalid username or password")
+        token = {"token": make_token(user), "expires_in": token_max_age()}
+        return Response(TokenSerializer(token).data)
@@ -0,0 +1,194 @@
+"""
+Mixed read/write throughput of the database profiles.
+
+Runs reader and writer threads, each with its own connection, against a file database
+for a fixed duration. Readers run the server list and search queries, writers create
+channels and rename servers, which also fires the cache, ETag and search index
+signals. Reports operations per second, latency percentiles and lock errors.
+
+Each profile runs in a fresh subprocess because the database settings are read once
+at startup:
+
+- ``sqlite-plain``: SQLite with its default rollback journal and no pragmas
+- ``sqlite``: the tuned SQLite profile (WAL, pragmas, immediate transactions)
+- ``postgres``: the pooled PostgreSQL profile, skipped when it cannot connect
+
+Usage (from the dj_react_chat directory):
+
+    python -m benchmarks.db_mixed --readers 8 --writers 2 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .utils import percentiles, report, setup_django, test_database
+
+PROFILES = ["sqlite-plain", "sqlite", "postgres"]
+
+
+def seed(servers):
+    from django.contrib.auth import get_user_model
+    from server.models import Category, Server
+
+    owner = get_user_model().objects.create(username="bench")
+    categories = [Category.objects.create(name=f"bench{i}") for i in range(5)]
+    return [
+        Server.objects.create(
+            name=f"server {i}", owner=owner, category=categories[i % 5]
+        ).pk
+        for i in range(servers)
+    ], owner.pk
+
+
+def read(server_ids, owner_id):
+    from server.models import Server
+    from server.search import search
+
+    if random.random() < 0.5:
+        list(Server.objects.filter(category__name="bench1").values("id", "name")[:50])
+    else:
+        search(f"server {random.randrange(100)}")
+
+
+def write(server_ids, owner_id):
+    from django.db import transaction
+    from server.models import Channel, Server
+
+    with transaction.atomic():
+        server = Server.objects.get(pk=random.choice(server_ids))
+        server.name = f"server {random.randrange(10_000)}"
+        server.save()
+        Channel.objects.create(
+            name="bench", topic="bench", owner_id=owner_id, server=server
+        )
+
+
+def worker(operation, args, deadline, samples, errors):
+    from django.db import OperationalError, connection
+
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(*args)
+            except OperationalError as exc:
+                errors.append(str(exc))
+                continue
+            samples.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+
+
+def run_profile(readers, writers, seconds, servers):
+    """Run the workload on the configured database, in this process."""
+    from django.db import connection
+
+    server_ids, owner_id = seed(servers)
+    connection.close()
+
+    results = {}
+    threads = []
+    deadline = time.perf_counter() + seconds
+    for kind, operation, count in (
+        ("read", read, readers),
+        ("write", write, writers),
+    ):
+        results[kind] = {"samples": [], "errors": []}
+        for _ in range(count):
+            threads.append(
+                threading.Thread(
+                    target=worker,
+                    args=(
+                        operation,
+                        (server_ids, owner_id),
+                        deadline,
+                        results[kind]["samples"],
+                        results[kind]["errors"],
+                    ),
+                )
+            )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        kind: {
+            "ops": len(result["samples"]),
+            "ops_per_second": round(len(result["samples"]) / seconds, 1),
+            "errors": len(result["errors"]),
+            "latency": percentiles(result["samples"]),
+        }
+        for kind, result in results.items()
+    }
+
+
+def child(profile, args):
+    """Entry point of the subprocess running one profile."""
+    if profile == "sqlite-plain":
+        os.environ["DATABASE_PROFILE"] = "sqlite"
+    else:
+        os.environ["DATABASE_PROFILE"] = profile
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    if profile == "sqlite-plain":
+        # Undo the tuning: rollback journal, full sync, deferred transactions.
+        settings.SQLITE_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+        settings.DATABASES["default"]["OPTIONS"] = {}
+
+    if profile.startswith("sqlite"):
+        # A file database, the test runner would use an in-memory one.
+        call_command("migrate", verbosity=0)
+        return run_profile(args.readers, args.writers, args.seconds, args.servers)
+    with test_database():
+        return run_profile(args.readers, args.writers, args.seconds, args.servers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--servers", type=int, default=200)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=PROFILES)
+    parser.add_argument("--child", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(child(args.child, args), sys.stdout)
+        return
+
+    results = {
+        "benchmark": "db_mixed",
+        "readers": args.readers,
+        "writers": args.writers,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in args.profiles:
+            env = dict(os.environ, SQLITE_NAME=os.path.join(directory, f"{profile}.db"))
+            process = subprocess.run(
+                [sys.executable, "-m", "benchmarks.db_mixed", "--child", profile]
+                + sys.argv[1:],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if process.returncode:
+                error = process.stderr.strip().splitlines()
+                results[profile] = {"skipped": error[-1] if error else "failed"}
+            else:
+                results[profile] = json.loads(process.stdout)
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Microbenchmark of the server list serializers.
+
+Seeds servers with members and channels, then times loading and rendering the whole
+list to JSON with the DRF ``ServerSerializer`` (prefetching model instances) and with
+``ServerRowSerializer`` (``.values()`` rows), checking that both render the same bytes.
+
+Usage (from the dj_react_chat directory):
+
+    python -m benchmarks.serializers --servers 1000 10000
+"""
+
+import argparse
+import time
+
+from .utils import percentiles, report, setup_django, test_database
+
+
+def seed(servers, members_per_server, channels_per_server):
+    from django.contrib.auth import get_user_model
+    from server.models import Category, Channel, Server
+
+    Account = get_user_model()
+    Membership = Server.members.through
+    owner, _ = Account.objects.get_or_create(username="bench-owner")
+    Account.objects.bulk_create(
+        [Account(username=f"bench{i}") for i in range(members_per_server)],
+        ignore_conflicts=True,
+    )
+    accounts = Account.objects.filter(username__regex=r"^bench\d+$")
+    category, _ = Category.objects.get_or_create(name="bench")
+    created = Server.objects.bulk_create(
+        [
+            Server(
+                name=f"server {i}",
+                description=f"description {i}" if i % 2 else None,
+                owner=owner,
+                category=category,
+                member_count=members_per_server,
+            )
+            for i in range(Server.objects.count(), servers)
+        ],
+        batch_size=1000,
+    )
+    Membership.objects.bulk_create(
+        [
+            Membership(server_id=server.id, account_id=account.id)
+            for server in created
+            for account in accounts
+        ],
+        batch_size=5000,
+    )
+    Channel.objects.bulk_create(
+        [
+            Channel(name=f"channel {c}", topic="topic", owner=owner, server=server)
+            for server in created
+            for c in range(channels_per_server)
+        ],
+        batch_size=5000,
+    )
+
+
+def measure(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = function()
+        samples.append(time.perf_counter() - started)
+    return output, percentiles(samples)
+
+
+def run(repeat):
+    from rest_framework.renderers import JSONRenderer
+    from server.models import Server
+    from server.query import ServerQueryPlan
+    from server.row_serializer import ServerRowSerializer
+    from server.serializer import ServerSerializer
+
+    renderer = JSONRenderer()
+    queryset = Server.objects.order_by("id")
+
+    def drf():
+        servers = ServerQueryPlan().apply(queryset)
+        data = ServerSerializer(servers, many=True, context={"num_members": True}).data
+        return renderer.render(data)
+
+    def rows():
+        serializer = ServerRowSerializer(num_members=True)
+        values = list(serializer.values(queryset))
+        return renderer.render(serializer.load(values))
+
+    drf_output, drf_latency = measure(drf, repeat)
+    rows_output, rows_latency = measure(rows, repeat)
+    assert drf_output == rows_output, "ServerRowSerializer output differs"
+    return {
+        "bytes": len(rows_output),
+        "server_serializer": drf_latency,
+        "row_serializer": rows_latency,
+        "speedup_p50": round(drf_latency["p50_ms"] / rows_latency["p50_ms"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--servers", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--members", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    results = {"benchmark": "serializers", "runs": []}
+    with test_database():
+        # Grow the same tables to each size in turn.
+        for servers in sorted(args.servers):
+            seed(servers, args.members, args.channels)
+            results["runs"].append({"servers": servers, **run(args.repeat)})
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
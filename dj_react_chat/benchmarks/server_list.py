@@ -0,0 +1,136 @@
+"""
+Load test comparing the sync and async server list routes under ASGI.
+
+Seeds servers with members and channels, then drives ``/api/v1/server/select/`` (DRF,
+run by the ASGI handler in a worker thread) and ``/api/v1/server/select-async/``
+(native async view) with the same query parameters from many concurrent clients, and
+reports requests per second and latency percentiles for each.
+
+The listing cache is replaced by a dummy cache unless ``--cached`` is given, so every
+request reaches the database. ``--without-metrics`` removes ``MetricsMiddleware`` to
+measure the cost of the instrumentation.
+
+Usage (from the dj_react_chat directory):
+
+    python -m benchmarks.server_list --servers 200 --concurrency 50 --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from .utils import percentiles, report, setup_django, test_database
+
+ROUTES = {
+    "sync": "/api/v1/server/select/",
+    "async": "/api/v1/server/select-async/",
+}
+
+PARAMS = [
+    {"category": "bench 0", "with_num_members": "true"},
+    {"qty": "20"},
+    {"page_size": "20", "ordering": "-num_members"},
+]
+
+
+def seed(servers, members, channels):
+    from django.contrib.auth import get_user_model
+    from server.models import Category, Channel, Server
+
+    Account = get_user_model()
+    accounts = Account.objects.bulk_create(
+        [Account(username=f"bench{i}") for i in range(members)]
+    )
+    categories = [Category.objects.create(name=f"bench {i}") for i in range(5)]
+    for i in range(servers):
+        server = Server.objects.create(
+            name=f"server {i}",
+            owner=accounts[0],
+            category=categories[i % len(categories)],
+        )
+        server.members.add(*accounts[: 1 + i % members])
+        Channel.objects.bulk_create(
+            [
+                Channel(name=f"channel {c}", owner=accounts[0], server=server)
+                for c in range(channels)
+            ]
+        )
+
+
+async def load(client, url, params, concurrency, requests):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for n in remaining:
+            sent = time.perf_counter()
+            response = await client.get(url, params[n % len(params)])
+            assert response.status_code == 200, response.content
+            latencies.append(time.perf_counter() - sent)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "requests_per_second": round(requests / seconds, 1),
+        "latency": percentiles(latencies),
+    }
+
+
+def run(concurrency, requests):
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncClient
+
+    results = {}
+    for name, url in ROUTES.items():
+        client = AsyncClient()
+        # Warm up connections and imports before measuring.
+        async_to_sync(load)(client, url, PARAMS, concurrency, len(PARAMS))
+        results[name] = async_to_sync(load)(client, url, PARAMS, concurrency, requests)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--servers", type=int, default=200)
+    parser.add_argument("--members", type=int, default=20)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--cached", action="store_true")
+    parser.add_argument("--without-metrics", action="store_true")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    overrides = {}
+    if not args.cached:
+        overrides["CACHES"] = {
+            "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        }
+    if args.without_metrics:
+        overrides["MIDDLEWARE"] = [
+            name
+            for name in settings.MIDDLEWARE
+            if not name.endswith("MetricsMiddleware")
+        ]
+    with test_database(), override_settings(**overrides):
+        seed(args.servers, args.members, args.channels)
+        routes = run(args.concurrency, args.requests)
+    report(
+        {
+            "benchmark": "server_list",
+            "servers": args.servers,
+            "concurrency": args.concurrency,
+            "cached": args.cached,
+            "metrics": not args.without_metrics,
+            "routes": routes,
+        }
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Benchmark suite of the server list, the admin changelists and model saves.
+
+Seeds synthetic data with ``server.seed.seed_bench`` (the code behind ``manage.py
+seed_bench``), then runs every scenario sequentially with the Django test client:
+
+- ``list ...``: every combination of the ``ServerListViewSet`` query parameters
+- ``admin ...``: the admin changelists, with and without a search
+- ``save ...``: saving servers, categories and channels, adding and removing members
+  through the m2m manager and in bulk
+
+Each scenario reports throughput, p50/p95/p99 latency and the number of SQL queries
+of one run. ``--baseline`` compares against a previous report and exits with status 1
+when a scenario got slower than ``--tolerance`` allows or runs more queries.
+
+The listing cache is replaced by a dummy cache unless ``--cached`` is given. With
+``--existing`` the configured database is used as is, seeded beforehand with
+``manage.py seed_bench``, instead of a throwaway test database. The save scenarios
+write to it.
+
+Usage (from the dj_react_chat directory):
+
+    python -m benchmarks.suite --servers 1000 --repeat 30 --output run.json
+    python -m benchmarks.suite --baseline run.json
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+from .utils import percentiles, report, setup_django, test_database
+
+FILTERS = ["category", "by_user", "by_server_id"]
+MODES = {
+    "all": {},
+    "qty": {"qty": "20"},
+    "page": {"page_size": "20"},
+    "page-popular": {"page_size": "20", "ordering": "-num_members"},
+    "sparse": {"fields": "id,name"},
+}
+ADMIN_MODELS = ["server/server", "server/category", "server/channel", "account/account"]
+
+
+def measure(function, repeat):
+    """Run ``function`` once to count its queries, then ``repeat`` timed times."""
+    from django.db import connection
+
+    # CaptureQueriesContext would lose the queries, requests reset connection.queries.
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        function()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        sent = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - sent)
+    seconds = time.perf_counter() - started
+    return {
+        "runs": repeat,
+        "throughput_per_second": round(repeat / seconds, 1),
+        **percentiles(samples),
+        "queries": len(queries),
+    }
+
+
+def get(client, url, params=None):
+    def request():
+        response = client.get(url, params or {})
+        assert response.status_code == 200, (url, params, response.status_code)
+
+    return request
+
+
+###########################
+# Scenarios
+###########################
+def list_scenarios(client, category, server_id):
+    values = {"category": category, "by_user": "true", "by_server_id": server_id}
+    for count in range(len(FILTERS) + 1):
+        for names, num_members, (mode, extra) in itertools.product(
+            itertools.combinations(FILTERS, count), [False, True], MODES.items()
+        ):
+            params = {name: values[name] for name in names}
+            params.update(extra)
+            if num_members:
+                params["with_num_members"] = "true"
+            label = "+".join(names) or "unfiltered"
+            label += f" {mode}" + (" num_members" if num_members else "")
+            yield f"list {label}", get(client, "/api/v1/server/select/", params)
+
+
+def admin_scenarios(client):
+    for model in ADMIN_MODELS:
+        url = f"/admin/{model}/"
+        yield f"admin {model}", get(client, url)
+        yield f"admin {model} search", get(client, url, {"q": "bench 1"})
+
+
+def save_scenarios(server, category, account_ids):
+    from server.members import bulk_join, bulk_leave
+    from server.models import Channel
+
+    def save_server():
+        server.name = f"bench server {time.perf_counter_ns()}"
+        server.save()
+
+    def save_category():
+        category.description = f"description {time.perf_counter_ns()}"
+        category.save()
+
+    def create_channel():
+        Channel.objects.create(
+            name="bench", topic="bench", owner_id=server.owner_id, server=server
+        )
+
+    def add_remove_members():
+        server.members.add(*account_ids)
+        server.members.remove(*account_ids)
+
+    def bulk_join_leave_members():
+        bulk_join(server, account_ids)
+        bulk_leave(server, account_ids)
+
+    yield "save server", save_server
+    yield "save category", save_category
+    yield "save channel (create)", create_channel
+    yield "save members (add + remove)", add_remove_members
+    yield "save members (bulk join + leave)", bulk_join_leave_members
+
+
+def run(args):
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count
+    from django.test import Client
+    from server.models import Server
+    from server.seed import seed_bench
+
+    seeded = None
+    if not args.existing:
+        seeded = seed_bench(
+            accounts=args.accounts,
+            categories=args.categories,
+            servers=args.servers,
+            channels=args.channels,
+            max_members=args.max_members,
+            skew=args.skew,
+        )
+
+    Account = get_user_model()
+    admin, _ = Account.objects.get_or_create(
+        username="bench-admin", defaults={"is_staff": True, "is_superuser": True}
+    )
+    server = Server.objects.order_by("-member_count", "pk").first()
+    category = server.category
+    # The busiest member of that server, so by_user listings return the most servers
+    # and by_user + by_server_id finds it.
+    Membership = Server.members.through
+    busiest = (
+        Membership.objects.filter(account__server_members=server)
+        .values("account_id")
+        .annotate(n=Count("id"))
+        .order_by("-n", "account_id")
+        .first()
+    )
+    member = Account.objects.get(pk=busiest["account_id"])
+    outsiders = list(
+        Account.objects.exclude(server_members=server).values_list("pk", flat=True)[:10]
+    )
+
+    member_client, admin_client = Client(), Client()
+    member_client.force_login(member)
+    admin_client.force_login(admin)
+
+    scenarios = itertools.chain(
+        list_scenarios(member_client, category.name, server.pk),
+        admin_scenarios(admin_client),
+        save_scenarios(server, category, outsiders),
+    )
+    results = {}
+    for name, function in scenarios:
+        if args.only and not any(part in name for part in args.only):
+            continue
+        results[name] = measure(function, args.repeat)
+        print(f"{name}: {results[name]['p50_ms']} ms", file=sys.stderr)
+    return seeded, results
+
+
+def compare(results, baseline, tolerance):
+    """Return the scenarios that got slower (p95) or run more queries than before."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["queries"] > before["queries"]:
+            regressions.append(
+                f"{name}: {before['queries']} -> {result['queries']} queries"
+            )
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']} -> {result['p95_ms']} ms"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--servers", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--max-members", type=int, default=500)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--only", nargs="+", help="Only run scenarios containing one of these."
+    )
+    parser.add_argument("--cached", action="store_true")
+    parser.add_argument("--existing", action="store_true")
+    parser.add_argument("--output", help="Also write the report to this file.")
+    parser.add_argument("--baseline", help="A previous report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import (
+        override_settings,
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    overrides = {}
+    if not args.cached:
+        overrides["CACHES"] = {
+            "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        }
+    database = nullcontext() if args.existing else test_database()
+    if args.existing:
+        # Lets the test client through ALLOWED_HOSTS, test_database() does it too.
+        setup_test_environment()
+    try:
+        with database, override_settings(**overrides):
+            seeded, scenarios = run(args)
+    finally:
+        if args.existing:
+            teardown_test_environment()
+
+    results = {
+        "benchmark": "suite",
+        "cached": args.cached,
+        "repeat": args.repeat,
+        "seeded": seeded,
+        "scenarios": scenarios,
+    }
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["scenarios"]
+        results["regressions"] = compare(scenarios, baseline, args.tolerance)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    report(results)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# dj_react_chat\benchmarks\utils.py
+
+import json
+import os
+import statistics
+import sys
+from contextlib import contextmanager
+
+
+def setup_django():
+    """Configure Django for a standalone benchmark script."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dj_react_chat.settings")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """
+    Create a throwaway test database for the duration of a benchmark.
+
+    The database is built from the migrations exactly like ``manage.py test`` does, so
+    benchmarks never touch ``db.sqlite3``.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentiles(samples):
+    """Return p50/p95/p99 and max of a list of latencies in seconds, as milliseconds."""
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        ordered = ordered * 2
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def report(results):
+    """Print benchmark results as JSON on stdout."""
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
@@ -0,0 +1,117 @@
+"""
+Load test for the webchat fan-out engine on a single worker.
+
+Connects thousands of WebSocket clients to ``ChatConsumer`` in one process and event
+loop, spread over a few channels, then has random clients post messages and measures
+the time until every subscriber of the channel received each message.
+
+Usage (from the dj_react_chat directory):
+
+    python -m benchmarks.ws_fanout --sockets 2000 --channels 10 --messages 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from .utils import percentiles, report, setup_django, test_database
+
+
+async def run(sockets, channels, messages, connect_batch):
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+    from django.contrib.auth import get_user_model
+    from server.models import Category, Server, Channel
+    from webchat.models import Message
+    from webchat.routing import websocket_urlpatterns
+    from webchat.writer import get_writer
+
+    application = URLRouter(websocket_urlpatterns)
+    user = await get_user_model().objects.acreate(username="loadtest")
+    category = await Category.objects.acreate(name="loadtest")
+    server = await Server.objects.acreate(
+        name="loadtest", owner=user, category=category
+    )
+    channel_ids = [
+        (
+            await Channel.objects.acreate(
+                name=f"channel {i}", owner=user, topic="load", server=server
+            )
+        ).id
+        for i in range(channels)
+    ]
+
+    # Connect the clients, round-robin over the channels.
+    clients = []
+    started = time.perf_counter()
+    for offset in range(0, sockets, connect_batch):
+        batch = []
+        for i in range(offset, min(offset + connect_batch, sockets)):
+            channel_id = channel_ids[i % channels]
+            client = WebsocketCommunicator(application, f"/ws/channel/{channel_id}/")
+            client.scope["user"] = user
+            batch.append((channel_id, client))
+        results = await asyncio.gather(*(client.connect() for _, client in batch))
+        assert all(connected for connected, _ in results)
+        clients.extend(batch)
+    connect_seconds = time.perf_counter() - started
+
+    by_channel = {}
+    for channel_id, client in clients:
+        by_channel.setdefault(channel_id, []).append(client)
+
+    # Post the messages one at a time and wait for every subscriber to receive it.
+    latencies = []
+    started = time.perf_counter()
+    for n in range(messages):
+        channel_id = random.choice(channel_ids)
+        subscribers = by_channel[channel_id]
+        sent = time.perf_counter()
+        await random.choice(subscribers).send_to(
+            text_data=json.dumps({"message": f"message {n}"})
+        )
+
+        async def receive(client):
+            await client.receive_from(timeout=30)
+            return time.perf_counter() - sent
+
+        latencies.extend(await asyncio.gather(*(receive(c) for c in subscribers)))
+    broadcast_seconds = time.perf_counter() - started
+
+    await get_writer().flush()
+    persisted = await Message.objects.acount()
+    await asyncio.gather(*(client.disconnect() for _, client in clients))
+
+    return {
+        "benchmark": "ws_fanout",
+        "sockets": sockets,
+        "channels": channels,
+        "messages": messages,
+        "deliveries": len(latencies),
+        "connect_seconds": round(connect_seconds, 3),
+        "deliveries_per_second": round(len(latencies) / broadcast_seconds, 1),
+        "delivery_latency": percentiles(latencies),
+        "persisted_messages": persisted,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sockets", type=int, default=2000)
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--connect-batch", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        results = asyncio.run(
+            run(args.sockets, args.channels, args.messages, args.connect_batch)
+        )
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# dj_react_chat\dj_react_chat\admin.py
+"""
+Admin building blocks whose cost does not grow with the size of the tables.
+
+The Django admin counts every changelist twice with ``COUNT(*)`` (the filtered and
+the full result count), which scans huge tables on every page load.
+``EstimatedCountPaginator`` counts at most ``exact_limit`` rows and falls back to the
+planner's row estimate for unfiltered lists, ``ScalableAdminMixin`` uses it and turns
+off the full result count.
+"""
+
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models.fields import AutoFieldMixin
+from django.utils.functional import cached_property
+
+
+def estimated_count(model, using="default"):
+    """
+    Return the planner's estimate of the number of rows of a table, or ``None``.
+
+    PostgreSQL keeps it in ``pg_class.reltuples`` (refreshed by autovacuum). SQLite has
+    ``sqlite_stat1`` after an ``ANALYZE``, otherwise the largest primary key is used,
+    read from the end of the index, for auto-increment primary keys only: other keys
+    (e.g. the snowflake ids of ``Message``) are not row numbers.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [connection.ops.quote_name(table)],
+                )
+            elif connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+                )
+                if cursor.fetchone() is not None:
+                    cursor.execute(
+                        "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 "
+                        "WHERE tbl = %s ORDER BY idx IS NOT NULL LIMIT 1",
+                        [table],
+                    )
+                    row = cursor.fetchone()
+                    if row is not None:
+                        return row[0]
+                if not isinstance(model._meta.pk, AutoFieldMixin):
+                    return None
+                cursor.execute(
+                    f"SELECT MAX({connection.ops.quote_name(model._meta.pk.column)}) "
+                    f"FROM {connection.ops.quote_name(table)}"
+                )
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        # A table that does not exist yet.
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A ``Paginator`` that never counts more than ``exact_limit`` rows.
+
+    Small results are counted exactly. Past the limit an unfiltered list reports the
+    table estimate, a filtered one reports ``exact_limit + 1`` rows, so the last pages
+    of a huge filtered list are reached by narrowing the filters instead.
+    """
+
+    exact_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, "query"):
+            return super().count
+        # A LIMIT inside the COUNT stops the scan after exact_limit + 1 rows.
+        count = queryset.order_by()[: self.exact_limit + 1].count()
+        if count <= self.exact_limit or queryset.query.has_filters():
+            return count
+        estimate = estimated_count(queryset.model, queryset.db)
+        return max(count, estimate or 0)
+
+
+class ScalableAdminMixin:
+    """``ModelAdmin`` defaults for tables too large to count or list in full."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class ScalableModelAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    pass
@@ -0,0 +1,124 @@
+# dj_react_chat\dj_react_chat\database.py
+"""
+Database profiles for settings.py.
+
+``DATABASE_PROFILE=sqlite`` (the default) runs SQLite in WAL mode with the pragmas in
+``SQLITE_PRAGMAS`` applied to every new connection, so readers never wait for the
+writer and a writer waits for the lock instead of failing with "database is locked".
+
+``DATABASE_PROFILE=postgres`` connects to PostgreSQL with psycopg's connection pool
+(``pip install "psycopg[binary,pool]"``), configured from ``POSTGRES_*`` variables.
+
+Either profile can add read replicas, see ``replica_configs`` and
+``dj_react_chat/replicas.py``.
+"""
+
+import os
+
+from django.db.backends.signals import connection_created
+
+# Applied with PRAGMA to every new SQLite connection, in this order.
+SQLITE_PRAGMAS = {
+    # Readers keep reading while a write is in progress
+    "journal_mode": "WAL",
+    # fsync on checkpoints only, still safe against corruption in WAL mode
+    "synchronous": "NORMAL",
+    # Wait up to 5 seconds for a lock instead of failing immediately
+    "busy_timeout": 5000,
+    # Read the database through a 256 MiB memory map
+    "mmap_size": 256 * 1024 * 1024,
+    # 64 MiB page cache per connection (negative values are KiB)
+    "cache_size": -64000,
+    "temp_store": "MEMORY",
+}
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def sqlite_profile(base_dir):
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("SQLITE_NAME", base_dir / "db.sqlite3"),
+        # Take the write lock when a transaction starts. A deferred transaction that
+        # reads and then writes cannot wait for the lock and fails right away.
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+        # Keep connections open between requests and check them before reuse.
+        "CONN_MAX_AGE": env_int("DB_CONN_MAX_AGE", 600),
+        "CONN_HEALTH_CHECKS": True,
+    }
+
+
+def postgres_profile():
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "dj_react_chat"),
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        "OPTIONS": {
+            "pool": {
+                "min_size": env_int("POSTGRES_POOL_MIN_SIZE", 2),
+                "max_size": env_int("POSTGRES_POOL_MAX_SIZE", 20),
+                "timeout": env_int("POSTGRES_POOL_TIMEOUT", 10),
+            },
+        },
+        # The pool keeps the connections, Django must close (return) them after
+        # each request.
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": True,
+    }
+
+
+def database_config(base_dir, profile=None):
+    """
+    Return the ``DATABASES["default"]`` settings of a profile.
+
+    Args:
+        base_dir (Path): The project directory, where the SQLite file lives.
+        profile (str): ``"sqlite"`` or ``"postgres"``, defaults to ``DATABASE_PROFILE``.
+    """
+    profile = profile or os.environ.get("DATABASE_PROFILE", "sqlite")
+    if profile == "sqlite":
+        return sqlite_profile(base_dir)
+    if profile == "postgres":
+        return postgres_profile()
+    raise ValueError(f"Unknown DATABASE_PROFILE {profile!r}")
+
+
+def replica_configs(base_dir, profile=None):
+    """
+    Return the ``DATABASES`` entries of the read replicas, ``replica1``, ``replica2``...
+
+    SQLite replicas are files listed in ``SQLITE_REPLICAS`` (comma separated), which
+    stand in for real replicas locally, see ``manage.py sync_sqlite_replicas``.
+    PostgreSQL replicas are hosts listed in ``POSTGRES_REPLICA_HOSTS``. In tests every
+    replica mirrors ``default``.
+    """
+    profile = profile or os.environ.get("DATABASE_PROFILE", "sqlite")
+    primary = database_config(base_dir, profile)
+    if profile == "sqlite":
+        key, values = "NAME", os.environ.get("SQLITE_REPLICAS", "")
+    else:
+        key, values = "HOST", os.environ.get("POSTGRES_REPLICA_HOSTS", "")
+    return {
+        f"replica{i}": {**primary, key: value.strip(), "TEST": {"MIRROR": "default"}}
+        for i, value in enumerate(filter(None, values.split(",")), start=1)
+    }
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Apply ``settings.SQLITE_PRAGMAS`` to a new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    from django.conf import settings
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", SQLITE_PRAGMAS)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+connection_created.connect(apply_sqlite_pragmas, dispatch_uid="apply_sqlite_pragmas")
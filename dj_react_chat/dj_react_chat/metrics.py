@@ -0,0 +1,385 @@
+# dj_react_chat\dj_react_chat\metrics.py
+"""
+Per-request instrumentation exported in the Prometheus text format.
+
+``MetricsMiddleware`` measures every request and records, labelled by route and view:
+
+- ``http_request_duration_seconds``: the request latency
+- ``http_request_db_queries`` and ``http_request_db_duration_seconds``: the number of
+  SQL queries and the time spent in them, counted by an execute wrapper installed on
+  every database connection
+- ``http_request_serialization_seconds``: the time spent in ``serialization()`` blocks
+  and in rendering DRF responses, without the SQL run meanwhile
+- ``http_response_size_bytes``: the size of the response body
+- ``http_requests_total``: the requests, also labelled by status code
+
+``metrics_view`` serves them at ``/metrics`` to staff and to scrapers authenticated
+with ``METRICS_TOKEN``, they describe every route of the site. Requests slower than
+``SLOW_REQUEST_SECONDS`` are logged with their slowest queries.
+"""
+
+import bisect
+import contextvars
+import heapq
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+# The RequestMetrics of the request being handled, copied into sync_to_async threads.
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+###########################
+# Metric types
+###########################
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per label combination.
+
+    Each observation increments one bucket, the cumulative counts Prometheus expects
+    are only computed when the metrics are rendered.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per bucket counts (the last one is +Inf), sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self.lock:
+            values = {
+                labels: (list(counts), total, count)
+                for labels, (counts, total, count) in self.values.items()
+            }
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket in zip(bounds, counts):
+                cumulative += bucket
+                label_text = format_labels(self.labels, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = format_labels(self.labels, labels)
+            yield f"{self.name}_sum{label_text} {total:g}"
+            yield f"{self.name}_count{label_text} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        for metric in self.metrics:
+            with metric.lock:
+                metric.values.clear()
+
+
+registry = Registry()
+
+ROUTE_LABELS = ("route", "view")
+
+request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Request latency.",
+        ROUTE_LABELS + ("method",),
+    )
+)
+requests_total = registry.register(
+    Counter("http_requests_total", "Requests handled.", ROUTE_LABELS + ("status",))
+)
+db_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "SQL queries per request.",
+        ROUTE_LABELS,
+        QUERY_BUCKETS,
+    )
+)
+db_duration = registry.register(
+    Histogram(
+        "http_request_db_duration_seconds",
+        "Time spent in SQL queries per request.",
+        ROUTE_LABELS,
+    )
+)
+serialization_duration = registry.register(
+    Histogram(
+        "http_request_serialization_seconds",
+        "Time spent serializing and rendering the response per request.",
+        ROUTE_LABELS,
+    )
+)
+response_size = registry.register(
+    Histogram(
+        "http_response_size_bytes",
+        "Size of the response body.",
+        ROUTE_LABELS,
+        SIZE_BUCKETS,
+    )
+)
+
+
+###########################
+# Request measurements
+###########################
+class RequestMetrics:
+    """
+    What one request spent, filled in by ``instrument`` and ``serialization``.
+
+    Attributes:
+        queries (int): The number of SQL queries.
+        db_time (float): Seconds spent in SQL queries.
+        serialization_time (float): Seconds spent serializing, without SQL.
+        slow_queries (list[tuple[float, str]]): The slowest queries as a min-heap of
+            ``(seconds, sql)``, only kept when the slow request log is enabled.
+    """
+
+    def __init__(self, keep_queries=0):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.keep_queries = keep_queries
+        self.slow_queries = []
+        self.render_started = None
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.keep_queries:
+            entry = (duration, sql)
+            if len(self.slow_queries) < self.keep_queries:
+                heapq.heappush(self.slow_queries, entry)
+            elif duration > self.slow_queries[0][0]:
+                heapq.heapreplace(self.slow_queries, entry)
+
+
+def instrument(execute, sql, params, many, context):
+    """Execute wrapper counting the queries of the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def install(connection, **kwargs):
+    """Add ``instrument`` to the execute wrappers of a connection, once."""
+    if instrument not in connection.execute_wrappers:
+        # First, an active execute_wrapper() block pops the last wrapper when it exits.
+        connection.execute_wrappers.insert(0, instrument)
+
+
+# Connections are per thread, every new one gets the wrapper when it connects.
+connection_created.connect(install, dispatch_uid="metrics_install")
+
+
+@contextmanager
+def serialization():
+    """
+    Count the enclosed block as serialization time of the current request.
+
+    SQL queries run inside the block, such as lazily evaluated querysets, are
+    subtracted so they are only counted as database time.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started, db_time = time.perf_counter(), metrics.db_time
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.serialization_time += elapsed - (metrics.db_time - db_time)
+
+
+###########################
+# Middleware
+###########################
+class MetricsMiddleware:
+    """
+    Record the latency, SQL, serialization time and response size of every request.
+
+    Place it first in ``MIDDLEWARE`` so the latency covers the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported.
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token, started = self.start()
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, started)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, started)
+        return response
+
+    def start(self):
+        keep = 0
+        if getattr(settings, "SLOW_REQUEST_SECONDS", None) is not None:
+            keep = getattr(settings, "SLOW_REQUEST_QUERIES", 5)
+        metrics = RequestMetrics(keep)
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns.
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+        return response
+
+    def finish(self, request, response, metrics, started):
+        now = time.perf_counter()
+        duration = now - started
+        if metrics.render_started is not None:
+            metrics.serialization_time += now - metrics.render_started
+
+        match = getattr(request, "resolver_match", None)
+        labels = (match.route, match.view_name) if match else ("unmatched", "")
+        request_duration.observe(duration, labels + (request.method,))
+        requests_total.inc(labels + (str(response.status_code),))
+        db_queries.observe(metrics.queries, labels)
+        db_duration.observe(metrics.db_time, labels)
+        serialization_duration.observe(metrics.serialization_time, labels)
+        if not response.streaming:
+            response_size.observe(len(response.content), labels)
+
+        threshold = getattr(settings, "SLOW_REQUEST_SECONDS", None)
+        if threshold is not None and duration >= threshold:
+            log_slow_request(request, duration, metrics)
+
+
+def log_slow_request(request, duration, metrics):
+    worst = sorted(metrics.slow_queries, reverse=True)
+    logger.warning(
+        "Slow request %s %s: %.3fs, %d queries in %.3fs, serialization %.3fs%s",
+        request.method,
+        request.get_full_path(),
+        duration,
+        metrics.queries,
+        metrics.db_time,
+        metrics.serialization_time,
+        "".join(f"\n  {seconds:.4f}s {sql}" for seconds, sql in worst),
+    )
+
+
+def may_scrape(request):
+    """Staff users, or ``Authorization: Bearer <METRICS_TOKEN>`` when it is set."""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if token and scheme.lower() == "bearer":
+        return constant_time_compare(credentials.strip(), token)
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+def metrics_view(request):
+    """Serve the collected metrics in the Prometheus text format."""
+    if not may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
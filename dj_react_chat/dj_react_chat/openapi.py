@@ -0,0 +1,126 @@
+# dj_react_chat\dj_react_chat\openapi.py
+"""
+The OpenAPI schema, generated once per process instead of on every request.
+
+``schema_view`` serves ``/api/docs/schema`` from memory. The schema is read from
+``OPENAPI_SCHEMA_FILE`` when it is set, a file generated at deploy time with::
+
+    python manage.py spectacular --file schema.yml
+
+otherwise it is generated on the first request. Both the YAML and JSON renderings are
+kept with their gzip compressed bytes and an ETag, so a request costs a dict lookup, a
+``304`` when the client already has it, and never runs the generator again.
+
+``schema.yml`` in the repository is checked against ``generate_schema()`` by the tests.
+"""
+
+import gzip
+import hashlib
+import re
+import threading
+
+import yaml
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.http import require_safe
+
+MEDIA_TYPES = {
+    "yaml": "application/vnd.oai.openapi",
+    "json": "application/vnd.oai.openapi+json",
+}
+
+accepts_gzip = re.compile(r"\bgzip\b")
+
+
+def generate_schema():
+    """Generate the schema as YAML bytes, as ``manage.py spectacular`` writes them."""
+    from drf_spectacular.renderers import OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    return OpenApiYamlRenderer().render(schema, renderer_context={})
+
+
+class Rendering:
+    """
+    One encoding of the schema, ready to be sent.
+
+    Attributes:
+        content (bytes): The document.
+        gzipped (bytes): The document, gzip compressed.
+        etag (str): Quoted ETag of ``content``, ``gzip_etag`` for ``gzipped``.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.gzipped = gzip.compress(content, mtime=0)
+        digest = hashlib.md5(content, usedforsecurity=False).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+class SchemaDocument:
+    """The schema rendered in every format of ``MEDIA_TYPES``."""
+
+    def __init__(self, yaml_content):
+        from drf_spectacular.renderers import OpenApiJsonRenderer
+
+        schema = yaml.safe_load(yaml_content)
+        self.renderings = {
+            "yaml": Rendering(yaml_content),
+            "json": Rendering(
+                OpenApiJsonRenderer().render(schema, renderer_context={})
+            ),
+        }
+
+
+_document = None
+_lock = threading.Lock()
+
+
+def get_schema_document():
+    """Return the process-wide ``SchemaDocument``, loaded or generated on first use."""
+    global _document
+    if _document is None:
+        with _lock:
+            if _document is None:
+                path = getattr(settings, "OPENAPI_SCHEMA_FILE", None)
+                if path:
+                    with open(path, "rb") as file:
+                        content = file.read()
+                else:
+                    content = generate_schema()
+                _document = SchemaDocument(content)
+    return _document
+
+
+def requested_format(request):
+    """``?format=json|yaml``, else JSON when the Accept header asks for it, else YAML."""
+    requested = request.GET.get("format")
+    if requested in MEDIA_TYPES:
+        return requested
+    accept = request.headers.get("Accept", "")
+    return "json" if "json" in accept else "yaml"
+
+
+@require_safe
+def schema_view(request):
+    """Serve the OpenAPI schema, gzip compressed when the client accepts it."""
+    schema_format = requested_format(request)
+    rendering = get_schema_document().renderings[schema_format]
+    use_gzip = bool(accepts_gzip.search(request.headers.get("Accept-Encoding", "")))
+    etag = rendering.gzip_etag if use_gzip else rendering.etag
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            rendering.gzipped if use_gzip else rendering.content,
+            content_type=MEDIA_TYPES[schema_format],
+        )
+        if use_gzip:
+            response["Content-Encoding"] = "gzip"
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Accept", "Accept-Encoding"])
+    return response
@@ -0,0 +1,81 @@
+# dj_react_chat\dj_react_chat\renderers.py
+"""
+Faster response encodings, picked by DRF's content negotiation.
+
+``ORJSONRenderer`` renders ``application/json`` with orjson, byte for byte the same
+output as DRF's ``JSONRenderer`` (compact, UTF-8), which it falls back to when orjson
+is not installed. ``MessagePackRenderer`` answers ``Accept: application/msgpack`` (or
+``?format=msgpack``). Both are always offered, so the OpenAPI schema does not depend
+on what is installed.
+
+``negotiate`` gives plain Django views, such as the async server list, the same choice.
+"""
+
+from types import SimpleNamespace
+
+import msgpack
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(value):
+    # Datetimes and the types orjson does not know are encoded the way DRF does.
+    return JSONEncoder().default(value)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` backed by orjson, for the compact output only."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        content = orjson.dumps(
+            data,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # Escaped by JSONRenderer too, they end a line in JavaScript.
+        return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_default, datetime=False)
+
+
+def negotiate(request):
+    """
+    Pick the renderer of a plain Django request like DRF's content negotiation does.
+
+    The browsable API is left out, it needs a DRF view to render.
+
+    Raises:
+        NotAcceptable: If no renderer matches the ``Accept`` header or ``format``.
+    """
+    renderers = [
+        renderer()
+        for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        if renderer.format != "api"
+    ]
+    # The negotiation only reads the query string and the headers.
+    shim = SimpleNamespace(query_params=request.GET, META=request.META)
+    return DefaultContentNegotiation().select_renderer(shim, renderers)
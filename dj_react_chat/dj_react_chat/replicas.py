@@ -0,0 +1,209 @@
+# dj_react_chat\dj_react_chat\replicas.py
+"""
+Read replicas for the ``server`` app.
+
+``ReplicaRouter`` sends reads of ``REPLICA_APP_LABELS`` models to a healthy replica
+from ``DATABASE_REPLICAS`` and everything else to ``default``. After any write the
+current context is pinned to ``default`` for ``REPLICA_PIN_SECONDS``, and
+``PrimaryPinningMiddleware`` carries that pin across the client's next requests in a
+cookie, so users always read their own writes. Data cached for every client is read
+inside ``primary_reads()``, a lagging replica would cache stale rows for everyone.
+"""
+
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Wall clock time until which reads go to the primary, for the current context.
+_primary_until = contextvars.ContextVar("primary_until", default=0.0)
+
+PIN_COOKIE = "primary_until"
+
+
+def pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+
+def pin_to_primary(seconds=None):
+    """Send reads of the current context to the primary for ``seconds``."""
+    until = time.time() + (pin_seconds() if seconds is None else seconds)
+    if until > _primary_until.get():
+        _primary_until.set(until)
+
+
+def is_pinned():
+    return _primary_until.get() > time.time()
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """
+    Send the reads of the block to the primary, without pinning the client.
+
+    For data that is shared beyond the current client, e.g. a listing being written
+    to the cache, which must not be rebuilt from a replica that is lagging behind the
+    write that invalidated it.
+    """
+    token = _primary_until.set(float("inf"))
+    try:
+        yield
+    finally:
+        _primary_until.reset(token)
+
+
+###########################
+# Health checks
+###########################
+class ReplicaHealth:
+    """
+    Remembers which replicas answered their last health check.
+
+    A replica is checked with ``SELECT 1`` at most once per ``interval`` seconds per
+    process, when it is about to be used. A replica that fails is skipped until its
+    next check, and reads fail over to the primary when no replica is healthy.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.checked_at = {}
+        self.healthy = {}
+        self.lock = threading.Lock()
+
+    def get_interval(self):
+        if self.interval is not None:
+            return self.interval
+        return getattr(settings, "REPLICA_HEALTH_CHECK_INTERVAL", 10)
+
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            logger.warning("Replica %s failed its health check", alias, exc_info=True)
+            connections[alias].close()
+            return False
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            due = now - self.checked_at.get(alias, float("-inf")) >= self.get_interval()
+            if due:
+                # Claim the check so concurrent callers keep the previous state.
+                self.checked_at[alias] = now
+        if due:
+            self.healthy[alias] = self.check(alias)
+        return self.healthy.get(alias, False)
+
+    def reset(self):
+        self.checked_at.clear()
+        self.healthy.clear()
+
+
+health = ReplicaHealth()
+
+
+###########################
+# Router
+###########################
+class ReplicaRouter:
+    """
+    Routes reads of the ``server`` app to the replicas.
+
+    Reads stay on the primary when the context is pinned after a write, inside a
+    transaction on the primary (the rows being written are not on the replicas yet),
+    and when no replica is healthy.
+    """
+
+    def replicas(self):
+        return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+    def app_labels(self):
+        return set(getattr(settings, "REPLICA_APP_LABELS", ("server",)))
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.app_labels():
+            return DEFAULT_DB_ALIAS
+        if is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = self.replicas()
+        random.shuffle(replicas)
+        for alias in replicas:
+            if health.is_healthy(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        aliases = {DEFAULT_DB_ALIAS, *self.replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the same schema, replication copies the rows.
+        return None
+
+
+###########################
+# Middleware
+###########################
+def PrimaryPinningMiddleware(get_response):
+    """
+    Carry the read-your-writes pin of a client across requests in a cookie.
+
+    A request that arrives with an unexpired pin reads from the primary, and a request
+    that writes sets the cookie until its pin expires.
+    """
+
+    def start(request):
+        try:
+            until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            until = 0.0
+        return _primary_until.set(until), _primary_until.get()
+
+    def finish(response, token, initial):
+        until = _primary_until.get()
+        if until > initial:
+            response.set_cookie(
+                PIN_COOKIE,
+                f"{until:.3f}",
+                max_age=max(1, int(until - time.time()) + 1),
+                httponly=True,
+                samesite="Lax",
+            )
+        _primary_until.reset(token)
+        return response
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token, initial = start(request)
+            return finish(await get_response(request), token, initial)
+
+        markcoroutinefunction(middleware)
+    else:
+
+        def middleware(request):
+            token, initial = start(request)
+            return finish(get_response(request), token, initial)
+
+    return middleware
+
+
+PrimaryPinningMiddleware.sync_capable = True
+PrimaryPinningMiddleware.async_capable = True
@@ -4,6 +4,12 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from .database import (
+    SQLITE_PRAGMAS as DEFAULT_SQLITE_PRAGMAS,
+    database_config,
+    replica_configs,
+)
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,6 +31,8 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    # must come before staticfiles so runserver serves ASGI (websockets)
+    "daphne",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -34,17 +42,23 @@ INSTALLED_APPS = [
     # internal
     "account",
     "server",
+    "webchat",
     # 3rd party
     "rest_framework",
     "drf_spectacular",
 ]
 
 MIDDLEWARE = [
+    # first, so the request latency includes every other middleware
+    "dj_react_chat.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # read-your-writes pinning for the read replicas
+    "dj_react_chat.replicas.PrimaryPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # resolves request.user from the in-process user cache, see account/cache.py
+    "account.middleware.CachedAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -68,18 +82,131 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "dj_react_chat.wsgi.application"
+ASGI_APPLICATION = "dj_react_chat.asgi.application"
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# DATABASE_PROFILE selects "sqlite" (default, WAL and tuned pragmas, persistent
+# connections) or "postgres" (psycopg connection pool), see dj_react_chat/database.py.
 
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": database_config(BASE_DIR),
+    **replica_configs(BASE_DIR),
 }
 
+# Pragmas applied to every new SQLite connection
+SQLITE_PRAGMAS = dict(DEFAULT_SQLITE_PRAGMAS)
+
+# Read replicas (SQLITE_REPLICAS / POSTGRES_REPLICA_HOSTS) serve the reads of these
+# apps, see dj_react_chat/replicas.py. A client reads from the primary for
+# REPLICA_PIN_SECONDS after a write, and replicas are health checked at most every
+# REPLICA_HEALTH_CHECK_INTERVAL seconds.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["dj_react_chat.replicas.ReplicaRouter"] if DATABASE_REPLICAS else []
+REPLICA_APP_LABELS = ["server"]
+REPLICA_PIN_SECONDS = 5
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Set REDIS_URL to share the cache between workers, otherwise a per-process
+# local memory cache is used.
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# With a shared cache, sessions are written through to the cache and the database
+# and read from the cache. A per-process cache would keep serving a session that
+# another worker logged out, so sessions are then only read from the database.
+SESSION_ENGINE = (
+    "django.contrib.sessions.backends.cached_db"
+    if REDIS_URL
+    else "django.contrib.sessions.backends.db"
+)
+# Seconds a resolved user is reused per session (or token) by this process, an account
+# saved elsewhere is picked up after this delay, one saved here immediately. Only
+# enabled with a shared cache, 0 turns it off.
+AUTH_USER_CACHE_TTL = 30 if REDIS_URL else 0
+AUTH_USER_CACHE_MAX_ENTRIES = 10_000
+# Lifetime (seconds) of the signed tokens from /api/v1/account/token/
+AUTH_TOKEN_MAX_AGE = 3600
+
+# Cache alias and timeout (seconds) for the /api/v1/server/select listings
+SERVER_SELECT_CACHE_ALIAS = "default"
+SERVER_SELECT_CACHE_TIMEOUT = 300
+
+
+# Real-time messaging (webchat)
+# The fan-out backend broadcasts messages to the sockets of a channel. The local
+# backend only reaches sockets in this process, the Redis backend reaches every
+# worker and is used when REDIS_URL is set.
+
+WEBCHAT_FANOUT_BACKEND = (
+    "webchat.fanout.RedisBackend" if REDIS_URL else "webchat.fanout.LocalBackend"
+)
+# Messages buffered per socket before a slow socket is disconnected
+WEBCHAT_SUBSCRIBER_QUEUE_SIZE = 256
+# Messages are persisted in batches of up to this size...
+WEBCHAT_WRITE_BATCH_SIZE = 200
+# ...or after this many seconds, whichever comes first
+WEBCHAT_WRITE_FLUSH_INTERVAL = 0.05
+# Worker id (0-1023) embedded in message ids, must be unique per process across
+# hosts. Defaults to one allocated through the shared cache when REDIS_URL is set.
+# Without REDIS_URL it is derived from the process id, which is only unique for a
+# single process: set it explicitly for every process of a multi-process deployment.
+WEBCHAT_WORKER_ID = (
+    int(os.environ["WEBCHAT_WORKER_ID"]) if "WEBCHAT_WORKER_ID" in os.environ else None
+)
+# Presence and typing indicators are kept in memory (webchat/presence.py) and shared
+# between workers through Redis when REDIS_URL is set. A socket is online until
+# WEBCHAT_PRESENCE_TTL seconds after its last heartbeat, an account is shown typing
+# for WEBCHAT_TYPING_TTL seconds, and changes are pushed in batches every
+# WEBCHAT_PRESENCE_FLUSH_INTERVAL seconds.
+WEBCHAT_PRESENCE_BACKEND = (
+    "webchat.presence.RedisPresenceBackend"
+    if REDIS_URL
+    else "webchat.presence.LocalPresenceBackend"
+)
+WEBCHAT_PRESENCE_TTL = 60
+WEBCHAT_TYPING_TTL = 8
+WEBCHAT_PRESENCE_FLUSH_INTERVAL = 0.25
+# Read pointers sent on the sockets are coalesced and written in batches every
+# WEBCHAT_READ_FLUSH_INTERVAL seconds (webchat/readstate.py)
+WEBCHAT_READ_BATCH_SIZE = 500
+WEBCHAT_READ_FLUSH_INTERVAL = 1.0
+
+
+# Instrumentation
+# Per-route latency, SQL and serialization metrics are served at /metrics in the
+# Prometheus text format (see dj_react_chat/metrics.py). Requests slower than
+# SLOW_REQUEST_SECONDS are logged with their SLOW_REQUEST_QUERIES slowest queries,
+# the log is off when it is not set.
+
+SLOW_REQUEST_SECONDS = (
+    float(os.environ["SLOW_REQUEST_SECONDS"])
+    if "SLOW_REQUEST_SECONDS" in os.environ
+    else None
+)
+SLOW_REQUEST_QUERIES = 5
+# /metrics is only served to staff sessions and to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -119,6 +246,28 @@ STATIC_URL = "static/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "media/"
 
+# Uploads are stored by the SHA-256 of their content and deduplicated, unreferenced
+# files are deleted by `manage.py sweep_blobs` (see server/storage.py)
+STORAGES = {
+    "default": {
+        "BACKEND": "server.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Uploaded images declaring more pixels than this are rejected from their header,
+# before anything is decoded (decompression bombs)
+IMAGE_MAX_PIXELS = 40_000_000
+# Bounding box sizes (px) of the WebP/JPEG variants generated per image field
+IMAGE_VARIANT_SIZES = {
+    "icon": (32, 64, 128),
+    "banner": (320, 640, 1280),
+}
+# Threads generating the variants off the request path
+IMAGE_VARIANT_WORKERS = 2
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -128,10 +277,26 @@ AUTH_USER_MODEL = "account.Account"
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.SessionAuthentication"
+        "rest_framework.authentication.SessionAuthentication",
+        "account.authentication.SignedTokenAuthentication",
+    ],
+    # orjson for JSON, MessagePack for "Accept: application/msgpack"
+    "DEFAULT_RENDERER_CLASSES": [
+        "dj_react_chat.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "dj_react_chat.renderers.MessagePackRenderer",
     ],
 }
 
+# Admin: most rows returned by a changelist search (through the search index), and
+# the largest server whose members are edited in its change form
+ADMIN_SEARCH_LIMIT = 1000
+ADMIN_MAX_FORM_MEMBERS = 1000
+
+# Schema served at /api/docs/schema, from "manage.py spectacular --file <path>" at
+# deploy time. Generated on the first request when unset.
+OPENAPI_SCHEMA_FILE = os.environ.get("OPENAPI_SCHEMA_FILE")
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Your Project API",
     "DESCRIPTION": "Your project description",
@@ -0,0 +1,468 @@
+import gzip
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.utils import load_backend
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from server.cache import get_cache
+from server.models import Category, Channel, Server
+from webchat.models import Message
+
+from . import metrics, openapi, replicas
+from .admin import EstimatedCountPaginator, estimated_count
+from .database import database_config, replica_configs
+from .renderers import ORJSONRenderer
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_profile(self):
+        with mock.patch.dict(os.environ, {"DB_CONN_MAX_AGE": "30"}):
+            config = database_config(Path("/srv"), "sqlite")
+        self.assertEqual(config["NAME"], Path("/srv/db.sqlite3"))
+        self.assertEqual(config["OPTIONS"], {"transaction_mode": "IMMEDIATE"})
+        self.assertEqual(config["CONN_MAX_AGE"], 30)
+        self.assertTrue(config["CONN_HEALTH_CHECKS"])
+
+    def test_postgres_profile_uses_pool(self):
+        env = {"DATABASE_PROFILE": "postgres", "POSTGRES_POOL_MAX_SIZE": "8"}
+        with mock.patch.dict(os.environ, env):
+            config = database_config(Path("/srv"))
+        self.assertEqual(config["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(config["OPTIONS"]["pool"]["max_size"], 8)
+        # Persistent connections cannot be combined with the pool.
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+
+    def test_sqlite_replicas(self):
+        env = {"DATABASE_PROFILE": "sqlite", "SQLITE_REPLICAS": "/a.db, /b.db"}
+        with mock.patch.dict(os.environ, env):
+            configs = replica_configs(Path("/srv"))
+        self.assertEqual(list(configs), ["replica1", "replica2"])
+        self.assertEqual(configs["replica2"]["NAME"], "/b.db")
+        self.assertEqual(configs["replica2"]["TEST"], {"MIRROR": "default"})
+
+    def test_no_replicas(self):
+        with mock.patch.dict(os.environ, {"SQLITE_REPLICAS": ""}):
+            self.assertEqual(replica_configs(Path("/srv"), "sqlite"), {})
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            database_config(Path("/srv"), "mysql")
+
+
+class SqlitePragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(self.pragma("cache_size"), -64000)
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica_test"],
+    DATABASE_ROUTERS=["dj_react_chat.replicas.ReplicaRouter"],
+)
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Routing against a replica in a separate SQLite file, which only has the schema.
+
+    Rows created on the primary are missing on the replica, so a count tells which
+    database answered. The router keeps reads inside a transaction on the primary, so
+    these tests run outside of one and clean up after themselves.
+    """
+
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.add_database("replica_test", os.path.join(cls.directory.name, "r.db"))
+        cls.add_database("replica_down", "/nonexistent/directory/r.db")
+        with connections["replica_test"].schema_editor() as editor:
+            editor.create_model(Category)
+            editor.create_model(Server)
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in ("replica_test", "replica_down"):
+            connections[alias].close()
+            del connections[alias]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def add_database(cls, alias, name):
+        # A connection outside of settings.DATABASES, which the test runner would
+        # otherwise set up and check.
+        settings_dict = {**connections["default"].settings_dict, "NAME": name}
+        wrapper = load_backend(settings_dict["ENGINE"]).DatabaseWrapper
+        connections[alias] = wrapper(settings_dict, alias)
+
+    def setUp(self):
+        replicas.health.reset()
+        self.category = Category.objects.create(name="on primary")
+        self.unpin()
+
+    def tearDown(self):
+        Category.objects.all().delete()
+        self.unpin()
+
+    def unpin(self):
+        replicas._primary_until.set(0.0)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(Category.objects.count(), 0)
+
+    def test_write_pins_reads_to_primary(self):
+        Category.objects.create(name="written")
+        self.assertTrue(replicas.is_pinned())
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_pin_expires(self):
+        replicas.pin_to_primary(seconds=-1)
+        self.assertFalse(replicas.is_pinned())
+        self.assertEqual(Category.objects.count(), 0)
+
+    def test_reads_in_transaction_stay_on_primary(self):
+        from django.db import transaction
+
+        with transaction.atomic():
+            self.unpin()
+            self.assertEqual(Category.objects.count(), 1)
+
+    def test_other_apps_read_from_primary(self):
+        from django.contrib.auth import get_user_model
+
+        self.assertEqual(get_user_model().objects.count(), 0)
+        self.assertEqual(
+            replicas.ReplicaRouter().db_for_read(get_user_model()), "default"
+        )
+
+    def test_primary_reads(self):
+        with replicas.primary_reads():
+            self.assertEqual(Category.objects.count(), 1)
+        self.assertFalse(replicas.is_pinned())
+        self.assertEqual(Category.objects.count(), 0)
+
+    def test_listing_cache_is_filled_from_primary(self):
+        owner = get_user_model().objects.create_user(username="owner")
+        self.addCleanup(owner.delete)
+        Server.objects.create(name="s", owner=owner, category=self.category)
+        get_cache().clear()
+        self.unpin()
+        for url in ("/api/v1/server/select/", "/api/v1/server/select-async/"):
+            with self.subTest(url=url):
+                response = self.client.get(url, {"category": "on primary"})
+                self.assertEqual([s["name"] for s in response.json()], ["s"])
+                self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=["replica_down"])
+    def test_unhealthy_replica_fails_over_to_primary(self):
+        with self.assertLogs("dj_react_chat.replicas", "WARNING"):
+            self.assertEqual(Category.objects.count(), 1)
+        # The failed check is remembered until the next interval.
+        with mock.patch.object(replicas.health, "check") as check:
+            self.assertEqual(Category.objects.count(), 1)
+        check.assert_not_called()
+
+    @override_settings(DATABASE_REPLICAS=["replica_down", "replica_test"])
+    def test_skips_unhealthy_replica(self):
+        with self.assertLogs("dj_react_chat.replicas", "WARNING"):
+            for _ in range(5):
+                self.assertEqual(Category.objects.count(), 0)
+
+
+class PrimaryPinningMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_middleware(self, view, **cookies):
+        request = self.factory.get("/")
+        request.COOKIES.update(cookies)
+        return replicas.PrimaryPinningMiddleware(view)(request)
+
+    def test_write_sets_cookie(self):
+        def view(request):
+            replicas.pin_to_primary()
+            return HttpResponse()
+
+        response = self.run_middleware(view)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        # The pin belongs to the request, not to the thread.
+        self.assertFalse(replicas.is_pinned())
+
+    def test_cookie_pins_request(self):
+        def view(request):
+            self.assertTrue(replicas.is_pinned())
+            return HttpResponse()
+
+        until = str(replicas.time.time() + 5)
+        response = self.run_middleware(view, **{replicas.PIN_COOKIE: until})
+        # Reads do not extend the pin.
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_read_without_cookie(self):
+        def view(request):
+            self.assertFalse(replicas.is_pinned())
+            return HttpResponse()
+
+        response = self.run_middleware(view, **{replicas.PIN_COOKIE: "garbage"})
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+
+class HistogramTests(SimpleTestCase):
+    def test_render_cumulative_buckets(self):
+        histogram = metrics.Histogram("latency", "Latency.", ("route",), (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, ("a",))
+        self.assertEqual(
+            list(histogram.samples()),
+            [
+                'latency_bucket{route="a",le="0.1"} 1',
+                'latency_bucket{route="a",le="1"} 3',
+                'latency_bucket{route="a",le="+Inf"} 4',
+                'latency_sum{route="a"} 6.05',
+                'latency_count{route="a"} 4',
+            ],
+        )
+
+    def test_escape_labels(self):
+        counter = metrics.Counter("hits", "Hits.", ("path",))
+        counter.inc(('say "hi"\n',))
+        self.assertEqual(list(counter.samples()), ['hits{path="say \\"hi\\"\\n"} 1'])
+
+
+@override_settings(METRICS_TOKEN="secret")
+class MetricsMiddlewareTests(TestCase):
+    route_labels = 'route="^api/v1/server/select/$",view="server-list"'
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.client = APIClient()
+        owner = get_user_model().objects.create(username="owner")
+        category = Category.objects.create(name="gaming")
+        Server.objects.create(name="server", owner=owner, category=category)
+
+    def scrape(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_scrape_requires_token_or_staff(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+        user = get_user_model().objects.create_user(username="user")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_records_listing(self):
+        response = self.client.get("/api/v1/server/select/")
+        output = self.scrape()
+        labels = self.route_labels
+        self.assertIn(
+            f'http_request_duration_seconds_count{{{labels},method="GET"}} 1', output
+        )
+        self.assertIn(f'http_requests_total{{{labels},status="200"}} 1', output)
+        # ETag aggregate, servers, members, channels
+        self.assertIn(f"http_request_db_queries_sum{{{labels}}} 4", output)
+        self.assertIn(f"http_request_serialization_seconds_count{{{labels}}} 1", output)
+        self.assertIn(
+            f"http_response_size_bytes_sum{{{labels}}} {len(response.content)}",
+            output,
+        )
+
+    def test_records_async_listing_queries(self):
+        async_to_sync(self.async_client.get)("/api/v1/server/select-async/")
+        labels = 'route="api/v1/server/select-async/",view="server-select-async"'
+        # Session and user are not loaded anonymously: stamp, servers, members, channels
+        self.assertIn(f"http_request_db_queries_sum{{{labels}}} 4", self.scrape())
+
+    def test_async_listing_serializes_without_queries(self):
+        queries = []
+
+        @contextmanager
+        def serialization():
+            current = metrics._current.get()
+            before = current.queries
+            with metrics.serialization():
+                yield
+            queries.append(current.queries - before)
+
+        with mock.patch("server.async_views.serialization", serialization):
+            async_to_sync(self.async_client.get)("/api/v1/server/select-async/")
+        # The rows and the rendered response, all of the queries ran before.
+        self.assertEqual(queries, [0, 0])
+
+    @override_settings(SLOW_REQUEST_SECONDS=0, SLOW_REQUEST_QUERIES=2)
+    def test_slow_request_log(self):
+        with self.assertLogs("dj_react_chat.metrics", "WARNING") as logs:
+            self.client.get("/api/v1/server/select/")
+        message = logs.output[0]
+        self.assertIn("Slow request GET /api/v1/server/select/", message)
+        self.assertEqual(message.count("s SELECT"), 2)
+
+    def test_install_inside_execute_wrapper(self):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        connection.execute_wrappers.remove(metrics.instrument)
+        with connection.execute_wrapper(count):
+            metrics.install(connection)
+        # The block removed its own wrapper, not the one installed meanwhile.
+        self.assertEqual(connection.execute_wrappers, [metrics.instrument])
+
+    def test_serialization_excludes_queries(self):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics._current.set(request_metrics)
+        try:
+            with metrics.serialization():
+                request_metrics.add_query("SELECT 1", 10.0)
+        finally:
+            metrics._current.reset(token)
+        self.assertEqual(request_metrics.queries, 1)
+        self.assertLess(request_metrics.serialization_time, 1.0)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_same_bytes_as_json_renderer(self):
+        data = {
+            "text": 'caf\u00e9 \u2028 "quoted"',
+            "when": timezone.now(),
+            "day": timezone.now().date(),
+            "nested": [{"n": 1, "f": 0.1, "none": None}],
+            1: True,
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back_to_json_renderer(self):
+        content = ORJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(content, b'{\n  "a": 1\n}')
+
+
+class OpenApiSchemaTests(SimpleTestCase):
+    def setUp(self):
+        openapi._document = None
+        self.addCleanup(setattr, openapi, "_document", None)
+
+    def test_committed_schema_is_up_to_date(self):
+        committed = (Path(__file__).resolve().parent.parent / "schema.yml").read_bytes()
+        self.assertEqual(
+            openapi.generate_schema().decode(),
+            committed.decode(),
+            "schema.yml is out of date, run: python manage.py spectacular --file schema.yml",
+        )
+
+    def test_generated_once(self):
+        with mock.patch.object(
+            openapi, "generate_schema", wraps=openapi.generate_schema
+        ) as generate:
+            self.client.get("/api/docs/schema")
+            self.client.get("/api/docs/schema", {"format": "json"})
+        generate.assert_called_once()
+
+    def test_not_modified(self):
+        response = self.client.get("/api/docs/schema")
+        self.assertEqual(response["Content-Type"], "application/vnd.oai.openapi")
+        response = self.client.get(
+            "/api/docs/schema", headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_gzip(self):
+        plain = self.client.get("/api/docs/schema", {"format": "json"})
+        response = self.client.get(
+            "/api/docs/schema",
+            {"format": "json"},
+            headers={"Accept-Encoding": "gzip, br"},
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertNotEqual(response["ETag"], plain["ETag"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_served_from_file(self):
+        with tempfile.NamedTemporaryFile(suffix=".yml") as file:
+            file.write(b"openapi: 3.0.3\npaths: {}\n")
+            file.flush()
+            with override_settings(OPENAPI_SCHEMA_FILE=file.name):
+                response = self.client.get("/api/docs/schema", {"format": "json"})
+        self.assertEqual(response.json(), {"openapi": "3.0.3", "paths": {}})
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.bulk_create(Category(name=f"category {i}") for i in range(6))
+
+    def paginator(self, queryset, limit):
+        paginator = EstimatedCountPaginator(queryset, 2)
+        paginator.exact_limit = limit
+        return paginator
+
+    def test_small_results_are_exact(self):
+        self.assertEqual(self.paginator(Category.objects.order_by("id"), 10).count, 6)
+
+    def test_filtered_results_stop_at_the_limit(self):
+        queryset = Category.objects.filter(name__startswith="category").order_by("id")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.paginator(queryset, 3).count, 4)
+        self.assertIn("LIMIT 4", queries[0]["sql"])
+
+    def test_unfiltered_results_use_the_estimate(self):
+        estimate = estimated_count(Category)
+        self.assertGreaterEqual(estimate, 6)
+        self.assertEqual(
+            self.paginator(Category.objects.order_by("id"), 3).count, estimate
+        )
+
+    def test_no_estimate_from_snowflake_ids(self):
+        owner = get_user_model().objects.create_user(username="owner")
+        server = Server.objects.create(
+            name="s", owner=owner, category=Category.objects.first()
+        )
+        channel = Channel.objects.create(
+            name="general", owner=owner, topic="t", server=server
+        )
+        Message.objects.bulk_create(
+            Message(channel=channel, sender=owner, content=f"{i}") for i in range(4)
+        )
+        self.assertIsNone(estimated_count(Message))
+        # past the limit the capped exact count is kept
+        self.assertEqual(self.paginator(Message.objects.order_by("-id"), 2).count, 3)
+
+        admin = get_user_model().objects.create_superuser(username="admin")
+        self.client.force_login(admin)
+        with mock.patch.object(EstimatedCountPaginator, "exact_limit", 2):
+            response = self.client.get("/admin/webchat/message/")
+        self.assertEqual(response.context["cl"].result_count, 3)
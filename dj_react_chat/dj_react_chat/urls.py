@@ -4,17 +4,32 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
 from rest_framework.routers import DefaultRouter
-from server.views import ServerListViewSet
+from account.views import TokenViewSet
+from dj_react_chat.metrics import metrics_view
+from dj_react_chat.openapi import schema_view
+from server.async_views import server_select_async
+from server.views import MembershipViewSet, SearchViewSet, ServerListViewSet
+from webchat.views import MessageViewSet
 
 router = DefaultRouter()
 router.register("api/v1/server/select", ServerListViewSet)
+router.register("api/v1/server/members", MembershipViewSet, basename="server-members")
+router.register("api/v1/messages", MessageViewSet, basename="message")
+router.register("api/v1/search", SearchViewSet, basename="search")
+router.register("api/v1/account/token", TokenViewSet, basename="token")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    # API Documentation
-    path("api/docs/schema", SpectacularAPIView.as_view(), name="schema"),
+    # Async (ASGI native) variant of api/v1/server/select/
+    path(
+        "api/v1/server/select-async/", server_select_async, name="server-select-async"
+    ),
+    # Prometheus metrics, for staff and METRICS_TOKEN scrapers
+    path("metrics", metrics_view, name="metrics"),
+    # API Documentation, the schema is built once per process (dj_react_chat/openapi.py)
+    path("api/docs/schema", schema_view, name="schema"),
     path(
         "api/docs/schema/ui",
         SpectacularSwaggerView.as_view(),
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ServerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "server"
+
+    def ready(self):
+        # Connect the signal receivers defined in server/signals.py
+        from . import signals  # noqa: F401
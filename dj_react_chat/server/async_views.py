@@ -0,0 +1,146 @@
+# dj_react_chat\server\async_views.py
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from rest_framework import status
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.exceptions import NotAcceptable, ValidationError
+from account.authentication import SignedTokenAuthentication
+from dj_react_chat.metrics import serialization
+from dj_react_chat.replicas import primary_reads
+from dj_react_chat.renderers import ORJSONRenderer, negotiate
+from .cache import server_list_cache
+from .conditional import alisting_stamp, etag_matches, make_etag
+from .pagination import KeysetPagination
+from .params import ServerListParams
+from .query import ServerQueryPlan
+from .row_serializer import ServerRowSerializer
+
+# Rows fetched per round trip when an unpaginated listing is streamed with aiterator().
+LISTING_CHUNK_SIZE = 500
+
+
+def render_response(request, data, status_code=status.HTTP_200_OK, etag=None):
+    """Render ``data`` with the renderer DRF would pick for the sync view."""
+    try:
+        renderer, media_type = negotiate(request)
+    except NotAcceptable as exc:
+        # Like DRF, errors fall back to the first renderer.
+        renderer, media_type = ORJSONRenderer(), ORJSONRenderer.media_type
+        data, status_code = {"detail": exc.detail}, exc.status_code
+    with serialization():
+        content = renderer.render(data, media_type)
+    response = HttpResponse(content, status=status_code, content_type=media_type)
+    if etag:
+        response["ETag"] = etag
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    response["ETag"] = etag
+    return response
+
+
+def error_response(request, exc):
+    status_code = exc.status_code
+    if isinstance(exc, AuthenticationFailed):
+        # Session authentication sends no WWW-Authenticate header, so DRF answers 403.
+        status_code = status.HTTP_403_FORBIDDEN
+    detail = exc.detail
+    if not isinstance(detail, (list, dict)):
+        detail = {"detail": detail}
+    return render_response(request, detail, status_code)
+
+
+async def authenticate(request):
+    """
+    Return the user of the request, like the authenticators of the sync view.
+
+    The session is tried first, then a signed token (``account/authentication.py``)
+    when the request carries an ``Authorization`` header.
+
+    Raises:
+        AuthenticationFailed: For an invalid or expired token.
+    """
+    user = await request.auser()
+    if user.is_authenticated or "Authorization" not in request.headers:
+        return user
+    result = await sync_to_async(SignedTokenAuthentication().authenticate)(request)
+    return user if result is None else result[0]
+
+
+async def server_select_async(request):
+    """
+    **Async variant of `ServerListViewSet.list`.**
+
+    Accepts the same query parameters (parsed by `ServerListParams`) and returns the same
+    content, ETag and `304` handling as the sync route, but runs natively under ASGI: the
+    cache is read with `aget()`, the queryset with `aaggregate()` and `aiterator()`, so
+    no worker thread is held while a request waits on the cache or database.
+
+    ### Returns:
+    - **HttpResponse**: The serialized server list, or a DRF style error body.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    try:
+        user = await authenticate(request)
+        params = ServerListParams(request.GET, user)
+    except APIException as exc:
+        return error_response(request, exc)
+
+    if_none_match = request.headers.get("If-None-Match")
+    cache_key = await server_list_cache.amake_key(**params.cache_params())
+    cached = await server_list_cache.aget(cache_key)
+    if cached is not None:
+        etag, data = cached
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return render_response(request, data, etag=etag)
+
+    # Rebuilt from the primary, see ServerListViewSet.list.
+    with primary_reads():
+        plan = ServerQueryPlan(**params.filters)
+        stamp = await alisting_stamp(plan)
+        etag = make_etag(stamp, params.cache_params())
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        if params.server_id and not stamp["count"]:
+            return error_response(
+                request,
+                ValidationError(detail=f"Server with id {params.server_id} not found"),
+            )
+
+        queryset = plan.apply()
+        serializer = ServerRowSerializer(
+            params.with_num_members, params.fields, params.channel_fields
+        )
+        rows, next_cursor = serializer.values(queryset), None
+        try:
+            if params.paginate:
+                paginator = KeysetPagination(params.ordering)
+                rows, next_cursor = await paginator.apaginate(
+                    rows,
+                    params.pagination["cursor"],
+                    params.pagination["page_size"],
+                )
+            else:
+                rows = [
+                    row async for row in rows.aiterator(chunk_size=LISTING_CHUNK_SIZE)
+                ]
+        except APIException as exc:
+            return error_response(request, exc)
+
+        # Only plain rows are handled, so serializing is safe to run on the event loop.
+        related = await serializer.afetch_related(rows)
+        with serialization():
+            data = serializer.serialize(rows, *related)
+        if params.paginate:
+            data = {"next": next_cursor, "results": data}
+        await server_list_cache.aset(cache_key, (etag, data))
+    return render_response(request, data, etag=etag)
@@ -0,0 +1,184 @@
+# dj_react_chat\server\cache.py
+
+import hashlib
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache():
+    """Return the cache backend used for server listings."""
+    return caches[getattr(settings, "SERVER_SELECT_CACHE_ALIAS", "default")]
+
+
+###########################
+# Version counters
+###########################
+def version_key(scope):
+    return f"server_select:version:{scope}"
+
+
+def category_scope(name):
+    # Quoted so names with spaces or control characters still make valid cache keys.
+    return f"category:{quote(name, safe='')}"
+
+
+def server_scope(server_id):
+    return f"server:{server_id}"
+
+
+ALL_SCOPE = "all"
+
+
+def get_version(scope):
+    """
+    Return the current version of a scope, initializing it when missing.
+
+    Missing counters start at the current time in milliseconds rather than 1, so a
+    counter that was evicted never comes back at a value it already had.
+
+    Args:
+        scope (str): The scope, e.g. ``"all"``, ``"category:gaming"`` or ``"server:1"``.
+
+    Returns:
+        int: The current version.
+    """
+    cache = get_cache()
+    key = version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(scope):
+    """Async version of ``get_version``."""
+    cache = get_cache()
+    key = version_key(scope)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump(scopes):
+    cache = get_cache()
+    for scope in scopes:
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            # The counter is missing, so there is nothing cached under it yet.
+            get_version(scope)
+
+
+def bump_versions(category_names=(), server_ids=()):
+    """
+    Invalidate every cached listing that may contain the given categories or servers.
+
+    The global scope is always bumped because unfiltered and ``by_user`` listings can
+    contain any server. When called inside a transaction the counters are bumped again
+    on commit, so a listing rebuilt from pre-commit rows is never served afterwards.
+
+    Args:
+        category_names (Iterable[str]): Names of the affected categories.
+        server_ids (Iterable[int]): Ids of the affected servers.
+    """
+    scopes = {ALL_SCOPE}
+    scopes.update(category_scope(name) for name in category_names if name)
+    scopes.update(server_scope(pk) for pk in server_ids if pk is not None)
+
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+###########################
+# Listing cache
+###########################
+class ServerListCache:
+    """
+    Caches serialized server listings under keys built from the normalized query params.
+
+    Each key embeds the version of the narrowest scope the listing depends on, so
+    bumping that version makes every affected entry unreachable.
+
+    Attributes:
+        timeout (int): Seconds to keep an entry, ``SERVER_SELECT_CACHE_TIMEOUT``.
+    """
+
+    def __init__(self, timeout=None):
+        if timeout is None:
+            timeout = getattr(settings, "SERVER_SELECT_CACHE_TIMEOUT", 300)
+        self.timeout = timeout
+
+    @staticmethod
+    def get_scope(category=None, server_id=None):
+        if server_id is not None:
+            return server_scope(server_id)
+        if category:
+            return category_scope(category)
+        return ALL_SCOPE
+
+    @staticmethod
+    def digest(
+        category=None,
+        qty=None,
+        user_id=None,
+        server_id=None,
+        with_num_members=False,
+        **extra,
+    ):
+        params = {
+            "category": category or "",
+            "qty": qty if qty is not None else "",
+            "user": user_id if user_id is not None else "",
+            "server": server_id if server_id is not None else "",
+            "num_members": bool(with_num_members),
+            **extra,
+        }
+        raw = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+    def make_key(self, **params):
+        """
+        Build the cache key for a listing.
+
+        Args:
+            category (str): The category name filter.
+            qty (int): The quantity limit.
+            user_id (int): The member id for ``by_user`` listings.
+            server_id (int): The ``by_server_id`` filter.
+            with_num_members (bool): Whether member counts are included.
+            **extra: Any further normalized parameters that change the response.
+
+        Returns:
+            str: The cache key.
+        """
+        scope = self.get_scope(params.get("category"), params.get("server_id"))
+        return f"server_select:{scope}:{get_version(scope)}:{self.digest(**params)}"
+
+    async def amake_key(self, **params):
+        """Async version of ``make_key``."""
+        scope = self.get_scope(params.get("category"), params.get("server_id"))
+        version = await aget_version(scope)
+        return f"server_select:{scope}:{version}:{self.digest(**params)}"
+
+    def get(self, key):
+        return get_cache().get(key)
+
+    def set(self, key, data):
+        get_cache().set(key, data, timeout=self.timeout)
+
+    async def aget(self, key):
+        return await get_cache().aget(key)
+
+    async def aset(self, key, data):
+        await get_cache().aset(key, data, timeout=self.timeout)
+
+
+server_list_cache = ServerListCache()
@@ -0,0 +1,74 @@
+# dj_react_chat\server\conditional.py
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.http import parse_etags, quote_etag
+from .cache import ServerListCache
+
+
+def etag_queryset(plan):
+    """
+    Return the aggregate that stamps the servers matched by a plan.
+
+    Every write that can change a server listing stamps ``Server.updated_at``: saving
+    the server, adding or removing members (``adjust_member_counts``) and saving or
+    deleting one of its channels (``channel_changed``). The latest stamp plus the
+    number of matching rows therefore changes whenever the listing does, including
+    when a server leaves the filtered set. Category filters also read the category
+    stamp, so renaming a category changes the ETag of both names.
+
+    The ``qty`` slice is ignored, the stamp of the whole filtered set may only make
+    the ETag change more often than needed.
+    """
+    aggregates = {"updated_at": Max("updated_at"), "count": Count("id")}
+    if plan.category:
+        aggregates["category_updated_at"] = Max("category__updated_at")
+    return plan.filter(), aggregates
+
+
+def make_etag(stamp, cache_params):
+    """
+    Build a quoted ETag from a listing stamp.
+
+    Args:
+        stamp (dict): The result of ``listing_stamp``.
+        cache_params (dict): ``ServerListParams.cache_params()``, so listings that
+            render differently (fields, page, user) never share an ETag.
+    """
+    raw = ":".join(
+        [ServerListCache.digest(**cache_params)]
+        + [str(stamp[name]) for name in sorted(stamp)]
+    )
+    return quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+
+
+def listing_stamp(plan):
+    """
+    Read the stamp of a server listing with a single aggregate query.
+
+    Args:
+        plan (ServerQueryPlan): The plan of the listing.
+
+    Returns:
+        dict: ``updated_at`` and ``count`` of the matching servers, and
+        ``category_updated_at`` for category listings.
+    """
+    queryset, aggregates = etag_queryset(plan)
+    return queryset.aggregate(**aggregates)
+
+
+async def alisting_stamp(plan):
+    """Async version of ``listing_stamp``."""
+    queryset, aggregates = etag_queryset(plan)
+    return await queryset.aaggregate(**aggregates)
+
+
+def etag_matches(if_none_match, etag):
+    """Return whether an ``If-None-Match`` header matches ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag.removeprefix("W/") in [
+        tag.removeprefix("W/") for tag in etags
+    ]
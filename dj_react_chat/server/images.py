@@ -0,0 +1,213 @@
+# dj_react_chat\server\images.py
+
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .cache import bump_versions
+from .storage import acquire_blobs, release_blobs
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and file extension of each generated variant
+VARIANT_FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+
+
+def variant_sizes(field_name):
+    """Return the bounding box sizes (px) to generate for an image field."""
+    return settings.IMAGE_VARIANT_SIZES[field_name]
+
+
+def render_variants(source, sizes):
+    """
+    Render the resized WebP and JPEG variants of an image.
+
+    JPEG sources are decoded in draft mode at the smallest scale that is still
+    larger than the biggest variant, which avoids decoding full size pixels.
+
+    Args:
+        source: A readable image file.
+        sizes (Iterable[int]): The bounding box sizes in pixels.
+
+    Returns:
+        dict[str, dict[int, bytes]]: Encoded images by variant format and size.
+    """
+    sizes = sorted(sizes, reverse=True)
+    rendered = {name: {} for name in VARIANT_FORMATS}
+    with Image.open(source) as img:
+        img.draft("RGB", (sizes[0], sizes[0]))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA")
+        # Resize from the largest variant down, each one from the previous.
+        for size in sizes:
+            img.thumbnail((size, size), Image.LANCZOS)
+            for name, (image_format, _) in VARIANT_FORMATS.items():
+                frame = img if image_format == "WEBP" else img.convert("RGB")
+                buffer = io.BytesIO()
+                frame.save(buffer, image_format, quality=85)
+                rendered[name][size] = buffer.getvalue()
+    return rendered
+
+
+def store_variant(data, extension):
+    """
+    Store an encoded variant under a name derived from its SHA-256.
+
+    Identical variants share one file, and since a name always refers to the same
+    bytes the files can be cached by clients forever.
+
+    Returns:
+        str: The storage name of the variant.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"variants/{digest[:2]}/{digest}.{extension}"
+    if not default_storage.exists(name):
+        # A content-addressed storage picks its own name for the same bytes.
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def variant_names(variants):
+    """Return the storage names of every variant in a ``<field>_variants`` value."""
+    return [
+        name
+        for image_format, names in (variants or {}).items()
+        if image_format != "source"
+        for name in names.values()
+    ]
+
+
+def blob_names(instance, previous=False):
+    """
+    Return every stored file an instance references, image fields and variants.
+
+    Args:
+        instance: A ``Category`` or ``Channel``.
+        previous (bool): Read the values the instance was loaded with instead.
+    """
+    names = []
+    for field_name in instance.VARIANT_FIELDS:
+        if previous:
+            image = instance.previous_value(field_name)
+            variants = instance.previous_value(f"{field_name}_variants")
+        else:
+            image = getattr(instance, field_name).name
+            variants = getattr(instance, f"{field_name}_variants")
+        if image:
+            names.append(image)
+        names.extend(variant_names(variants))
+    return names
+
+
+def generate_variants(model_label, pk, field_name):
+    """
+    Generate and record the variants of one image field of one row.
+
+    The variants are written to ``<field>_variants`` with a queryset ``update()``
+    keyed on the source name, so a newer upload that happened meanwhile is never
+    overwritten with variants of the old image.
+
+    Args:
+        model_label (str): e.g. ``"server.Channel"``.
+        pk (int): The primary key of the row.
+        field_name (str): ``"icon"`` or ``"banner"``.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    image = getattr(instance, field_name)
+    if not image:
+        return
+
+    with image.open("rb") as source:
+        rendered = render_variants(source, variant_sizes(field_name))
+    variants = {"source": image.name}
+    for name, by_size in rendered.items():
+        extension = VARIANT_FORMATS[name][1]
+        variants[name] = {
+            str(size): store_variant(data, extension) for size, data in by_size.items()
+        }
+
+    updated = model.objects.filter(pk=pk, **{field_name: image.name}).update(
+        **{f"{field_name}_variants": variants}, updated_at=timezone.now()
+    )
+    if updated:
+        acquire_blobs(variant_names(variants))
+        release_blobs(variant_names(getattr(instance, f"{field_name}_variants")))
+        invalidate_listings(instance)
+
+
+def invalidate_listings(instance):
+    """Bump the server list cache versions and ETags after a variant ``update()``."""
+    Category, Channel, Server = (
+        apps.get_model("server", name) for name in ("Category", "Channel", "Server")
+    )
+    if isinstance(instance, Category):
+        bump_versions(category_names=[instance.name])
+    elif isinstance(instance, Channel):
+        Server.objects.filter(pk=instance.server_id).update(updated_at=timezone.now())
+        names = Server.objects.filter(pk=instance.server_id).values_list(
+            "category__name", flat=True
+        )
+        bump_versions(category_names=names, server_ids=[instance.server_id])
+
+
+###########################
+# Background generation
+###########################
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix="image-variants",
+        )
+    return _executor
+
+
+def _run(model_label, pk, field_name):
+    try:
+        generate_variants(model_label, pk, field_name)
+    except Exception:
+        logger.exception(
+            "Failed to generate %s variants for %s %s", field_name, model_label, pk
+        )
+    finally:
+        close_old_connections()
+
+
+def reset_stale_variants(instance, field_name):
+    """Forget variants that belong to a previous file, before the row is saved."""
+    image = getattr(instance, field_name)
+    variants = getattr(instance, f"{field_name}_variants") or {}
+    if variants and (not image or variants.get("source") != image.name):
+        setattr(instance, f"{field_name}_variants", {})
+
+
+def schedule_variants(instance, field_name):
+    """
+    Generate the variants of an image field in the thread pool once the row commits.
+
+    Nothing is scheduled when the recorded variants already belong to the current file.
+    """
+    image = getattr(instance, field_name)
+    variants = getattr(instance, f"{field_name}_variants") or {}
+    if not image or variants.get("source") == image.name:
+        return
+    label = instance._meta.label
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, label, instance.pk, field_name)
+    )
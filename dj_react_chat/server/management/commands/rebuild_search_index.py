@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from server.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of categories, servers and channels."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of documents to write per statement (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        # Searches keep seeing the old index until the new one is committed.
+        with transaction.atomic():
+            indexed = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} documents."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from server.members import recount_member_counts
+
+
+class Command(BaseCommand):
+    help = "Recount Server.member_count from the memberships table and repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of servers to recount per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        checked, repaired = recount_member_counts(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} servers, repaired {repaired}.")
+        )
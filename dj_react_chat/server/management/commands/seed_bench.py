@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from server.seed import seed_bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk create synthetic accounts, categories, servers with a skewed membership "
+        "distribution and channels for benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, default=1000)
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--servers", type=int, default=500)
+        parser.add_argument(
+            "--channels", type=int, default=3, help="Channels per server (default: 3)."
+        )
+        parser.add_argument(
+            "--max-members",
+            type=int,
+            default=500,
+            help="Members of the largest server (default: 500).",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.0,
+            help="Zipf exponent of the server sizes, 0 for equal sizes (default: 1.0).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows per INSERT (default: 1000).",
+        )
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        created = seed_bench(
+            accounts=options["accounts"],
+            categories=options["categories"],
+            servers=options["servers"],
+            channels=options["channels"],
+            max_members=options["max_members"],
+            skew=options["skew"],
+            batch_size=options["batch_size"],
+            prefix=options["prefix"],
+            seed=options["seed"],
+        )
+        summary = ", ".join(f"{count} {kind}" for kind, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary}."))
@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from server.storage import sweep_blobs
+
+
+class Command(BaseCommand):
+    help = "Delete media files that have been unreferenced for longer than the grace period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=3600,
+            help="Seconds a file must have been unreferenced (default: 3600).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of blobs to handle per query (default: 500).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and sweep every N seconds (default: sweep once).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = sweep_blobs(
+                grace=timedelta(seconds=options["grace"]),
+                batch_size=options["batch_size"],
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"Deleted {deleted} unreferenced files.")
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary database into the SQLite replica files, standing in "
+        "for replication in local setups."
+    )
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if connections[DEFAULT_DB_ALIAS].vendor != "sqlite":
+            raise CommandError("The primary database is not SQLite.")
+        if not replicas:
+            raise CommandError("No replicas configured, set SQLITE_REPLICAS.")
+
+        primary = sqlite3.connect(settings.DATABASES[DEFAULT_DB_ALIAS]["NAME"])
+        try:
+            for alias in replicas:
+                # Readers of the replica keep their connection, close ours first.
+                connections[alias].close()
+                replica = sqlite3.connect(settings.DATABASES[alias]["NAME"])
+                try:
+                    # The backup API copies a consistent snapshot, even during writes.
+                    primary.backup(replica)
+                finally:
+                    replica.close()
+                self.stdout.write(f"Synced {alias}.")
+        finally:
+            primary.close()
+        self.stdout.write(self.style.SUCCESS(f"Synced {len(replicas)} replicas."))
@@ -0,0 +1,199 @@
+# dj_react_chat\server\members.py
+
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .cache import bump_versions
+from .models import Server
+
+Membership = Server.members.through
+
+# Sent once per bulk_join() / bulk_leave() call that changed anything, with
+# ``server``, ``action`` ("join" or "leave") and the ``account_ids`` actually added or
+# removed. The rows are written without m2m_changed, see the receivers in signals.py.
+members_bulk_changed = Signal()
+
+
+def adjust_member_counts(deltas):
+    """
+    Atomically add a delta to ``Server.member_count`` for each server.
+
+    Servers sharing the same delta are updated by a single ``UPDATE ... SET
+    member_count = member_count + delta`` statement, so concurrent changes never
+    overwrite each other. ``updated_at`` is stamped in the same statement, a change of
+    members changes the listing ETag.
+
+    Args:
+        deltas (dict[int, int]): Server id to the change in member count.
+    """
+    by_delta = defaultdict(list)
+    for server_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(server_id)
+    now = timezone.now()
+    for delta, server_ids in by_delta.items():
+        Server.objects.filter(pk__in=server_ids).update(
+            member_count=F("member_count") + delta, updated_at=now
+        )
+
+
+def count_members(server_ids):
+    """
+    Count the memberships of the given servers from the through table.
+
+    Args:
+        server_ids (Iterable[int]): The servers to count.
+
+    Returns:
+        dict[int, int]: Server id to its number of members, servers without members
+        are included with 0.
+    """
+    counts = dict.fromkeys(server_ids, 0)
+    rows = (
+        Membership.objects.filter(server_id__in=counts)
+        .values("server_id")
+        .annotate(n=Count("id"))
+        .values_list("server_id", "n")
+    )
+    counts.update(rows)
+    return counts
+
+
+def recount_member_counts(batch_size=1000):
+    """
+    Repair ``Server.member_count`` drift by recounting every server in batches.
+
+    Servers are walked in primary key order, one batch at a time, and only rows whose
+    stored count differs from the through table are written.
+
+    Args:
+        batch_size (int): Number of servers to recount per batch.
+
+    Returns:
+        tuple[int, int]: The number of servers checked and the number repaired.
+    """
+    checked = repaired = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Server.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", "member_count")[:batch_size]
+        )
+        if not batch:
+            return checked, repaired
+        last_id = batch[-1][0]
+        actual = count_members(pk for pk, _ in batch)
+        now = timezone.now()
+        drifted = [
+            Server(pk=pk, member_count=actual[pk], updated_at=now)
+            for pk, stored in batch
+            if stored != actual[pk]
+        ]
+        if drifted:
+            Server.objects.bulk_update(drifted, ["member_count", "updated_at"])
+            rows = Server.objects.filter(pk__in=[s.pk for s in drifted])
+            bump_versions(
+                category_names=rows.values_list("category__name", flat=True),
+                server_ids=[s.pk for s in drifted],
+            )
+        checked += len(batch)
+        repaired += len(drifted)
+
+
+def lock_server(server):
+    """
+    Lock the row of a server until the end of the transaction.
+
+    Bulk joins and leaves of the same server run one after the other, so the members
+    they look up before writing are still the members when they write, and the
+    reported changes (which drive ``member_count``) are exactly the rows written.
+    """
+    Server.objects.select_for_update().filter(pk=server.pk).values_list("pk").first()
+
+
+def chunked(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+@transaction.atomic
+def bulk_join(server, account_ids, batch_size=1000):
+    """
+    Add many accounts to a server in a single transaction.
+
+    The accounts that exist and are not members yet are looked up ``batch_size`` at a
+    time, then inserted with ``bulk_create(ignore_conflicts=True)``, so a row added
+    concurrently is skipped instead of failing the batch. ``members_bulk_changed`` is
+    sent once for the whole batch, which updates ``member_count`` and the listing
+    cache once instead of once per account. The server row is locked first, see
+    ``lock_server``.
+
+    Args:
+        server (Server): The server to join.
+        account_ids (Iterable[int]): The accounts to add, unknown ids and accounts
+            that are already members are ignored.
+        batch_size (int): Number of accounts per lookup and per INSERT.
+
+    Returns:
+        list[int]: The accounts that were added, in id order.
+    """
+    Account = get_user_model()
+    lock_server(server)
+    added = []
+    for chunk in chunked(sorted(set(account_ids)), batch_size):
+        added.extend(
+            Account.objects.filter(pk__in=chunk)
+            .exclude(server_members=server)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+    Membership.objects.bulk_create(
+        [Membership(server_id=server.pk, account_id=pk) for pk in added],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    if added:
+        members_bulk_changed.send(
+            sender=Membership, server=server, action="join", account_ids=added
+        )
+    return added
+
+
+@transaction.atomic
+def bulk_leave(server, account_ids, batch_size=1000):
+    """
+    Remove many accounts from a server in a single transaction.
+
+    Memberships are deleted ``batch_size`` accounts at a time and
+    ``members_bulk_changed`` is sent once for the whole batch, like ``bulk_join``,
+    with the server row locked the same way.
+
+    Args:
+        server (Server): The server to leave.
+        account_ids (Iterable[int]): The accounts to remove, accounts that are not
+            members are ignored.
+        batch_size (int): Number of accounts per DELETE.
+
+    Returns:
+        list[int]: The accounts that were removed, in id order.
+    """
+    lock_server(server)
+    removed = []
+    for chunk in chunked(sorted(set(account_ids)), batch_size):
+        rows = Membership.objects.filter(server_id=server.pk, account_id__in=chunk)
+        members = list(rows.order_by("account_id").values_list("account_id", flat=True))
+        if members:
+            rows.filter(account_id__in=members).delete()
+            removed.extend(members)
+    if removed:
+        members_bulk_changed.send(
+            sender=Membership, server=server, action="leave", account_ids=removed
+        )
+    return removed
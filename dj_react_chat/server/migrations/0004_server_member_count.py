@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_members(apps, schema_editor):
+    Server = apps.get_model("server", "Server")
+    counts = (
+        Server.members.through.objects.filter(server_id=OuterRef("pk"))
+        .values("server_id")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    Server.objects.update(member_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0003_channel_banner_channel_icon"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="server",
+            name="member_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_members, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="server",
+            index=models.Index(
+                fields=["-member_count", "id"], name="server_member_count_idx"
+            ),
+        ),
+    ]
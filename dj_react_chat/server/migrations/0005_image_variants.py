@@ -0,0 +1,57 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:32
+
+import server.models
+import server.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0004_server_member_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="icon_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="channel",
+            name="banner_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="channel",
+            name="icon_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="channel",
+            name="banner",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to=server.models.server_banner_path,
+                validators=[
+                    server.validators.validate_image_file_extension,
+                    server.validators.validate_image_header,
+                ],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="channel",
+            name="icon",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to=server.models.server_icon_path,
+                validators=[
+                    server.validators.validate_icon_image_size,
+                    server.validators.validate_image_file_extension,
+                    server.validators.validate_image_header,
+                ],
+            ),
+        ),
+    ]
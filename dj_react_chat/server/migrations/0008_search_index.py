@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:05
+
+from django.db import migrations
+
+# Frozen copy of ``server.search.KINDS`` as of this migration: the codes are part of
+# the stored entry ids (``pk * 4 + code``), so they must match the ones the running
+# code writes and can never be renumbered.
+KINDS = {"category": 1, "server": 2, "channel": 3}
+
+
+def create_index(apps, schema_editor):
+    from server.search import BACKENDS
+
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is None:
+        return
+    backend().create(schema_editor)
+
+    # Index the rows that already exist.
+    entries = []
+    for kind, model_name, title, body in (
+        (KINDS["category"], "Category", "name", "description"),
+        (KINDS["server"], "Server", "name", "description"),
+        (KINDS["channel"], "Channel", "name", "topic"),
+    ):
+        model = apps.get_model("server", model_name)
+        for row in model.objects.values(
+            "pk", title, body, *(["server_id"] if model_name == "Channel" else [])
+        ):
+            server_id = row.get("server_id", row["pk"] if model_name == "Server" else None)
+            entries.append(
+                (row["pk"] * 4 + kind, row[title] or "", row[body] or "", server_id)
+            )
+    with schema_editor.connection.cursor() as cursor:
+        if entries:
+            cursor.executemany(
+                "INSERT INTO server_search_index (%s, title, body, server_id) "
+                "VALUES (%%s, %%s, %%s, %%s)"
+                % ("rowid" if schema_editor.connection.vendor == "sqlite" else "id"),
+                entries,
+            )
+
+
+def drop_index(apps, schema_editor):
+    from server.search import BACKENDS
+
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is not None:
+        backend().drop(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0007_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+# The member filter of the server list reads server ids by account. The automatic
+# through table only indexes (server_id, account_id) and account_id alone, so an
+# (account_id, server_id) index answers it without touching the table.
+MEMBERSHIP_INDEX = "server_server_members_account_server_idx"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0008_search_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="name",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.RunSQL(
+            f"CREATE INDEX {MEMBERSHIP_INDEX} "
+            "ON server_server_members (account_id, server_id)",
+            f"DROP INDEX {MEMBERSHIP_INDEX}",
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-17 09:12
+
+from django.db import migrations
+
+
+def count_existing_files(apps, schema_editor):
+    """Files uploaded before 0006 have no Blob row and would never be swept."""
+    from server.storage import recount_blobs
+
+    recount_blobs(
+        apps.get_model("server", "Blob"),
+        {
+            apps.get_model("server", "Category"): ("icon",),
+            apps.get_model("server", "Channel"): ("icon", "banner"),
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0009_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(count_existing_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:59
+
+import server.models
+import server.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0010_blob_backfill"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="icon",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                upload_to=server.models.category_icon_path,
+                validators=[
+                    server.validators.validate_icon_image_size,
+                    server.validators.validate_image_file_extension,
+                    server.validators.validate_image_header,
+                ],
+            ),
+        ),
+    ]
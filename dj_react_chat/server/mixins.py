@@ -0,0 +1,101 @@
+# dj_react_chat\server\mixins.py
+
+import copy
+
+from django.db.models import DEFERRED
+
+
+class TrackedFieldsMixin:
+    """
+    Remembers the field values a model instance was loaded with.
+
+    The values are captured in ``from_db``, so checking what changed never needs to
+    reload the row. ``save()`` on a loaded instance only writes the fields that
+    changed (through ``update_fields``), and skips the query entirely when nothing did.
+
+    Fields with ``auto_now`` (``updated_at``) are written along with any change, but a
+    save without changes leaves them untouched.
+
+    Attributes:
+        counter_fields (tuple[str]): Fields maintained with ``F()`` updates elsewhere,
+            which ``save()`` never writes back on update.
+
+    Methods:
+        has_changed(field_name): Whether a field differs from its loaded value.
+        previous_value(field_name): The loaded value of a field.
+        changed_fields(): The names of every field that differs from its loaded value.
+    """
+
+    counter_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot(fields)
+
+    def _tracked_value(self, field):
+        value = field.value_from_object(self)
+        # FieldFile -> its name, so assigning a new upload is detected as a change
+        if hasattr(value, "name") and hasattr(value, "storage"):
+            return value.name or None
+        return value
+
+    def _snapshot(self, field_names=None):
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for field in self._meta.concrete_fields:
+            if field_names is not None and not {field.name, field.attname} & set(
+                field_names
+            ):
+                continue
+            if self.__dict__.get(field.attname, DEFERRED) is DEFERRED:
+                continue
+            loaded[field.name] = copy.deepcopy(self._tracked_value(field))
+
+    def is_tracked(self, field_name):
+        return field_name in self.__dict__.get("_loaded_values", {})
+
+    def previous_value(self, field_name):
+        """Return the value ``field_name`` had when the instance was loaded or saved."""
+        return self._loaded_values[field_name]
+
+    def has_changed(self, field_name):
+        """Return whether ``field_name`` differs from its loaded value (True if unknown)."""
+        if not self.is_tracked(field_name):
+            return True
+        field = self._meta.get_field(field_name)
+        return self._tracked_value(field) != self._loaded_values[field_name]
+
+    def changed_fields(self):
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in self.counter_fields
+            and self.has_changed(field.name)
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            if self.__dict__.get("_loaded_values"):
+                changed = self.changed_fields()
+                if changed:
+                    changed += [
+                        field.name
+                        for field in self._meta.concrete_fields
+                        if getattr(field, "auto_now", False)
+                        and field.name not in changed
+                    ]
+                kwargs["update_fields"] = changed
+            elif self.counter_fields:
+                kwargs["update_fields"] = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.counter_fields
+                ]
+        super().save(*args, **kwargs)
+        self._snapshot(kwargs.get("update_fields"))
@@ -2,9 +2,13 @@
 
 from django.db import models
 from django.conf import settings
-from django.dispatch import receiver
-from django.shortcuts import get_object_or_404
-from .validators import validate_icon_image_size, validate_image_file_extension
+from .images import reset_stale_variants
+from .mixins import TrackedFieldsMixin
+from .validators import (
+    validate_icon_image_size,
+    validate_image_file_extension,
+    validate_image_header,
+)
 
 
 def category_icon_path(instance, filename):
@@ -19,55 +23,49 @@ def server_banner_path(instance, filename):
     return f"server/{instance.name}/server_banner/{filename}"
 
 
-class Category(models.Model):
+class Category(TrackedFieldsMixin, models.Model):
     """
     Represents a category that servers can belong to.
 
     Attributes:
         name (str): The name of the category.
         icon (str): The path to the icon for this category.
+        icon_variants (dict): The resized WebP/JPEG copies of the icon, see ``server/images.py``.
         description (str): An optional description of the category.
+        updated_at (datetime): When the row last changed, used for listing ETags.
     """
 
-    name = models.CharField(max_length=100)
-    icon = models.FileField(upload_to=category_icon_path, blank=True, null=True)
+    # Indexed for the ``category`` filter of the server list
+    name = models.CharField(max_length=100, db_index=True)
+    icon = models.FileField(
+        upload_to=category_icon_path,
+        blank=True,
+        null=True,
+        validators=[
+            validate_icon_image_size,
+            validate_image_file_extension,
+            validate_image_header,
+        ],
+    )
+    icon_variants = models.JSONField(default=dict, blank=True, editable=False)
     description = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
-    ###########################
-    # Category image changes
-    ###########################
-    def save(self, *args, **kwargs):
-        if self.id:
-            # query the Category instance from the database
-            existing = get_object_or_404(Category, id=self.id)
-
-            # if the icon has changed
-            if existing.icon != self.icon:
-                # delete the old icon file, save=False because to avoid conflict
-                existing.icon.delete(save=False)
+    # Image fields with resized variants generated by server/images.py
+    VARIANT_FIELDS = ("icon",)
 
-        # finally saving the changes
+    def save(self, *args, **kwargs):
+        # Drop the variants of a replaced icon in the same write
+        for field_name in self.VARIANT_FIELDS:
+            reset_stale_variants(self, field_name)
         super().save(*args, **kwargs)
 
-    ###########################
-    # Category detetion
-    ###########################
-    # django singals to call when a Category is deleted
-    @receiver(models.signals.pre_delete, sender="server.Category")
-    def category_delete_files(sender, instance, **kwargs):
-        for field in instance._meta.fields:
-            # Get the icon and delete it
-            if field.name == "icon":
-                file = getattr(instance, field.name)
-                if file:
-                    file.delete(save=False)
-
     # Category initialization
     def __str__(self):
         return self.name
 
 
-class Server(models.Model):
+class Server(TrackedFieldsMixin, models.Model):
     """
     Represents a server which can have multiple members and belong to a category.
 
@@ -77,6 +75,10 @@ class Server(models.Model):
         category (Category): The category the server belongs to.
         description (str): An optional description of the server.
         members (User[]): The members of the server.
+        member_count (int): The number of members, kept in sync by the
+            ``m2m_changed`` receivers in ``server/signals.py``.
+        updated_at (datetime): When the server, its channels or its members last
+            changed. Listing ETags are derived from it, see ``server/conditional.py``.
 
     Query Parameters:
         - category (str): The name of the category to filter by.
@@ -93,15 +95,31 @@ class Server(models.Model):
         Category, on_delete=models.CASCADE, related_name="server_category"
     )
     description = models.CharField(max_length=500, blank=True, null=True)
+    # The through table also has an (account_id, server_id) covering index for the
+    # ``by_user`` filter, created by migration 0009_query_indexes.
     members = models.ManyToManyField(
         settings.AUTH_USER_MODEL, related_name="server_members"
     )
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # member_count is maintained with F() updates by the m2m_changed receivers,
+    # so save() never writes back the possibly stale in-memory value.
+    counter_fields = ("member_count",)
+
+    class Meta:
+        indexes = [
+            # "most popular servers" ordering used by the server list pagination
+            models.Index(
+                fields=["-member_count", "id"], name="server_member_count_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Name: {self.name} | Id: {self.id}"
 
 
-class Channel(models.Model):
+class Channel(TrackedFieldsMixin, models.Model):
     """
     Represents a communication channel within a server.
 
@@ -110,6 +128,11 @@ class Channel(models.Model):
         owner (User): The owner of the channel.
         topic (str): The topic of the channel.
         server (Server): The server the channel belongs to.
+        banner (str): The path to the banner of the channel.
+        icon (str): The path to the icon of the channel.
+        banner_variants (dict): The resized WebP/JPEG copies of the banner.
+        icon_variants (dict): The resized WebP/JPEG copies of the icon.
+        updated_at (datetime): When the row last changed.
     """
 
     name = models.CharField(max_length=100)
@@ -124,52 +147,31 @@ class Channel(models.Model):
         upload_to=server_banner_path,
         blank=True,
         null=True,
-        validators=[validate_image_file_extension],
+        validators=[validate_image_file_extension, validate_image_header],
     )
     icon = models.ImageField(
         upload_to=server_icon_path,
         blank=True,
         null=True,
-        validators=[validate_icon_image_size, validate_image_file_extension],
+        validators=[
+            validate_icon_image_size,
+            validate_image_file_extension,
+            validate_image_header,
+        ],
     )
+    banner_variants = models.JSONField(default=dict, blank=True, editable=False)
+    icon_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
-    ###########################
-    # Category image changes
-    ###########################
-    def save(self, *args, **kwargs):
-        # self.name = self.name.lower()
-        # super(Channel, self).save(*args, **kwargs)
-
-        if self.id:
-            # query the Category instance from the database
-            existing = get_object_or_404(Category, id=self.id)
-
-            # if the icon has changed
-            if existing.icon != self.icon:
-                # delete the old icon file, save=False because to avoid conflict
-                existing.icon.delete(save=False)
+    # Image fields with resized variants generated by server/images.py
+    VARIANT_FIELDS = ("icon", "banner")
 
-            # if the banner has changed
-            if existing.banner != self.banner:
-                # delete the old banner file, save=False because to avoid conflict
-                existing.banner.delete(save=False)
-
-        # finally saving the changes
+    def save(self, *args, **kwargs):
+        # Drop the variants of a replaced icon or banner in the same write
+        for field_name in self.VARIANT_FIELDS:
+            reset_stale_variants(self, field_name)
         super().save(*args, **kwargs)
 
-    ###########################
-    # Category detetion
-    ###########################
-    # django singals to call when a Category is deleted
-    @receiver(models.signals.pre_delete, sender="server.Server")
-    def category_delete_files(sender, instance, **kwargs):
-        for field in instance._meta.fields:
-            # Get the icon and delete it
-            if field.name == "icon" or field.name == "banner":
-                file = getattr(instance, field.name)
-                if file:
-                    file.delete(save=False)
-
     # def save(self, *args, **kwargs):
     #     # Ensure the channel name is stored in lowercase
     #     self.name = self.name.lower()
@@ -177,3 +179,25 @@ class Channel(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class Blob(models.Model):
+    """
+    Reference count of a file in the content-addressed media storage.
+
+    Every image field value and image variant used by a row holds one reference.
+    Files whose count dropped to zero are deleted by ``manage.py sweep_blobs`` after
+    a grace period instead of inline when a row changes.
+
+    Attributes:
+        name (str): The storage name of the file.
+        refs (int): The number of references.
+        released_at (datetime): When the last reference was dropped, if unreferenced.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.IntegerField(default=0)
+    released_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
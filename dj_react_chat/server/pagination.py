@@ -0,0 +1,145 @@
+# dj_react_chat\server\pagination.py
+
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+
+class KeysetPagination:
+    """
+    Keyset (cursor) pagination over a fixed, unique ordering.
+
+    Instead of an OFFSET, each page filters for rows that sort after the last row of
+    the previous page, so every page costs the same as the first one when the
+    ordering is backed by an index. Cursors are opaque url-safe strings that encode
+    the ordering they were made for and the sort key of the last row.
+
+    Attributes:
+        ordering (tuple[str]): The ``order_by`` fields, the last one must be unique.
+        page_size (int): The default number of rows per page.
+        max_page_size (int): The largest page size a client can request.
+    """
+
+    page_size = 50
+    max_page_size = 100
+
+    def __init__(self, ordering=("id",), page_size=None):
+        self.ordering = tuple(ordering)
+        if page_size is not None:
+            self.page_size = page_size
+
+    ###########################
+    # Cursors
+    ###########################
+    def encode_cursor(self, row):
+        # Rows are model instances or ``values()`` dicts
+        get = row.get if isinstance(row, dict) else row.__getattribute__
+        position = [get(field.lstrip("-")) for field in self.ordering]
+        payload = json.dumps({"o": self.ordering, "p": position}).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    def decode_cursor(self, cursor, model):
+        """
+        Decode a cursor into the sort key of the row it points at.
+
+        Every value is converted with the model field it sorts on, so a tampered
+        cursor is rejected here instead of failing in the database.
+
+        Raises:
+            ValidationError: If the cursor is malformed or was made for another ordering.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            ordering, position = tuple(payload["o"]), payload["p"]
+            if ordering != self.ordering or len(position) != len(ordering):
+                raise ValidationError("Cursor does not match the requested ordering")
+            position = [
+                self.to_python(model._meta.get_field(field.lstrip("-")), value)
+                for field, value in zip(ordering, position)
+            ]
+        except (ValueError, TypeError, KeyError, OverflowError, DjangoValidationError):
+            raise ValidationError("Invalid cursor")
+        return position
+
+    @staticmethod
+    def to_python(field, value):
+        # Ordering fields are not nullable, a null would match nothing
+        if value is None or isinstance(value, (dict, list)):
+            raise TypeError(value)
+        value = field.to_python(value)
+        field.run_validators(value)
+        return value
+
+    ###########################
+    # Paging
+    ###########################
+    def get_page_size(self, page_size):
+        if page_size is None:
+            return self.page_size
+        try:
+            page_size = int(page_size)
+        except (TypeError, ValueError):
+            raise ValidationError("page_size must be an integer")
+        if page_size < 1:
+            raise ValidationError("page_size must be positive")
+        return min(page_size, self.max_page_size)
+
+    def filter_after(self, queryset, position):
+        """
+        Restrict a queryset to rows that sort strictly after ``position``.
+
+        For an ordering ``(a, b)`` this builds ``a > x OR (a = x AND b > y)``, with
+        ``<`` for descending fields.
+        """
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {f.lstrip("-"): v for f, v in zip(self.ordering[:i], position)}
+            clauses.append(Q(**equal, **{f"{name}__{lookup}": position[i]}))
+        return queryset.filter(reduce(or_, clauses))
+
+    def paginate(self, queryset, cursor=None, page_size=None):
+        """
+        Return one page of a queryset.
+
+        Args:
+            queryset (QuerySet): The unordered, unsliced queryset.
+            cursor (str): The cursor returned with the previous page, if any.
+            page_size (int | str): The requested page size.
+
+        Returns:
+            tuple[list, str | None]: The rows of the page and the cursor of the next
+            page, or ``None`` on the last page.
+        """
+        page_size = self.get_page_size(page_size)
+        # Fetch one extra row to know whether there is a next page.
+        rows = list(self.page_queryset(queryset, cursor, page_size))
+        return self.split_page(rows, page_size)
+
+    async def apaginate(self, queryset, cursor=None, page_size=None):
+        """Async version of ``paginate``, reads the page with ``aiterator()``."""
+        page_size = self.get_page_size(page_size)
+        page = self.page_queryset(queryset, cursor, page_size)
+        rows = [row async for row in page.aiterator(chunk_size=page_size + 1)]
+        return self.split_page(rows, page_size)
+
+    def page_queryset(self, queryset, cursor, page_size):
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = self.filter_after(
+                queryset, self.decode_cursor(cursor, queryset.model)
+            )
+        return queryset[: page_size + 1]
+
+    def split_page(self, rows, page_size):
+        if len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        return rows, self.encode_cursor(rows[-1])
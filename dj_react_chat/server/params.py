@@ -0,0 +1,150 @@
+# dj_react_chat\server\params.py
+
+from rest_framework.exceptions import ValidationError, AuthenticationFailed
+
+
+class ServerListParams:
+    """
+    Parses and validates the query parameters of the server list.
+
+    Shared by the sync ``ServerListViewSet`` and the async ``server_select_async`` view,
+    so both paths accept exactly the same contract.
+
+    Attributes:
+        filters (dict): Keyword arguments for ``ServerQueryPlan``.
+        pagination (dict): ``ordering``, ``cursor`` and ``page_size``.
+        paginate (bool): Whether cursor pagination was requested.
+        with_num_members (bool): Whether member counts are serialized.
+        server_id (int): The ``by_server_id`` filter, if any.
+        fields (tuple[str]): The server fields to serialize, ``None`` for all of them.
+        channel_fields (tuple[str]): The channel fields to serialize, ``None`` for all.
+
+    Raises:
+        AuthenticationFailed: If ``by_user`` or ``by_server_id`` is used anonymously.
+        ValidationError: For an invalid ``by_server_id``, ``qty``, ``ordering``,
+            ``fields`` or ``expand``, or when ``qty`` is combined with pagination.
+    """
+
+    # Related fields, only serialized when listed in ``expand`` (or ``fields``).
+    expandable = ("members", "channel_server")
+
+    # Keyset orderings supported by cursor pagination, the last field is unique.
+    orderings = {
+        "id": ("id",),
+        "-num_members": ("-member_count", "id"),
+    }
+
+    def __init__(self, query_params, user):
+        category = query_params.get("category")
+        qty = query_params.get("qty")
+        by_user = (
+            query_params.get("by_user") == "true"
+        )  # Convert the "by_user" query parameter to a boolean; comparison with "true" checks if the parameter is explicitly set to "true"
+        by_server_id = query_params.get("by_server_id")
+        self.with_num_members = query_params.get("with_num_members") == "true"
+        cursor = query_params.get("cursor")
+        page_size = query_params.get("page_size")
+        ordering = query_params.get("ordering", "id")
+        self.paginate = bool(cursor or page_size)
+
+        if (by_user or by_server_id) and not user.is_authenticated:
+            raise AuthenticationFailed()
+
+        if by_server_id:
+            try:
+                by_server_id = int(by_server_id)
+            except ValueError:
+                raise ValidationError("Server value error")
+
+        if ordering not in self.orderings:
+            raise ValidationError(f"Unsupported ordering {ordering}")
+        if self.paginate and qty:
+            raise ValidationError("qty cannot be combined with cursor or page_size")
+        qty = self.parse_qty(qty)
+
+        self.fields, self.channel_fields = self.parse_fields(
+            query_params.get("fields"), query_params.get("expand")
+        )
+        if self.fields is not None and "num_members" in self.fields:
+            self.with_num_members = True
+
+        self.server_id = by_server_id or None
+        self.filters = dict(
+            category=category,
+            qty=qty,
+            user_id=user.id if by_user else None,
+            server_id=self.server_id,
+            with_num_members=self.with_num_members,
+            fields=self.fields,
+        )
+        self.pagination = dict(ordering=ordering, cursor=cursor, page_size=page_size)
+
+    @staticmethod
+    def parse_qty(qty):
+        if not qty:
+            return None
+        try:
+            qty = int(qty)
+        except (TypeError, ValueError):
+            raise ValidationError("qty must be an integer")
+        if qty < 1:
+            raise ValidationError("qty must be positive")
+        return qty
+
+    @classmethod
+    def parse_fields(cls, fields, expand):
+        """
+        Parse the sparse fieldset of ``fields`` and ``expand``.
+
+        ``fields`` lists the server fields to return, ``channel_server.<name>`` entries
+        restrict the fields of the channels. Without ``fields`` every plain field is
+        returned. The related ``members`` and ``channel_server`` are returned when
+        listed in ``expand`` or ``fields``, or when neither parameter is given, which
+        keeps the full listing as the default.
+
+        Returns:
+            tuple: The sorted server fields, or ``None`` without either parameter, and
+            the sorted channel fields, or ``None`` for all of them.
+        """
+        if fields is None and expand is None:
+            return None, None
+        from .row_serializer import ChannelRowSerializer, ServerRowSerializer
+
+        server_keys = [key for key, _, _ in ServerRowSerializer.schema()]
+        channel_keys = {key for key, _, _ in ChannelRowSerializer.schema()}
+        expanded = set(filter(None, (expand or "").split(",")))
+        unknown = expanded - set(cls.expandable)
+        if unknown:
+            raise ValidationError(f"Cannot expand {', '.join(sorted(unknown))}")
+
+        if fields is None:
+            selected = {key for key in server_keys if key not in cls.expandable}
+            channel_fields = None
+        else:
+            names = set(filter(None, fields.split(",")))
+            nested = {name for name in names if name.startswith("channel_server.")}
+            selected = names - nested
+            channel_fields = {name.split(".", 1)[1] for name in nested} or None
+            unknown = (selected - set(server_keys)) | (
+                (channel_fields or set()) - channel_keys
+            )
+            if unknown:
+                raise ValidationError(f"Unknown fields {', '.join(sorted(unknown))}")
+        selected |= expanded
+        if channel_fields and "channel_server" not in selected:
+            raise ValidationError("channel_server fields require expand=channel_server")
+        return (
+            tuple(sorted(selected)),
+            tuple(sorted(channel_fields)) if channel_fields else None,
+        )
+
+    @property
+    def ordering(self):
+        return self.orderings[self.pagination["ordering"]]
+
+    def cache_params(self):
+        """Return the normalized parameters the response depends on."""
+        params = {**self.filters, **(self.pagination if self.paginate else {})}
+        if self.channel_fields is not None:
+            params["channel_fields"] = self.channel_fields
+        return params
@@ -0,0 +1,115 @@
+# dj_react_chat\server\query.py
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from .models import Server, Channel
+
+
+class ServerQueryPlan:
+    """
+    Builds the queryset for a server listing from the requested filters and fields.
+
+    The plan decides which relations have to be joined or prefetched so that
+    serializing the result costs a fixed number of queries, no matter how many
+    servers are returned.
+
+    Attributes:
+        category (str): The name of the category to filter by.
+        qty (int): The maximum number of servers to return.
+        user_id (int): The id of the member to filter by (``by_user``).
+        server_id (int): The id of a single server to return (``by_server_id``).
+        with_num_members (bool): Whether the number of members is serialized.
+        fields (set[str]): The serialized fields of ``ServerSerializer`` that will be read.
+    """
+
+    def __init__(
+        self,
+        category=None,
+        qty=None,
+        user_id=None,
+        server_id=None,
+        with_num_members=False,
+        fields=None,
+    ):
+        self.category = category
+        self.qty = qty
+        self.user_id = user_id
+        self.server_id = server_id
+        self.with_num_members = with_num_members
+        self.fields = set(fields) if fields is not None else self.default_fields()
+
+    @staticmethod
+    def default_fields():
+        """Return the names of every field emitted by ``ServerSerializer``."""
+        from .serializer import ServerSerializer
+
+        return set(ServerSerializer().fields)
+
+    def get_prefetches(self):
+        """
+        Return the ``Prefetch`` objects needed for the requested fields.
+
+        Returns:
+            list[Prefetch]: One prefetch per multi-valued field that will be serialized.
+        """
+        prefetches = []
+        if "members" in self.fields:
+            # Only the primary keys are serialized, so avoid loading full accounts.
+            # Ordered so the member ids come out the same on every path.
+            prefetches.append(
+                Prefetch(
+                    "members",
+                    queryset=get_user_model().objects.only("id").order_by("id"),
+                )
+            )
+        if "channel_server" in self.fields:
+            prefetches.append(
+                Prefetch("channel_server", queryset=Channel.objects.order_by("id"))
+            )
+        return prefetches
+
+    def filter(self, queryset=None):
+        """
+        Apply only the filters of this plan, without prefetches or the ``qty`` slice.
+
+        Args:
+            queryset (QuerySet): The base queryset, defaults to all servers.
+
+        Returns:
+            QuerySet: The servers matching the filters.
+        """
+        if queryset is None:
+            queryset = Server.objects.all()
+
+        if self.category:
+            queryset = queryset.filter(category__name=self.category)
+
+        if self.user_id is not None:
+            # Filter with a semi-join on the through table instead of joining
+            # "members", so the outer query never multiplies server rows.
+            memberships = Server.members.through.objects.filter(
+                account_id=self.user_id
+            ).values("server_id")
+            queryset = queryset.filter(id__in=memberships)
+
+        if self.server_id is not None:
+            queryset = queryset.filter(id=self.server_id)
+
+        return queryset
+
+    def apply(self, queryset=None):
+        """
+        Apply the filters, annotations and prefetches of this plan to a queryset.
+
+        Args:
+            queryset (QuerySet): The base queryset, defaults to all servers.
+
+        Returns:
+            QuerySet: The planned queryset, sliced to ``qty`` when it is set.
+        """
+        queryset = self.filter(queryset).prefetch_related(*self.get_prefetches())
+
+        if self.qty is not None:
+            queryset = queryset[: self.qty]
+
+        return queryset
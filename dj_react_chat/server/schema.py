@@ -1,10 +1,30 @@
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from .serializer import ServerSerializer, ChannelSerializer
+from .serializer import (
+    ChannelSerializer,
+    MembershipBatchResultSerializer,
+    MembershipBatchSerializer,
+    SearchResultSerializer,
+    ServerSerializer,
+)
 
 server_list_docs = extend_schema(
-    responses=ServerSerializer(many=True),
+    responses={
+        200: ServerSerializer(many=True),
+        304: OpenApiResponse(
+            description="The listing matches the ETag sent in If-None-Match"
+        ),
+    },
     parameters=[
+        OpenApiParameter(
+            name="If-None-Match",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.HEADER,
+            description=(
+                "ETag of a previous response with the same query parameters, "
+                "answered with an empty 304 when the listing has not changed"
+            ),
+        ),
         OpenApiParameter(
             name="category",
             type=OpenApiTypes.STR,
@@ -35,5 +55,94 @@ server_list_docs = extend_schema(
             location=OpenApiParameter.QUERY,
             description="If set to 'true', includes the number of members in each server",
         ),
+        OpenApiParameter(
+            name="page_size",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Enables cursor pagination with this many servers per page (max 100). "
+                "The response becomes {'next': cursor, 'results': [...]}, "
+                "'next' is null on the last page. Cannot be combined with 'qty'"
+            ),
+        ),
+        OpenApiParameter(
+            name="cursor",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Opaque cursor from the 'next' field of the previous page. "
+                "Must be sent with the same filters and ordering"
+            ),
+        ),
+        OpenApiParameter(
+            name="ordering",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            enum=["id", "-num_members"],
+            description=(
+                "Stable ordering used for pagination: 'id' (default) or "
+                "'-num_members' for the servers with the most members first"
+            ),
+        ),
+        OpenApiParameter(
+            name="fields",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Comma separated server fields to return, e.g. 'id,name'. "
+                "'channel_server.<field>' entries limit the fields of each channel. "
+                "Without 'fields' and 'expand' every field is returned"
+            ),
+        ),
+        OpenApiParameter(
+            name="expand",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Comma separated relations to return: 'members' and/or "
+                "'channel_server'. They are left out when 'fields' or 'expand' is "
+                "given without naming them"
+            ),
+        ),
+    ],
+)
+
+search_docs = extend_schema(
+    responses=SearchResultSerializer(many=True),
+    parameters=[
+        OpenApiParameter(
+            name="q",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            required=True,
+            description=(
+                "Words to search for, each one matches the start of a word (typeahead). "
+                "Searches server names and descriptions, channel names and topics, "
+                "and category names and descriptions"
+            ),
+        ),
+        OpenApiParameter(
+            name="type",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Comma separated kinds to return: category, server, channel",
+        ),
+        OpenApiParameter(
+            name="limit",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Maximum number of results, best matches first (default 20, max 50)",
+        ),
     ],
 )
+
+membership_batch_docs = extend_schema(
+    request=MembershipBatchSerializer,
+    responses={
+        200: MembershipBatchResultSerializer,
+        403: OpenApiResponse(
+            description="Only the owner of the server or staff can change its members"
+        ),
+        404: OpenApiResponse(description="The server does not exist"),
+    },
+)
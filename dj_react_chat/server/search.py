@@ -0,0 +1,309 @@
+# dj_react_chat\server\search.py
+
+import re
+
+from django.apps import apps
+from django.db import NotSupportedError, connection
+from django.db.models import IntegerField, Value
+
+# Document kinds and the code stored in the low bits of each entry id. An entry is
+# addressed by its rowid / primary key (``pk * 4 + code``), so updating or deleting
+# one never scans the index. The codes are stored, so they can never be renumbered,
+# and migration 0008 indexes existing rows with a frozen copy that must match.
+KINDS = {"category": 1, "server": 2, "channel": 3}
+KIND_CODES = {code: kind for kind, code in KINDS.items()}
+
+# Model, title field and body field of each kind.
+DOCUMENTS = {
+    "category": ("server.Category", "name", "description"),
+    "server": ("server.Server", "name", "description"),
+    "channel": ("server.Channel", "name", "topic"),
+}
+
+TABLE = "server_search_index"
+
+# Matches in titles weigh more than matches in bodies.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+def entry_id(kind, pk):
+    return pk * 4 + KINDS[kind]
+
+
+def search_terms(query):
+    """Split user input into lower case word terms, dropping any query syntax."""
+    return re.findall(r"\w+", query.lower())
+
+
+def document_rows(kind, queryset=None):
+    """
+    Return the index entries of a kind as ``(id, title, body, server_id)`` tuples.
+
+    ``server_id`` is the server a channel belongs to, the server itself for servers
+    and ``None`` for categories.
+
+    Args:
+        kind (str): ``"category"``, ``"server"`` or ``"channel"``.
+        queryset (QuerySet): The rows to index, defaults to all rows of the kind.
+    """
+    label, title, body = DOCUMENTS[kind]
+    if queryset is None:
+        queryset = apps.get_model(label).objects.all()
+    if kind == "channel":
+        server = "server_id"
+    elif kind == "server":
+        server = "pk"
+    else:
+        queryset = queryset.annotate(no_server=Value(None, output_field=IntegerField()))
+        server = "no_server"
+    for pk, title_value, body_value, server_id in queryset.values_list(
+        "pk", title, body, server
+    ).iterator():
+        yield entry_id(kind, pk), title_value or "", body_value or "", server_id
+
+
+class SearchResult(dict):
+    """One search hit: ``type``, ``id``, ``name``, ``server`` and ``rank``."""
+
+    @classmethod
+    def from_row(cls, rowid, title, server_id, rank):
+        return cls(
+            type=KIND_CODES[rowid % 4],
+            id=rowid // 4,
+            name=title,
+            server=server_id,
+            rank=rank,
+        )
+
+
+###########################
+# Backends
+###########################
+class SQLiteSearchBackend:
+    """
+    Search index in an SQLite FTS5 virtual table.
+
+    The table keeps prefix indexes for 2 and 3 characters so typeahead queries stay
+    index lookups, and hits are ranked with ``bm25()`` weighting titles over bodies.
+    """
+
+    def create(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "title, body, server_id UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def drop(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def match_expression(self, terms):
+        # Every term must match the start of a word.
+        return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+    def index(self, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {TABLE} WHERE rowid = %s", [(e[0],) for e in entries]
+            )
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, title, body, server_id) "
+                "VALUES (%s, %s, %s, %s)",
+                entries,
+            )
+
+    def delete(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {TABLE} WHERE rowid = %s", [(i,) for i in ids]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+
+    def optimize(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+    def search(self, terms, kinds, limit):
+        codes = ", ".join(str(KINDS[kind]) for kind in kinds)
+        # bm25() is lower for better matches, one weight per column.
+        sql = (
+            f"SELECT rowid, title, server_id, "
+            f"bm25({TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}, 0.0) AS rank "
+            f"FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid %% 4 IN ({codes}) "
+            "ORDER BY rank LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.match_expression(terms), limit])
+            return [
+                SearchResult.from_row(rowid, title, server_id, -rank)
+                for rowid, title, server_id, rank in cursor.fetchall()
+            ]
+
+
+class PostgresSearchBackend:
+    """
+    Search index in a PostgreSQL table with a generated, GIN indexed ``tsvector``.
+
+    Titles get weight A and bodies weight B, hits are ranked with ``ts_rank``.
+    """
+
+    def create(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE} ("
+            "id bigint PRIMARY KEY, title text NOT NULL, body text NOT NULL, "
+            "server_id bigint NULL, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', title), 'A') || "
+            "setweight(to_tsvector('simple', body), 'B')) STORED)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {TABLE}_document ON {TABLE} USING GIN (document)"
+        )
+
+    def drop(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def match_expression(self, terms):
+        # Terms only contain word characters, each one matches the start of a word.
+        return " & ".join(f"{term}:*" for term in terms)
+
+    def index(self, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (id, title, body, server_id) "
+                "VALUES (%s, %s, %s, %s) ON CONFLICT (id) DO UPDATE SET "
+                "title = EXCLUDED.title, body = EXCLUDED.body, "
+                "server_id = EXCLUDED.server_id",
+                entries,
+            )
+
+    def delete(self, ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE id = ANY(%s)", [list(ids)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {TABLE}")
+
+    def optimize(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {TABLE}")
+
+    def search(self, terms, kinds, limit):
+        weights = f"'{{0.1, 0.2, {BODY_WEIGHT / TITLE_WEIGHT}, 1.0}}'"
+        sql = (
+            f"SELECT id, title, server_id, ts_rank({weights}, document, query) AS rank "
+            f"FROM {TABLE}, to_tsquery('simple', %s) query "
+            "WHERE document @@ query AND id %% 4 = ANY(%s) "
+            "ORDER BY rank DESC, id LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql,
+                [self.match_expression(terms), [KINDS[k] for k in kinds], limit],
+            )
+            return [
+                SearchResult.from_row(rowid, title, server_id, rank)
+                for rowid, title, server_id, rank in cursor.fetchall()
+            ]
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    """
+    Return the search backend for a database vendor, the default connection's by default.
+
+    Raises:
+        NotSupportedError: If the database has no full-text search backend.
+    """
+    vendor = vendor or connection.vendor
+    try:
+        return BACKENDS[vendor]()
+    except KeyError:
+        raise NotSupportedError(f"Full-text search is not supported on {vendor}")
+
+
+###########################
+# Index maintenance
+###########################
+def instance_entry(kind, instance):
+    """Return the index entry of a model instance without querying."""
+    _, title, body = DOCUMENTS[kind]
+    if kind == "channel":
+        server_id = instance.server_id
+    else:
+        server_id = instance.pk if kind == "server" else None
+    return (
+        entry_id(kind, instance.pk),
+        getattr(instance, title) or "",
+        getattr(instance, body) or "",
+        server_id,
+    )
+
+
+def index_instance(kind, instance):
+    get_backend().index([instance_entry(kind, instance)])
+
+
+def delete_documents(kind, pks):
+    get_backend().delete([entry_id(kind, pk) for pk in pks])
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuild the whole index from the tables.
+
+    Args:
+        batch_size (int): Number of entries written per statement.
+
+    Returns:
+        int: The number of indexed documents.
+    """
+    backend = get_backend()
+    backend.clear()
+    indexed = 0
+    for kind in DOCUMENTS:
+        batch = []
+        for entry in document_rows(kind):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                backend.index(batch)
+                indexed += len(batch)
+                batch = []
+        backend.index(batch)
+        indexed += len(batch)
+    backend.optimize()
+    return indexed
+
+
+def search(query, kinds=None, limit=20):
+    """
+    Search the index, every word of the query must match the start of a word.
+
+    Args:
+        query (str): The user input, query syntax characters are ignored.
+        kinds (Iterable[str]): Restrict to these kinds, defaults to all of them.
+        limit (int): The maximum number of results.
+
+    Returns:
+        list[SearchResult]: The best ranked results first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    return get_backend().search(terms, list(kinds or KINDS), limit)
@@ -0,0 +1,146 @@
+# dj_react_chat\server\seed.py
+
+import random
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .cache import bump_versions
+from .models import Category, Channel, Server
+from .search import rebuild_index
+
+Membership = Server.members.through
+
+
+def member_counts(servers, max_members, skew, accounts):
+    """
+    Return a Zipf-like distribution of server sizes, largest first.
+
+    The server of rank ``r`` gets ``max_members / r ** skew`` members (at least one),
+    so a few servers are huge and most are small, like real communities.
+
+    Args:
+        servers (int): The number of servers.
+        max_members (int): The size of the largest server.
+        skew (float): The Zipf exponent, 0 gives every server ``max_members``.
+        accounts (int): The number of accounts, no server can have more members.
+    """
+    top = min(max_members, accounts)
+    return [max(1, int(top / (rank**skew))) for rank in range(1, servers + 1)]
+
+
+@transaction.atomic
+def seed_bench(
+    accounts=1000,
+    categories=10,
+    servers=500,
+    channels=3,
+    max_members=500,
+    skew=1.0,
+    batch_size=1000,
+    prefix="bench",
+    seed=0,
+):
+    """
+    Bulk create synthetic accounts, categories, servers, memberships and channels.
+
+    Rows are written with ``bulk_create`` in batches of ``batch_size``, bypassing the
+    per-row signals, so ``member_count``, the search index and the listing cache are
+    brought up to date once at the end. Accounts and categories named after ``prefix``
+    are reused when seeding again, servers and channels are always added.
+
+    Args:
+        accounts (int): The number of accounts.
+        categories (int): The number of categories.
+        servers (int): The number of servers to add.
+        channels (int): The number of channels per server.
+        max_members (int): The size of the largest server.
+        skew (float): How unevenly members are spread, see ``member_counts``.
+        batch_size (int): Number of rows per INSERT.
+        prefix (str): Prefix of the account, category and server names.
+        seed (int): Seed of the random generator, the same seed gives the same data.
+
+    Returns:
+        dict: The number of rows created per kind.
+    """
+    rng = random.Random(seed)
+    Account = get_user_model()
+
+    Account.objects.bulk_create(
+        [
+            # "!" is an unusable password hash, hashing real passwords would dominate
+            Account(username=f"{prefix}{i}", password="!")
+            for i in range(accounts)
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    account_ids = list(
+        Account.objects.filter(username__regex=rf"^{re.escape(prefix)}\d+$")
+        .order_by("pk")
+        .values_list("pk", flat=True)[:accounts]
+    )
+
+    names = [f"{prefix} {i}" for i in range(categories)]
+    existing = set(
+        Category.objects.filter(name__in=names).values_list("name", flat=True)
+    )
+    Category.objects.bulk_create(
+        [Category(name=name) for name in names if name not in existing],
+        batch_size=batch_size,
+    )
+    category_ids = list(
+        Category.objects.filter(name__in=names).values_list("pk", flat=True)
+    )
+
+    sizes = member_counts(servers, max_members, skew, len(account_ids))
+    created = Server.objects.bulk_create(
+        [
+            Server(
+                name=f"{prefix} server {i}",
+                description=f"Synthetic server {i}" if i % 2 else None,
+                owner_id=rng.choice(account_ids),
+                category_id=rng.choice(category_ids),
+                member_count=size,
+            )
+            for i, size in enumerate(sizes)
+        ],
+        batch_size=batch_size,
+    )
+
+    memberships = 0
+    batch = []
+    for server, size in zip(created, sizes):
+        for account_id in rng.sample(account_ids, size):
+            batch.append(Membership(server_id=server.pk, account_id=account_id))
+        if len(batch) >= batch_size:
+            Membership.objects.bulk_create(batch, batch_size=batch_size)
+            memberships += len(batch)
+            batch = []
+    Membership.objects.bulk_create(batch, batch_size=batch_size)
+    memberships += len(batch)
+
+    Channel.objects.bulk_create(
+        [
+            Channel(
+                name=f"channel {c}",
+                topic=f"topic {c}",
+                owner_id=server.owner_id,
+                server_id=server.pk,
+            )
+            for server in created
+            for c in range(channels)
+        ],
+        batch_size=batch_size,
+    )
+
+    rebuild_index(batch_size=batch_size)
+    bump_versions(category_names=names)
+    return {
+        "accounts": len(account_ids),
+        "categories": len(category_ids),
+        "servers": len(created),
+        "memberships": memberships,
+        "channels": len(created) * channels,
+    }
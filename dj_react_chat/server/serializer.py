@@ -1,20 +1,54 @@
+from django.core.files.storage import default_storage
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from .models import Server, Channel
 
 
+def variant_urls(variants):
+    """Turn the stored ``<field>_variants`` of an image into URLs.
+
+    Args:
+        variants (dict): ``{"source": name, "webp": {"32": name, ...}, "jpeg": {...}}``
+
+    Returns:
+        dict: ``{"webp": {"32": url, ...}, "jpeg": {...}}``, empty until the variants
+        have been generated.
+    """
+    return {
+        image_format: {size: default_storage.url(name) for size, name in names.items()}
+        for image_format, names in variants.items()
+        if image_format != "source"
+    }
+
+
 class ChannelSerializer(serializers.ModelSerializer):
     """Serializer for Channel model.
 
     This serializer handles the serialization and deserialization of the Channel model.
 
     Attributes:
+        icon_variants: URLs of the resized icon per format and size.
+        banner_variants: URLs of the resized banner per format and size.
         Meta.model: The model class that this serializer is associated with.
-        Meta.fields: Specifies which fields of the model should be included in the serialization.
+        Meta.exclude: Specifies which fields of the model are left out of the serialization.
     """
 
+    icon_variants = serializers.SerializerMethodField()
+    banner_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Channel
-        fields = "__all__"
+        # updated_at only feeds the listing ETags
+        exclude = ["updated_at"]
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_icon_variants(self, obj):
+        return variant_urls(obj.icon_variants)
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_banner_variants(self, obj):
+        return variant_urls(obj.banner_variants)
 
 
 class ServerSerializer(serializers.ModelSerializer):
@@ -37,20 +71,20 @@ class ServerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Server
-        fields = "__all__"
+        # member_count is exposed as num_members, updated_at only feeds the ETags
+        exclude = ["member_count", "updated_at"]
 
+    @extend_schema_field(OpenApiTypes.INT)
     def get_num_members(self, obj):
-        """Retrieve the number of members in the server if available.
+        """Retrieve the number of members in the server.
 
         Args:
             obj (Server): The server instance being serialized.
 
         Returns:
-            int or None: The number of members or None if not available.
+            int: The stored number of members.
         """
-        if hasattr(obj, "num_members"):
-            return obj.num_members
-        return None
+        return obj.member_count
 
     def to_representation(self, instance):
         """Customize the serialized representation.
@@ -69,3 +103,49 @@ class ServerSerializer(serializers.ModelSerializer):
         if not num_members:
             data.pop("num_members", None)
         return data
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """Serializer for a hit of the full-text search.
+
+    Attributes:
+        type: ``"category"``, ``"server"`` or ``"channel"``.
+        id: The id of the category, server or channel.
+        name: Its name.
+        server: The server of a channel, the server itself for servers, null for categories.
+        rank: The relevance, higher is better.
+    """
+
+    type = serializers.ChoiceField(choices=["category", "server", "channel"])
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    server = serializers.IntegerField(allow_null=True)
+    rank = serializers.FloatField()
+
+
+class MembershipBatchSerializer(serializers.Serializer):
+    """Serializer for the accounts of a bulk join or leave.
+
+    Attributes:
+        accounts: The ids of the accounts to add or remove.
+    """
+
+    MAX_ACCOUNTS = 10_000
+
+    accounts = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_ACCOUNTS,
+    )
+
+
+class MembershipBatchResultSerializer(serializers.Serializer):
+    """Serializer for the outcome of a bulk join or leave.
+
+    Attributes:
+        accounts: The accounts that were actually added or removed.
+        num_members: The number of members of the server afterwards.
+    """
+
+    accounts = serializers.ListField(child=serializers.IntegerField())
+    num_members = serializers.IntegerField()
@@ -0,0 +1,257 @@
+# dj_react_chat\server\signals.py
+
+from collections import Counter
+
+from django.conf import settings
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import search
+from .cache import bump_versions
+from .images import blob_names, schedule_variants
+from .members import Membership, adjust_member_counts, members_bulk_changed
+from .models import Category, Server, Channel
+from .storage import acquire_blobs, release_blobs
+
+
+###########################
+# Server.member_count
+###########################
+@receiver(m2m_changed, sender=Membership)
+def update_member_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep ``Server.member_count`` exact when memberships are added or removed.
+
+    ``post_add`` only reports the rows that were actually inserted, but ``remove()``
+    and ``clear()`` report what was asked for, so the rows that really exist are
+    looked up in the ``pre_`` phase and applied in the ``post_`` phase.
+    """
+    if action == "post_add":
+        if reverse:
+            adjust_member_counts(dict.fromkeys(pk_set, 1))
+        else:
+            adjust_member_counts({instance.pk: len(pk_set)})
+
+    elif action in ("pre_remove", "pre_clear"):
+        if reverse:
+            existing = Membership.objects.filter(account_id=instance.pk)
+            if action == "pre_remove":
+                existing = existing.filter(server_id__in=pk_set)
+            deltas = dict.fromkeys(existing.values_list("server_id", flat=True), -1)
+        else:
+            existing = Membership.objects.filter(server_id=instance.pk)
+            if action == "pre_remove":
+                existing = existing.filter(account_id__in=pk_set)
+            deltas = {instance.pk: -existing.count()}
+        instance._member_count_deltas = deltas
+
+    elif action in ("post_remove", "post_clear"):
+        adjust_member_counts(instance.__dict__.pop("_member_count_deltas", {}))
+
+
+@receiver(members_bulk_changed, sender=Membership)
+def bulk_update_member_count(sender, server, action, account_ids, **kwargs):
+    """``bulk_join`` and ``bulk_leave`` only report the rows they really changed."""
+    delta = len(account_ids) if action == "join" else -len(account_ids)
+    adjust_member_counts({server.pk: delta})
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def account_delete_member_count(sender, instance, **kwargs):
+    """Deleting an account cascades to its memberships without ``m2m_changed``."""
+    server_ids = list(
+        Membership.objects.filter(account_id=instance.pk).values_list(
+            "server_id", flat=True
+        )
+    )
+    if server_ids:
+        adjust_member_counts(dict.fromkeys(server_ids, -1))
+        members_changed(
+            Membership, instance, "post_remove", reverse=True, pk_set=server_ids
+        )
+
+
+###########################
+# Image variants
+###########################
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Channel)
+def generate_image_variants(sender, instance, **kwargs):
+    for field_name in sender.VARIANT_FIELDS:
+        schedule_variants(instance, field_name)
+
+
+###########################
+# Media references
+###########################
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Channel)
+def remember_previous_blobs(sender, instance, **kwargs):
+    instance._previous_blob_names = []
+    if instance.pk is None:
+        return
+    fields = [
+        name
+        for field_name in sender.VARIANT_FIELDS
+        for name in (field_name, f"{field_name}_variants")
+    ]
+    if all(instance.is_tracked(name) for name in fields):
+        instance._previous_blob_names = blob_names(instance, previous=True)
+        return
+    # Not loaded from the database, e.g. built with an explicit pk.
+    previous = sender.objects.filter(pk=instance.pk).only(*fields).first()
+    if previous:
+        instance._previous_blob_names = blob_names(previous)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Channel)
+def update_blob_references(sender, instance, **kwargs):
+    """
+    Move references from the files a row used to the files it uses now.
+
+    Files are not deleted here, ``manage.py sweep_blobs`` removes them once they have
+    been unreferenced for a while.
+    """
+    previous = Counter(instance.__dict__.pop("_previous_blob_names", []))
+    current = Counter(blob_names(instance))
+    acquire_blobs((current - previous).elements())
+    release_blobs((previous - current).elements())
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Channel)
+def release_deleted_blobs(sender, instance, **kwargs):
+    release_blobs(blob_names(instance))
+
+
+###########################
+# Search index
+###########################
+SEARCH_KINDS = {Category: "category", Server: "server", Channel: "channel"}
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Server)
+@receiver(post_save, sender=Channel)
+def update_search_index(sender, instance, created, **kwargs):
+    """Reindex a row in the same transaction, only when its searchable text changed."""
+    kind = SEARCH_KINDS[sender]
+    _, title, body = search.DOCUMENTS[kind]
+    if created or instance.has_changed(title) or instance.has_changed(body):
+        search.index_instance(kind, instance)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Server)
+@receiver(post_delete, sender=Channel)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.delete_documents(SEARCH_KINDS[sender], [instance.pk])
+
+
+###########################
+# Listing cache invalidation
+###########################
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Server)
+def remember_previous_category(sender, instance, **kwargs):
+    """Keep the category name a row had before saving, renames and moves affect it too."""
+    instance._previous_category_name = None
+    if instance.pk is None:
+        return
+    if sender is Category:
+        if instance.is_tracked("name"):
+            instance._previous_category_name = instance.previous_value("name")
+            return
+        lookup = Category.objects.filter(pk=instance.pk).values_list("name")
+    elif instance.is_tracked("category"):
+        if not instance.has_changed("category"):
+            return
+        # Only a server moving to another category costs a query.
+        lookup = Category.objects.filter(
+            pk=instance.previous_value("category")
+        ).values_list("name")
+    else:
+        lookup = Server.objects.filter(pk=instance.pk).values_list("category__name")
+    row = lookup.first()
+    if row:
+        instance._previous_category_name = row[0]
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_versions(
+        category_names=[
+            instance.name,
+            getattr(instance, "_previous_category_name", None),
+        ]
+    )
+
+
+@receiver(post_save, sender=Server)
+@receiver(post_delete, sender=Server)
+def server_changed(sender, instance, **kwargs):
+    names = [getattr(instance, "_previous_category_name", None)]
+    category = Category.objects.filter(pk=instance.category_id).first()
+    if category:
+        names.append(category.name)
+    bump_versions(category_names=names, server_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Channel)
+@receiver(post_delete, sender=Channel)
+def channel_changed(sender, instance, **kwargs):
+    # Channels are nested in the server listing, so they change the server's ETag.
+    Server.objects.filter(pk=instance.server_id).update(updated_at=timezone.now())
+    row = (
+        Server.objects.filter(pk=instance.server_id)
+        .values_list("category__name", flat=True)
+        .first()
+    )
+    bump_versions(category_names=[row], server_ids=[instance.server_id])
+
+
+@receiver(m2m_changed, sender=Membership)
+def members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalidate listings when memberships change.
+
+    ``instance`` is the server for ``server.members`` changes, or the account for
+    ``account.server_members`` changes, in which case ``pk_set`` holds server ids.
+    """
+    if not reverse:
+        if action.startswith("post_"):
+            server_changed(Server, instance)
+        return
+
+    if action == "pre_clear":
+        # pk_set is not provided for clear(), so remember the servers beforehand.
+        instance._cleared_server_ids = list(
+            Membership.objects.filter(account_id=instance.pk).values_list(
+                "server_id", flat=True
+            )
+        )
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_server_ids", [])
+    elif not action.startswith("post_"):
+        return
+
+    rows = Server.objects.filter(pk__in=pk_set).values_list("id", "category__name")
+    bump_versions(
+        category_names=[name for _, name in rows],
+        server_ids=[pk for pk, _ in rows],
+    )
+
+
+@receiver(members_bulk_changed, sender=Membership)
+def members_bulk_changed_listings(sender, server, **kwargs):
+    server_changed(Server, server)
@@ -0,0 +1,198 @@
+# dj_react_chat\server\storage.py
+
+import hashlib
+import logging
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its content.
+
+    Uploads are stored as ``cas/<h[:2]>/<h[2:4]>/<h><ext>``. Saving content that is
+    already stored writes nothing and returns the existing name, so identical icons
+    and banners are stored once however many rows use them. Files are never deleted
+    when a row stops using them: references are counted in ``server.models.Blob`` and
+    unreferenced files are removed later by ``sweep_blobs``.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        if hasattr(content, "seek"):
+            content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return f"cas/{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{extension}"
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        name = self.content_name(name, content)
+        # Reusing a released file restarts its grace period, so the sweeper leaves it
+        # alone until the new reference is recorded.
+        Blob.objects.filter(name=name, released_at__isnull=False).update(
+            released_at=timezone.now()
+        )
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+###########################
+# Reference counting
+###########################
+def _by_count(names):
+    """Group names by how many times they occur."""
+    groups = {}
+    for name, count in Counter(n for n in names if n).items():
+        groups.setdefault(count, []).append(name)
+    return groups
+
+
+def acquire_blobs(names):
+    """
+    Add one reference per occurrence of each name.
+
+    Args:
+        names (Iterable[str]): Storage names, repeated once per reference.
+    """
+    # Imported here because this module is loaded as the storage backend, which can
+    # happen before the app registry is ready.
+    from .models import Blob
+
+    groups = _by_count(names)
+    if not groups:
+        return
+    all_names = [name for group in groups.values() for name in group]
+    Blob.objects.bulk_create(
+        [Blob(name=name) for name in all_names], ignore_conflicts=True
+    )
+    for count, group in groups.items():
+        Blob.objects.filter(name__in=group).update(
+            refs=F("refs") + count, released_at=None
+        )
+
+
+def release_blobs(names):
+    """
+    Drop one reference per occurrence of each name.
+
+    Blobs left without references are stamped with ``released_at`` and deleted by
+    the sweeper once the grace period has passed.
+
+    Args:
+        names (Iterable[str]): Storage names, repeated once per reference.
+    """
+    from .models import Blob
+
+    groups = _by_count(names)
+    for count, group in groups.items():
+        Blob.objects.filter(name__in=group).update(refs=F("refs") - count)
+    if groups:
+        Blob.objects.filter(
+            name__in=[name for group in groups.values() for name in group],
+            refs__lte=0,
+            released_at__isnull=True,
+        ).update(released_at=timezone.now())
+
+
+def recount_blobs(blob_model=None, sources=None, batch_size=500):
+    """
+    Set the references of every stored file from the rows that use it.
+
+    Repairs counts that drifted, and creates the rows of files uploaded before blobs
+    were counted, which would otherwise never be swept once they are replaced. Files
+    no row references are left alone.
+
+    Args:
+        blob_model: The ``Blob`` model, the historical one in a migration.
+        sources (dict): Model to the names of its image fields, each with a
+            ``<field>_variants`` field. Defaults to ``Category`` and ``Channel``.
+        batch_size (int): The number of rows read per query.
+
+    Returns:
+        int: The number of files referenced.
+    """
+    from .images import variant_names
+    from .models import Blob, Category, Channel
+
+    blob_model = blob_model or Blob
+    if sources is None:
+        sources = {model: model.VARIANT_FIELDS for model in (Category, Channel)}
+    counts = Counter()
+    for model, field_names in sources.items():
+        columns = [
+            column
+            for field_name in field_names
+            for column in (field_name, f"{field_name}_variants")
+        ]
+        rows = model.objects.values_list(*columns).iterator(chunk_size=batch_size)
+        for row in rows:
+            for image, variants in zip(row[::2], row[1::2]):
+                if image:
+                    counts[image] += 1
+                counts.update(variant_names(variants))
+
+    names = list(counts)
+    for start in range(0, len(names), batch_size):
+        blob_model.objects.bulk_create(
+            [blob_model(name=name) for name in names[start : start + batch_size]],
+            ignore_conflicts=True,
+        )
+    for count, group in _by_count(counts.elements()).items():
+        for start in range(0, len(group), batch_size):
+            blob_model.objects.filter(
+                name__in=group[start : start + batch_size]
+            ).update(refs=count, released_at=None)
+    return len(names)
+
+
+def sweep_blobs(grace=timedelta(hours=1), batch_size=500, storage=None):
+    """
+    Delete the files of blobs that have been unreferenced for longer than ``grace``.
+
+    The row is deleted first and only if it is still unreferenced, so a blob that was
+    acquired again in the meantime is kept. Saving content that is already stored
+    moves ``released_at`` forward, so an upload that reused the file has ``grace``
+    to record its reference before the file can be deleted.
+
+    Args:
+        grace (timedelta): How long a blob must have been unreferenced.
+        batch_size (int): The number of blobs to handle per query.
+        storage: The storage holding the files, defaults to ``default_storage``.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    from .models import Blob
+
+    storage = storage or default_storage
+    cutoff = timezone.now() - grace
+    deleted = 0
+    while True:
+        candidates = list(
+            Blob.objects.filter(refs__lte=0, released_at__lt=cutoff).values_list(
+                "pk", "name"
+            )[:batch_size]
+        )
+        if not candidates:
+            return deleted
+        for pk, name in candidates:
+            removed, _ = Blob.objects.filter(pk=pk, refs__lte=0).delete()
+            if not removed:
+                continue
+            try:
+                storage.delete(name)
+                deleted += 1
+            except OSError:
+                logger.exception("Failed to delete blob %s", name)
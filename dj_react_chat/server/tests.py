@@ -1,3 +1,1200 @@
-from django.test import TestCase
+import base64
+import importlib
+import itertools
+import json
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from account import cache as account_cache
+
+from .cache import get_cache
+from .images import generate_variants, variant_names
+from .members import (
+    bulk_join,
+    bulk_leave,
+    members_bulk_changed,
+    recount_member_counts,
+)
+from .models import Blob, Category, Server, Channel
+from .query import ServerQueryPlan
+from .row_serializer import ChannelRowSerializer, ServerRowSerializer
+from .search import KINDS, search
+from .serializer import ChannelSerializer, ServerSerializer
+from .storage import recount_blobs, sweep_blobs
+from .validators import validate_icon_image_size, validate_image_header
+
+SERVER_SELECT_URL = "/api/v1/server/select/"
+SERVER_SELECT_ASYNC_URL = "/api/v1/server/select-async/"
+
+# Sort keys a client could forge into a cursor for the ``id`` ordering.
+TAMPERED_POSITIONS = (["x"], [None], [{"a": 1}], [[1]], [float("inf")], 1, [2**64])
+
+
+def make_cursor(ordering, position):
+    payload = json.dumps({"o": ordering, "p": position}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+class ServerFixtureMixin:
+    """Creates accounts, a category and servers with members and channels."""
+
+    @classmethod
+    def create_servers(cls, count, category, owner, members=(), channels=2):
+        servers = []
+        for i in range(count):
+            server = Server.objects.create(
+                name=f"server {i}", owner=owner, category=category
+            )
+            server.members.add(owner, *members)
+            for c in range(channels):
+                Channel.objects.create(
+                    name=f"channel {c}", owner=owner, topic="topic", server=server
+                )
+            servers.append(server)
+        return servers
+
+    @classmethod
+    def setUpTestData(cls):
+        Account = get_user_model()
+        cls.owner = Account.objects.create_user(username="owner", password="pw")
+        cls.members = [
+            Account.objects.create_user(username=f"member{i}", password="pw")
+            for i in range(3)
+        ]
+        cls.category = Category.objects.create(name="gaming")
+        cls.other_category = Category.objects.create(name="music")
+
+
+class ServerListQueryCountTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def assertConstantQueries(self, params):
+        # ETag aggregate, servers, members, channels
+        self.create_servers(2, self.category, self.owner, self.members)
+        with self.assertNumQueries(4):
+            self.client.get(SERVER_SELECT_URL, params)
+        self.create_servers(10, self.category, self.owner, self.members)
+        with self.assertNumQueries(4):
+            response = self.client.get(SERVER_SELECT_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_category_listing(self):
+        response = self.assertConstantQueries({"category": "gaming"})
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(len(response.data[0]["channel_server"]), 2)
+        self.assertEqual(len(response.data[0]["members"]), 4)
+
+    def test_with_num_members(self):
+        response = self.assertConstantQueries({"with_num_members": "true"})
+        self.assertTrue(all(s["num_members"] == 4 for s in response.data))
+
+    def test_by_user_keeps_full_member_count(self):
+        response = self.assertConstantQueries(
+            {"by_user": "true", "with_num_members": "true"}
+        )
+        self.assertEqual(len(response.data), 12)
+        self.assertTrue(all(s["num_members"] == 4 for s in response.data))
+
+    def test_qty(self):
+        response = self.assertConstantQueries({"qty": "5"})
+        self.assertEqual(len(response.data), 5)
+
+    def test_invalid_qty(self):
+        for qty in ("abc", "-1", "0"):
+            with self.subTest(qty=qty):
+                response = self.client.get(SERVER_SELECT_URL, {"qty": qty})
+                self.assertEqual(response.status_code, 400)
+
+    def test_by_server_id(self):
+        server = self.create_servers(1, self.category, self.owner)[0]
+        # ETag aggregate (also the existence check), servers, members, channels
+        with self.assertNumQueries(4):
+            response = self.client.get(SERVER_SELECT_URL, {"by_server_id": server.id})
+        self.assertEqual([s["id"] for s in response.data], [server.id])
+
+    def test_by_server_id_not_found(self):
+        response = self.client.get(SERVER_SELECT_URL, {"by_server_id": 999})
+        self.assertEqual(response.status_code, 400)
+
+    def test_by_user_requires_authentication(self):
+        response = APIClient().get(SERVER_SELECT_URL, {"by_user": "true"})
+        self.assertEqual(response.status_code, 403)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite syntax")
+class SparseFieldsetTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.create_servers(3, self.category, self.owner, self.members)
+
+    def test_fields_trim_select_and_output(self):
+        # ETag aggregate and servers, members and channels are not queried
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(SERVER_SELECT_URL, {"fields": "id,name"})
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("description", queries[1]["sql"])
+        self.assertEqual(
+            [sorted(server) for server in response.json()], [["id", "name"]] * 3
+        )
+
+    def test_expand_without_fields(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(SERVER_SELECT_URL, {"expand": "members"})
+        server = response.json()[0]
+        self.assertEqual(len(server["members"]), 4)
+        self.assertNotIn("channel_server", server)
+        self.assertIn("description", server)
+
+    def test_channel_fields(self):
+        response = self.client.get(
+            SERVER_SELECT_URL,
+            {"fields": "name,channel_server.name", "expand": "channel_server"},
+        )
+        self.assertEqual(
+            response.json()[0],
+            {
+                "name": "server 0",
+                "channel_server": [{"name": "channel 0"}, {"name": "channel 1"}],
+            },
+        )
+
+    def test_num_members_in_fields(self):
+        response = self.client.get(SERVER_SELECT_URL, {"fields": "num_members"})
+        self.assertEqual(response.json()[0], {"num_members": 4})
+
+    def test_same_as_full_listing_when_everything_is_requested(self):
+        full = self.client.get(SERVER_SELECT_URL).json()
+        get_cache().clear()
+        fields = "id,name,description,owner,category,members,channel_server"
+        self.assertEqual(
+            self.client.get(SERVER_SELECT_URL, {"fields": fields}).json(), full
+        )
+
+    def test_fieldsets_are_cached_separately(self):
+        self.client.get(SERVER_SELECT_URL, {"fields": "id"})
+        response = self.client.get(SERVER_SELECT_URL, {"fields": "name"})
+        self.assertEqual(sorted(response.json()[0]), ["name"])
+
+    def test_invalid(self):
+        for params in (
+            {"fields": "id,secret"},
+            {"expand": "owner"},
+            {"fields": "channel_server.secret", "expand": "channel_server"},
+            {"fields": "id,channel_server.name"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(SERVER_SELECT_URL, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_msgpack(self):
+        import msgpack
+
+        expected = self.client.get(SERVER_SELECT_URL, {"fields": "id"}).json()
+        response = self.client.get(
+            SERVER_SELECT_URL, {"fields": "id"}, HTTP_ACCEPT="application/msgpack"
+        )
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertIn("Accept", response["Vary"])
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+
+class QueryPlanTests(ServerFixtureMixin, TestCase):
+    """
+    Fails when a query of a filtered server listing reads a whole table.
+
+    Every combination of the supported filters, orderings, pagination and member
+    counts is requested, and each query the listing ran is checked with ``EXPLAIN
+    QUERY PLAN``. Unfiltered listings are left out, reading every server is what they
+    are asked to do.
+    """
+
+    FILTERS = ["category", "by_user", "by_server_id"]
+    # "SCAN table" without an index, "SCAN table USING ... INDEX" reads the index.
+    FULL_SCAN = re.compile(r"\bSCAN (\w+)$")
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.server = self.create_servers(3, self.category, self.owner, self.members)[0]
+
+    def query_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def filter_plan(self, **filters):
+        queryset = ServerQueryPlan(**filters).filter().values("id")
+        return "\n".join(self.query_plan(*queryset.query.sql_with_params()))
+
+    def param_combinations(self):
+        values = {
+            "category": self.category.name,
+            "by_user": "true",
+            "by_server_id": self.server.id,
+        }
+        for count in range(1, len(self.FILTERS) + 1):
+            for names in itertools.combinations(self.FILTERS, count):
+                for ordering, paginate, num_members in itertools.product(
+                    ["id", "-num_members"], [False, True], [False, True]
+                ):
+                    params = {name: values[name] for name in names}
+                    if paginate:
+                        params.update(ordering=ordering, page_size=2)
+                    if num_members:
+                        params["with_num_members"] = "true"
+                    yield params
+
+    def test_filtered_listings_use_indexes(self):
+        checked = 0
+        for params in self.param_combinations():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(SERVER_SELECT_URL, params)
+            self.assertEqual(response.status_code, 200, params)
+            for query in context.captured_queries:
+                if not query["sql"].startswith("SELECT"):
+                    continue
+                plan = self.query_plan(query["sql"])
+                scans = [step for step in plan if self.FULL_SCAN.search(step)]
+                self.assertEqual(scans, [], f"{params}\n{query['sql']}\n{plan}")
+                checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_category_filter_uses_name_index(self):
+        plan = self.filter_plan(category="gaming")
+        self.assertRegex(plan, r"USING (COVERING )?INDEX server_category_name")
+
+    def test_member_filter_uses_covering_index(self):
+        plan = self.filter_plan(user_id=self.owner.id)
+        self.assertIn(
+            "USING COVERING INDEX server_server_members_account_server_idx", plan
+        )
+
+
+class ServerListCacheTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.server = self.create_servers(1, self.category, self.owner)[0]
+
+    def get(self, **params):
+        return self.client.get(SERVER_SELECT_URL, params).data
+
+    def test_repeated_request_is_served_from_cache(self):
+        self.get(category="gaming")
+        with self.assertNumQueries(0):
+            self.get(category="gaming")
+
+    def test_member_added(self):
+        self.get(category="gaming", with_num_members="true")
+        self.server.members.add(self.members[0])
+        data = self.get(category="gaming", with_num_members="true")
+        self.assertEqual(data[0]["num_members"], 2)
+
+    def test_reverse_membership_changes(self):
+        self.get(by_user="true")
+        self.owner.server_members.clear()
+        self.assertEqual(self.get(by_user="true"), [])
+        self.owner.server_members.add(self.server)
+        self.assertEqual(len(self.get(by_user="true")), 1)
+
+    def test_channel_created(self):
+        self.get(by_server_id=self.server.id)
+        Channel.objects.create(
+            name="new", owner=self.owner, topic="topic", server=self.server
+        )
+        data = self.get(by_server_id=self.server.id)
+        self.assertEqual(len(data[0]["channel_server"]), 3)
+
+    def test_server_moved_to_other_category(self):
+        self.get(category="gaming")
+        self.server.category = self.other_category
+        self.server.save()
+        self.assertEqual(self.get(category="gaming"), [])
+        self.assertEqual(len(self.get(category="music")), 1)
+
+    def test_category_renamed(self):
+        self.get(category="gaming")
+        self.category.name = "games"
+        self.category.save()
+        self.assertEqual(self.get(category="gaming"), [])
+
+    def test_by_user_is_keyed_per_user(self):
+        self.get(by_user="true")
+        self.client.force_authenticate(self.members[0])
+        self.assertEqual(self.get(by_user="true"), [])
+
+
+class ConditionalGetTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.server = self.create_servers(1, self.category, self.owner)[0]
+
+    def get(self, etag=None, **params):
+        # Bypass the listing cache so the ETag is computed from the database.
+        get_cache().clear()
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get(SERVER_SELECT_URL, params, headers=headers)
+
+    def assertChangesETag(self, change, **params):
+        etag = self.get(**params)["ETag"]
+        change()
+        response = self.get(etag, **params)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_not_modified(self):
+        etag = self.get(category="gaming")["ETag"]
+        # ETag aggregate only
+        with self.assertNumQueries(1):
+            response = self.get(etag, category="gaming")
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_not_modified_from_cache(self):
+        etag = self.client.get(SERVER_SELECT_URL)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                SERVER_SELECT_URL, headers={"If-None-Match": etag}
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_params(self):
+        self.assertNotEqual(
+            self.get(category="gaming")["ETag"],
+            self.get(category="gaming", with_num_members="true")["ETag"],
+        )
+
+    def test_server_saved(self):
+        def rename():
+            self.server.name = "renamed"
+            self.server.save()
+
+        self.assertChangesETag(rename, category="gaming")
+
+    def test_unchanged_save_keeps_etag(self):
+        etag = self.get()["ETag"]
+        Server.objects.get(pk=self.server.pk).save()
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_member_added(self):
+        self.assertChangesETag(lambda: self.server.members.add(self.members[0]))
+
+    def test_channel_deleted(self):
+        self.assertChangesETag(
+            lambda: self.server.channel_server.first().delete(),
+            by_server_id=self.server.id,
+        )
+
+    def test_server_deleted(self):
+        self.create_servers(1, self.category, self.owner)
+        self.assertChangesETag(self.server.delete, category="gaming")
+
+    def test_category_renamed(self):
+        def rename():
+            self.other_category.name = "gaming"
+            self.other_category.save()
+            self.category.name = "music"
+            self.category.save()
+
+        self.create_servers(1, self.other_category, self.owner)
+        self.assertChangesETag(rename, category="gaming")
+
+
+class ServerListPaginationTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.servers = self.create_servers(7, self.category, self.owner, channels=1)
+        self.create_servers(2, self.other_category, self.owner, channels=1)
+        # Give the servers different member counts: server i has i + 1 members.
+        Account = get_user_model()
+        extra = [
+            Account(username=f"extra{i}", password="pw")
+            for i in range(len(self.servers))
+        ]
+        Account.objects.bulk_create(extra)
+        for i, server in enumerate(self.servers):
+            server.members.add(*extra[:i])
+
+    def get_all_pages(self, params):
+        ids, cursor = [], None
+        while True:
+            page = dict(params, **({"cursor": cursor} if cursor else {}))
+            response = self.client.get(SERVER_SELECT_URL, page)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(s["id"] for s in response.data["results"])
+            cursor = response.data["next"]
+            if cursor is None:
+                return ids
+
+    def test_pages_by_id(self):
+        ids = self.get_all_pages({"category": "gaming", "page_size": 3})
+        self.assertEqual(ids, sorted(s.id for s in self.servers))
+
+    def test_pages_by_num_members(self):
+        ids = self.get_all_pages(
+            {"category": "gaming", "page_size": 2, "ordering": "-num_members"}
+        )
+        self.assertEqual(ids, [s.id for s in reversed(self.servers)])
+
+    def test_deep_page_query_count(self):
+        first = self.client.get(SERVER_SELECT_URL, {"page_size": 2}).data
+        get_cache().clear()
+        # ETag aggregate, servers, members, channels
+        with self.assertNumQueries(4):
+            self.client.get(
+                SERVER_SELECT_URL, {"page_size": 2, "cursor": first["next"]}
+            )
+
+    def test_cursor_for_other_ordering_is_rejected(self):
+        cursor = self.client.get(SERVER_SELECT_URL, {"page_size": 2}).data["next"]
+        response = self.client.get(
+            SERVER_SELECT_URL, {"cursor": cursor, "ordering": "-num_members"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(SERVER_SELECT_URL, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_cursor(self):
+        for position in TAMPERED_POSITIONS:
+            with self.subTest(position=position):
+                response = self.client.get(
+                    SERVER_SELECT_URL,
+                    {"page_size": 1, "cursor": make_cursor(["id"], position)},
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_qty_and_page_size_are_exclusive(self):
+        response = self.client.get(SERVER_SELECT_URL, {"qty": 2, "page_size": 2})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncServerListTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.servers = self.create_servers(3, self.category, self.owner, self.members)
+        self.create_servers(2, self.other_category, self.owner)
+
+    async def assertSameResponse(self, params):
+        await self.async_client.aforce_login(self.owner)
+        expected = await sync_to_async(self.client.get)(SERVER_SELECT_URL, params)
+        get_cache().clear()
+        response = await self.async_client.get(SERVER_SELECT_ASYNC_URL, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.get("ETag"), expected.get("ETag"))
+        return response
+
+    async def test_matches_sync_listing(self):
+        for params in (
+            {},
+            {"category": "gaming", "with_num_members": "true"},
+            {"qty": "2"},
+            {"by_user": "true"},
+            {"by_server_id": self.servers[1].id},
+            {"page_size": "2", "ordering": "-num_members"},
+            {"fields": "id,name,channel_server.topic", "expand": "channel_server"},
+            {"fields": "id", "format": "msgpack"},
+        ):
+            with self.subTest(params=params):
+                await self.assertSameResponse(params)
+
+    async def test_matches_sync_errors(self):
+        for params in (
+            {"by_server_id": 999},
+            {"by_server_id": "abc"},
+            {"cursor": "garbage"},
+            {"qty": 2, "page_size": 2},
+            {"qty": "abc"},
+            {"qty": "-1"},
+            {"fields": "secret"},
+            *(
+                {"page_size": 1, "cursor": make_cursor(["id"], position)}
+                for position in TAMPERED_POSITIONS
+            ),
+        ):
+            with self.subTest(params=params):
+                response = await self.assertSameResponse(params)
+                self.assertEqual(response.status_code, 400)
+
+    async def test_not_modified(self):
+        response = await self.async_client.get(SERVER_SELECT_ASYNC_URL)
+        response = await self.async_client.get(
+            SERVER_SELECT_ASYNC_URL, headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_anonymous_by_user(self):
+        response = await self.async_client.get(
+            SERVER_SELECT_ASYNC_URL, {"by_user": "true"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+        AUTH_USER_CACHE_TTL=30,
+    )
+    def test_query_count(self):
+        # With a shared cache, sessions and users are cached (account/cache.py).
+        account_cache._user_cache = None
+        self.async_client.force_login(self.owner)
+        get = async_to_sync(self.async_client.get)
+        # user (the session was cached by the login), ETag aggregate, servers,
+        # members, channels
+        with self.assertNumQueries(5):
+            get(SERVER_SELECT_ASYNC_URL, {"category": "gaming"})
+        self.create_servers(10, self.category, self.owner, self.members)
+        get_cache().clear()
+        # session (cleared with the cache), the user is still cached
+        with self.assertNumQueries(5):
+            response = get(SERVER_SELECT_ASYNC_URL, {"category": "gaming"})
+        self.assertEqual(len(response.json()), 13)
+        # session, user and listing all served from the caches
+        with self.assertNumQueries(0):
+            get(SERVER_SELECT_ASYNC_URL, {"category": "gaming"})
+
+
+class MemberCountTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        self.server = self.create_servers(1, self.category, self.owner, channels=0)[0]
+
+    def assertMemberCount(self, expected):
+        self.server.refresh_from_db(fields=["member_count"])
+        self.assertEqual(self.server.member_count, expected)
+
+    def test_add_counts_only_new_members(self):
+        self.assertMemberCount(1)
+        self.server.members.add(self.owner, *self.members)
+        self.assertMemberCount(4)
+
+    def test_remove_counts_only_existing_members(self):
+        self.server.members.add(self.members[0])
+        self.server.members.remove(self.members[0], self.members[1])
+        self.assertMemberCount(1)
+
+    def test_clear(self):
+        self.server.members.add(*self.members)
+        self.server.members.clear()
+        self.assertMemberCount(0)
+
+    def test_reverse_add_remove_clear(self):
+        member = self.members[0]
+        member.server_members.add(self.server)
+        self.assertMemberCount(2)
+        member.server_members.remove(self.server)
+        self.assertMemberCount(1)
+        member.server_members.add(self.server)
+        member.server_members.clear()
+        self.assertMemberCount(1)
+
+    def test_save_does_not_overwrite_count(self):
+        self.server.members.add(*self.members)
+        self.server.name = "renamed"
+        self.server.save()
+        self.assertMemberCount(4)
+
+    def test_account_deleted(self):
+        self.server.members.add(self.members[0])
+        self.members[0].delete()
+        self.assertMemberCount(1)
+
+    def test_recount_members_command(self):
+        self.server.members.add(*self.members)
+        Server.objects.update(member_count=42)
+        out = StringIO()
+        call_command("recount_members", batch_size=1, stdout=out)
+        self.assertMemberCount(4)
+        self.assertIn("repaired 1", out.getvalue())
+
+
+class BulkMembershipTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        self.server = self.create_servers(1, self.category, self.owner, channels=0)[0]
+        self.ids = [member.pk for member in self.members]
+        self.client = APIClient()
+        self.signals = []
+        members_bulk_changed.connect(self.record_signal)
+        self.addCleanup(members_bulk_changed.disconnect, self.record_signal)
+
+    def record_signal(self, sender, action, account_ids, **kwargs):
+        self.signals.append((action, account_ids))
+
+    def assertMemberCount(self, expected):
+        self.server.refresh_from_db(fields=["member_count"])
+        self.assertEqual(self.server.member_count, expected)
+        self.assertEqual(self.server.members.count(), expected)
+
+    def test_join_skips_members_and_unknown_accounts(self):
+        added = bulk_join(self.server, [self.owner.pk, *self.ids, 999999], batch_size=2)
+        self.assertEqual(added, self.ids)
+        self.assertMemberCount(4)
+        self.assertEqual(self.signals, [("join", self.ids)])
+
+    def test_leave_skips_non_members(self):
+        bulk_join(self.server, self.ids[:2])
+        removed = bulk_leave(self.server, self.ids, batch_size=1)
+        self.assertEqual(removed, self.ids[:2])
+        self.assertMemberCount(1)
+        self.assertEqual(self.signals[-1], ("leave", self.ids[:2]))
+
+    def test_server_is_locked_before_the_members_are_read(self):
+        for change in (bulk_join, bulk_leave):
+            with self.subTest(change=change.__name__):
+                with CaptureQueriesContext(connection) as queries:
+                    change(self.server, self.ids)
+                selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+                # SELECT ... FOR UPDATE where the database supports it
+                self.assertIn('FROM "server_server"', selects[0])
+
+    def test_nothing_changed_sends_no_signal(self):
+        bulk_leave(self.server, self.ids)
+        bulk_join(self.server, [self.owner.pk])
+        self.assertEqual(self.signals, [])
+
+    def test_queries_do_not_grow_with_accounts(self):
+        Account = get_user_model()
+        accounts = Account.objects.bulk_create(
+            Account(username=f"bulk{i}", password="!") for i in range(50)
+        )
+        with CaptureQueriesContext(connection) as small:
+            bulk_join(self.server, self.ids)
+        with CaptureQueriesContext(connection) as large:
+            bulk_join(self.server, [account.pk for account in accounts])
+        self.assertEqual(len(large), len(small))
+        with CaptureQueriesContext(connection) as leave:
+            bulk_leave(self.server, [account.pk for account in accounts])
+        self.assertEqual(len(leave), len(small))
+        self.assertMemberCount(4)
+
+    def test_invalidates_listing(self):
+        self.client.get(
+            SERVER_SELECT_URL, {"category": "gaming", "with_num_members": "true"}
+        )
+        bulk_join(self.server, self.ids)
+        response = self.client.get(
+            SERVER_SELECT_URL, {"category": "gaming", "with_num_members": "true"}
+        )
+        self.assertEqual(response.json()[0]["num_members"], 4)
+
+    def test_endpoints(self):
+        url = f"/api/v1/server/members/{self.server.pk}/"
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            url + "join/", {"accounts": self.ids}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"accounts": self.ids, "num_members": 4})
+        response = self.client.post(
+            url + "leave/", {"accounts": self.ids[:1]}, format="json"
+        )
+        self.assertEqual(response.json(), {"accounts": self.ids[:1], "num_members": 3})
+
+    def test_endpoint_permissions_and_validation(self):
+        url = f"/api/v1/server/members/{self.server.pk}/join/"
+        body = {"accounts": self.ids}
+        self.assertEqual(self.client.post(url, body, format="json").status_code, 403)
+        self.client.force_login(self.members[0])
+        self.assertEqual(self.client.post(url, body, format="json").status_code, 403)
+        self.client.force_login(self.owner)
+        response = self.client.post(url, {"accounts": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/api/v1/server/members/999999/join/", body, format="json"
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertMemberCount(1)
+
+
+class AdminTests(ServerFixtureMixin, TestCase):
+    def setUp(self):
+        admin = get_user_model().objects.create_superuser(username="admin")
+        self.client.force_login(admin)
+        self.servers = self.create_servers(3, self.category, self.owner, self.members)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for model in ("server", "channel", "category"):
+            with self.subTest(model=model):
+                url = f"/admin/server/{model}/"
+                # the first request also loads the session and the user
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as small:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                self.create_servers(5, self.other_category, self.owner)
+                with CaptureQueriesContext(connection) as large:
+                    self.client.get(url)
+                self.assertEqual(len(large), len(small))
+
+    def test_search_uses_the_search_index(self):
+        Server.objects.create(
+            name="lofi beats", owner=self.owner, category=self.category
+        )
+        with mock.patch("server.admin.search", wraps=search) as indexed:
+            response = self.client.get("/admin/server/server/", {"q": "lof"})
+        indexed.assert_called_once()
+        self.assertEqual(
+            [server.name for server in response.context["cl"].result_list],
+            ["lofi beats"],
+        )
+
+    def test_category_server_counts(self):
+        response = self.client.get("/admin/server/category/")
+        counts = {c.name: c.num_servers for c in response.context["cl"].result_list}
+        self.assertEqual(counts, {"gaming": 3, "music": 0})
+
+    def test_members_autocomplete(self):
+        server = self.servers[0]
+        response = self.client.get(f"/admin/server/server/{server.pk}/change/")
+        self.assertContains(response, "admin-autocomplete")
+        with override_settings(ADMIN_MAX_FORM_MEMBERS=2):
+            response = self.client.get(f"/admin/server/server/{server.pk}/change/")
+        self.assertNotIn("members", response.context["adminform"].form.fields)
+
+    def test_account_autocomplete_matches_username_prefix(self):
+        response = self.client.get(
+            "/admin/autocomplete/",
+            {
+                "term": "memb",
+                "app_label": "server",
+                "model_name": "server",
+                "field_name": "members",
+            },
+        )
+        self.assertEqual(
+            [result["text"] for result in response.json()["results"]],
+            ["member0", "member1", "member2"],
+        )
+
+
+def make_image(size=(60, 60), image_format="PNG", name="icon.png"):
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ImageValidatorTests(TestCase):
+    def test_icon_size_keeps_file_position(self):
+        image = make_image()
+        validate_icon_image_size(image)
+        self.assertEqual(image.tell(), 0)
+
+    def test_icon_too_large(self):
+        with self.assertRaises(ValidationError):
+            validate_icon_image_size(make_image((71, 20)))
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_decompression_bomb_is_rejected_from_header(self):
+        with self.assertRaises(ValidationError):
+            validate_image_header(make_image((20, 20)))
+
+    def test_real_format_is_checked(self):
+        with self.assertRaises(ValidationError):
+            validate_image_header(make_image(image_format="GIF", name="icon.png"))
+
+    def test_not_an_image(self):
+        with self.assertRaises(ValidationError):
+            validate_image_header(SimpleUploadedFile("icon.png", b"not an image"))
+
+    def test_category_icon_is_validated(self):
+        for icon in (
+            make_image((71, 20)),
+            SimpleUploadedFile("icon.png", b"not an image"),
+            make_image(name="icon.gif"),
+        ):
+            with self.subTest(icon=icon.name):
+                with self.assertRaises(ValidationError) as raised:
+                    Category(name="gaming", icon=icon).full_clean()
+                self.assertIn("icon", raised.exception.message_dict)
+        Category(name="gaming", icon=make_image()).full_clean()
+
+
+class MediaFixtureMixin(ServerFixtureMixin):
+    """Stores media in a temporary MEDIA_ROOT and creates channels with icons."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.server = self.create_servers(1, self.category, self.owner, channels=0)[0]
+
+    def create_channel(self, **kwargs):
+        return Channel.objects.create(
+            name="general",
+            owner=self.owner,
+            topic="topic",
+            server=self.server,
+            **{"icon": make_image(), **kwargs},
+        )
+
+
+class ImageVariantTests(MediaFixtureMixin, TestCase):
+    def test_generation_is_scheduled_after_commit(self):
+        with mock.patch("server.images.get_executor") as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                channel = self.create_channel()
+        get_executor.return_value.submit.assert_called_once_with(
+            mock.ANY, "server.Channel", channel.pk, "icon"
+        )
+
+    def test_generate_variants(self):
+        with mock.patch("server.images.get_executor"):
+            channel = self.create_channel()
+        generate_variants("server.Channel", channel.pk, "icon")
+        channel.refresh_from_db()
+
+        self.assertEqual(channel.icon_variants["source"], channel.icon.name)
+        for image_format in ("webp", "jpeg"):
+            self.assertEqual(
+                set(channel.icon_variants[image_format]), {"32", "64", "128"}
+            )
+        with default_storage.open(channel.icon_variants["webp"]["32"]) as variant:
+            with Image.open(variant) as img:
+                self.assertEqual((img.format, img.size), ("WEBP", (32, 32)))
+
+        urls = ChannelSerializer(channel).data["icon_variants"]
+        self.assertTrue(urls["jpeg"]["64"].endswith(".jpg"))
+        self.assertEqual(ChannelSerializer(channel).data["banner_variants"], {})
+
+    def test_identical_images_share_variants(self):
+        with mock.patch("server.images.get_executor"):
+            first, second = self.create_channel(), self.create_channel()
+        for channel in (first, second):
+            generate_variants("server.Channel", channel.pk, "icon")
+            channel.refresh_from_db()
+        self.assertEqual(first.icon.name, second.icon.name)
+        self.assertEqual(
+            {k: v for k, v in first.icon_variants.items() if k != "source"},
+            {k: v for k, v in second.icon_variants.items() if k != "source"},
+        )
+
+
+@mock.patch("server.images.get_executor")
+class RowSerializerParityTests(MediaFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.members.add(self.members[2], self.members[0])
+        self.create_servers(3, self.other_category, self.owner, self.members[:2])
+        Server.objects.create(
+            name="empty", owner=self.owner, category=self.category, description="d"
+        )
+
+    def assertParity(self, queryset, num_members):
+        renderer = JSONRenderer()
+        expected = ServerSerializer(
+            ServerQueryPlan().apply(queryset),
+            many=True,
+            context={"num_members": num_members},
+        ).data
+        serializer = ServerRowSerializer(num_members)
+        actual = serializer.load(list(serializer.values(queryset)))
+        self.assertEqual(renderer.render(actual), renderer.render(expected))
+
+    def test_same_json_as_server_serializer(self, get_executor):
+        channel = self.create_channel(banner=make_image((300, 100), name="b.png"))
+        generate_variants("server.Channel", channel.pk, "icon")
+        self.create_channel(icon=None)
+        for num_members in (False, True):
+            with self.subTest(num_members=num_members):
+                self.assertParity(Server.objects.order_by("id"), num_members)
+
+    def test_schema_follows_serializer_fields(self, get_executor):
+        self.assertEqual(
+            [key for key, _, _ in ServerRowSerializer.schema()],
+            list(ServerSerializer().fields),
+        )
+        self.assertEqual(
+            [key for key, _, _ in ChannelRowSerializer.schema()],
+            list(ChannelSerializer().fields),
+        )
+
+    def test_empty(self, get_executor):
+        self.assertParity(Server.objects.none(), False)
+
+
+@mock.patch("server.images.get_executor")
+class ContentAddressedStorageTests(MediaFixtureMixin, TestCase):
+    def refs(self, name):
+        return Blob.objects.get(name=name).refs
+
+    def test_identical_uploads_are_stored_once(self, get_executor):
+        first, second = self.create_channel(), self.create_channel()
+        self.assertEqual(first.icon.name, second.icon.name)
+        self.assertTrue(first.icon.name.startswith("cas/"))
+        self.assertEqual(self.refs(first.icon.name), 2)
+
+    def test_icon_and_banner_with_same_content(self, get_executor):
+        channel = self.create_channel(banner=make_image(name="banner.png"))
+        self.assertEqual(channel.icon.name, channel.banner.name)
+        self.assertEqual(self.refs(channel.icon.name), 2)
+
+    def test_replaced_file_is_swept_after_grace(self, get_executor):
+        channel = self.create_channel()
+        old = channel.icon.name
+        channel.icon = make_image(size=(50, 50))
+        channel.save()
+        self.assertEqual(self.refs(old), 0)
+        self.assertEqual(self.refs(channel.icon.name), 1)
+
+        self.assertEqual(sweep_blobs(), 0)
+        self.assertTrue(default_storage.exists(old))
+        Blob.objects.filter(name=old).update(
+            released_at=timezone.now() - timedelta(hours=2)
+        )
+        self.assertEqual(sweep_blobs(), 1)
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(channel.icon.name))
+
+    def test_deleted_rows_release_their_files(self, get_executor):
+        first, second = self.create_channel(), self.create_channel()
+        first.delete()
+        self.assertEqual(self.refs(second.icon.name), 1)
+        second.delete()
+        self.assertEqual(sweep_blobs(grace=timedelta(0)), 1)
+        self.assertFalse(default_storage.exists(second.icon.name))
+
+    def test_legacy_files_are_swept_after_recount(self, get_executor):
+        # Uploaded before references were counted.
+        channel = self.create_channel(banner=make_image((300, 100), name="b.png"))
+        shared = self.create_channel()
+        generate_variants("server.Channel", channel.pk, "banner")
+        channel.refresh_from_db()
+        Blob.objects.all().delete()
+        banner = {channel.banner.name, *variant_names(channel.banner_variants)}
+
+        self.assertEqual(recount_blobs(), len(banner | {shared.icon.name}))
+        self.assertEqual(self.refs(shared.icon.name), 2)
+        channel.delete()
+        self.assertEqual(self.refs(shared.icon.name), 1)
+        self.assertEqual(sweep_blobs(grace=timedelta(0)), len(banner))
+        self.assertFalse(default_storage.exists(channel.banner.name))
+        self.assertTrue(default_storage.exists(shared.icon.name))
+
+    def test_reacquired_blob_is_not_swept(self, get_executor):
+        channel = self.create_channel()
+        name = channel.icon.name
+        channel.delete()
+        self.create_channel()
+        self.assertEqual(sweep_blobs(grace=timedelta(0)), 0)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_reused_file_restarts_grace(self, get_executor):
+        channel = self.create_channel()
+        name = channel.icon.name
+        channel.delete()
+        Blob.objects.filter(name=name).update(
+            released_at=timezone.now() - timedelta(hours=2)
+        )
+        # Saved again, but the row referencing it is not committed yet.
+        self.assertEqual(default_storage.save("icon.png", make_image()), name)
+        self.assertEqual(sweep_blobs(), 0)
+        self.assertTrue(default_storage.exists(name))
+
+
+@mock.patch("server.images.get_executor")
+class TrackedFieldsTests(MediaFixtureMixin, TestCase):
+    def channel_queries(self, channel):
+        with CaptureQueriesContext(connection) as queries:
+            channel.save()
+        return [q["sql"] for q in queries if '"server_channel"' in q["sql"]]
+
+    def test_has_changed(self, get_executor):
+        channel = Channel.objects.get(pk=self.create_channel().pk)
+        self.assertFalse(channel.has_changed("icon"))
+        channel.icon = make_image(size=(40, 40))
+        self.assertTrue(channel.has_changed("icon"))
+        self.assertFalse(channel.has_changed("name"))
+
+    def test_save_writes_only_changed_fields_without_select(self, get_executor):
+        channel = Channel.objects.get(pk=self.create_channel().pk)
+        channel.topic = "new topic"
+        (sql,) = self.channel_queries(channel)
+        self.assertTrue(sql.startswith("UPDATE"))
+        self.assertIn('"topic"', sql)
+        self.assertNotIn('"name"', sql)
+        self.assertEqual(Channel.objects.get(pk=channel.pk).topic, "new topic")
+
+    def test_unchanged_save_is_skipped(self, get_executor):
+        channel = Channel.objects.get(pk=self.create_channel().pk)
+        self.assertEqual(self.channel_queries(channel), [])
+
+    def test_replacing_icon_moves_references_without_select(self, get_executor):
+        channel = Channel.objects.get(pk=self.create_channel().pk)
+        old = channel.icon.name
+        channel.icon = make_image(size=(40, 40))
+        (sql,) = self.channel_queries(channel)
+        self.assertTrue(sql.startswith("UPDATE"))
+        self.assertEqual(Blob.objects.get(name=old).refs, 0)
+        self.assertEqual(Blob.objects.get(name=channel.icon.name).refs, 1)
+        self.assertFalse(channel.has_changed("icon"))
+
+    def test_explicit_update_fields(self, get_executor):
+        channel = Channel.objects.get(pk=self.create_channel().pk)
+        channel.name, channel.topic = "renamed", "new topic"
+        channel.save(update_fields=["name"])
+        self.assertTrue(channel.has_changed("topic"))
+        channel.refresh_from_db()
+        self.assertEqual((channel.name, channel.topic), ("renamed", "topic"))
+        self.assertFalse(channel.has_changed("topic"))
+
+
+class SearchTests(ServerFixtureMixin, TestCase):
+    URL = "/api/v1/search/"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.category.description = "video games"
+        self.category.save()
+        self.server = Server.objects.create(
+            name="Lofi Beats",
+            description="music to game to",
+            owner=self.owner,
+            category=self.other_category,
+        )
+        self.channel = Channel.objects.create(
+            name="gamers", topic="speedruns", owner=self.owner, server=self.server
+        )
+
+    def search(self, q, **params):
+        response = self.client.get(self.URL, {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(hit["type"], hit["id"]) for hit in response.data]
+
+    def test_prefix_search_over_every_kind(self):
+        hits = self.search("gam")
+        self.assertEqual(
+            set(hits),
+            {
+                ("category", self.category.id),
+                ("server", self.server.id),
+                ("channel", self.channel.id),
+            },
+        )
+
+    def test_title_matches_rank_first(self):
+        hits = self.search("gam")
+        # "gaming" and "gamers" are names, the server only mentions "game"
+        self.assertEqual(hits[-1], ("server", self.server.id))
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("lofi bea"), [("server", self.server.id)])
+        self.assertEqual(self.search("lofi rock"), [])
+
+    def test_type_filter(self):
+        self.assertEqual(
+            self.search("gam", type="channel"), [("channel", self.channel.id)]
+        )
+        response = self.client.get(self.URL, {"q": "gam", "type": "user"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_syntax_is_ignored(self):
+        self.assertEqual(self.search('"lofi* (-'), [("server", self.server.id)])
+        self.assertEqual(self.client.get(self.URL, {"q": " "}).status_code, 400)
+
+    def test_reads_the_index_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search("speed")
+        self.assertEqual(len(queries), 1)
+        self.assertIn("MATCH", queries[0]["sql"])
+        self.assertNotIn("LIKE", queries[0]["sql"])
+
+    def test_index_follows_changes(self):
+        self.server.name = "Jazz Club"
+        self.server.save()
+        self.assertEqual(self.search("lofi"), [])
+        self.assertEqual(self.search("jazz"), [("server", self.server.id)])
+
+        self.server.delete()
+        self.assertEqual(self.search("jazz"), [])
+        # The channel was deleted with its server.
+        self.assertEqual(self.search("speedruns"), [])
+
+    def test_rebuild_command(self):
+        Server.objects.bulk_create(
+            [Server(name="Bulk", owner=self.owner, category=self.category)]
+        )
+        self.assertEqual(self.search("bulk"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.search("bulk")), 1)
+        self.assertEqual(len(self.search("gam")), 3)
+
+    def test_migration_kinds_match(self):
+        migration = importlib.import_module("server.migrations.0008_search_index")
+        self.assertEqual(migration.KINDS, KINDS)
+
+
+class SeedBenchTests(TestCase):
+    def seed(self, **options):
+        out = StringIO()
+        call_command(
+            "seed_bench",
+            accounts=50,
+            categories=3,
+            servers=20,
+            channels=2,
+            max_members=40,
+            stdout=out,
+            **options,
+        )
+        return out.getvalue()
+
+    def test_seed(self):
+        output = self.seed()
+        self.assertIn("20 servers", output)
+        self.assertEqual(Server.objects.count(), 20)
+        self.assertEqual(Channel.objects.count(), 40)
+        # Skewed sizes: the first server is the largest, the tail has a few members.
+        counts = list(
+            Server.objects.order_by("id").values_list("member_count", flat=True)
+        )
+        self.assertEqual(counts[0], 40)
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertLess(counts[-1], 5)
+
+    def test_member_counts_match_memberships(self):
+        self.seed()
+        self.assertEqual(recount_member_counts(), (20, 0))
+
+    def test_search_index_updated(self):
+        self.seed()
+        self.assertTrue(search("bench server 7", kinds=["server"]))
+
+    def test_seed_again_reuses_accounts_and_categories(self):
+        self.seed()
+        self.seed(seed=1)
+        self.assertEqual(get_user_model().objects.count(), 50)
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Server.objects.count(), 40)
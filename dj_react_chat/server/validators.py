@@ -1,7 +1,61 @@
 import os
 from PIL import Image
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
+# Formats accepted for uploaded icons and banners, as reported by Pillow
+ALLOWED_IMAGE_FORMATS = {"JPEG", "PNG"}
+
+
+def probe_image(image):
+    """
+    Read the format and dimensions of an image from its header only.
+
+    ``Image.open`` only parses the header, the pixel data is never decoded here, and
+    the file position is restored afterwards so the upload can still be saved.
+
+    Args:
+        image: The uploaded file.
+
+    Returns:
+        tuple[str, int, int]: The Pillow format name, the width and the height.
+
+    Raises:
+        ValidationError: If the file is not an image Pillow can identify, or if it
+            declares more pixels than ``settings.IMAGE_MAX_PIXELS`` (decompression bomb).
+    """
+    position = image.tell() if hasattr(image, "tell") else None
+    try:
+        with Image.open(image) as img:
+            image_format, (width, height) = img.format, img.size
+    except (Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValidationError("Unsupported or corrupted image.")
+    finally:
+        if position is not None:
+            image.seek(position)
+
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError("Image has too many pixels.")
+    return image_format, width, height
+
+
+def validate_image_header(image) -> None:
+    """
+    Validate the real format and the pixel count of an image from its header.
+
+    Args:
+        image: The image to validate.
+
+    Raises:
+        ValidationError: If the image is not a JPEG or PNG, or is a decompression bomb.
+    """
+    if not image:
+        return
+
+    image_format, _, _ = probe_image(image)
+    if image_format not in ALLOWED_IMAGE_FORMATS:
+        raise ValidationError("Unsupported image format.")
+
 
 def validate_icon_image_size(image: Image) -> None:
     """
@@ -16,9 +70,9 @@ def validate_icon_image_size(image: Image) -> None:
     if not image:
         return
 
-    with Image.open(image) as img:
-        if img.width > 70 or img.height > 70:
-            raise ValidationError("Image size should be equal or less than 70x70")
+    _, width, height = probe_image(image)
+    if width > 70 or height > 70:
+        raise ValidationError("Image size should be equal or less than 70x70")
 
 
 def validate_image_file_extension(image):
@@ -1,12 +1,33 @@
 # dj_react_chat\server\views.py
 
-from rest_framework import viewsets
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.vary import vary_on_headers
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError, AuthenticationFailed
-from django.db.models import Count
+from rest_framework.exceptions import (
+    AuthenticationFailed,
+    PermissionDenied,
+    ValidationError,
+)
+from dj_react_chat.metrics import serialization
+from dj_react_chat.replicas import primary_reads
+from .cache import server_list_cache
+from .conditional import etag_matches, listing_stamp, make_etag
+from .members import bulk_join, bulk_leave
 from .models import Server
-from .schema import server_list_docs
-from .serializer import ServerSerializer
+from .pagination import KeysetPagination
+from .params import ServerListParams
+from .query import ServerQueryPlan
+from .row_serializer import ServerRowSerializer
+from .serializer import (
+    MembershipBatchResultSerializer,
+    MembershipBatchSerializer,
+    SearchResultSerializer,
+)
+from .schema import membership_batch_docs, search_docs, server_list_docs
+from .search import KINDS, search
 
 
 class ServerListViewSet(viewsets.ViewSet):
@@ -27,6 +48,15 @@ class ServerListViewSet(viewsets.ViewSet):
     queryset = Server.objects.all()
 
     @server_list_docs
+    @method_decorator(vary_on_headers("Accept"))
+    def list(self, request):
+        """
+        **Handles `GET` on the server list route.**
+
+        Delegates to `get_queryset`, which applies the query parameters.
+        """
+        return self.get_queryset(request)
+
     def get_queryset(self, request):
         """
         **Lists and filters servers based on query parameters.**
@@ -44,13 +74,21 @@ class ServerListViewSet(viewsets.ViewSet):
         - `by_user` **(str, optional)**: If set to `"true"`, filters servers where the current user is a member.
         - `by_server_id` **(str, optional)**: Retrieve a specific server by its ID.
         - `with_num_members` **(str, optional)**: If set to `"true"`, includes the number of members in each server.
+        - `page_size` **(str, optional)**: Enables cursor pagination and sets the number of servers per page.
+        - `cursor` **(str, optional)**: The `next` cursor of the previous page.
+        - `ordering` **(str, optional)**: `"id"` (default) or `"-num_members"` for the most popular servers first.
+        - `fields` **(str, optional)**: Comma separated server fields to return, `channel_server.<field>` entries trim the channels.
+        - `expand` **(str, optional)**: Comma separated relations to return, `members` and/or `channel_server`.
 
         ### Raises:
         - **AuthenticationFailed**: Raised if the user is not authenticated when using `by_user` or `by_server_id`.
-        - **ValidationError**: Raised for invalid `by_server_id` values or if no server is found for the provided ID.
+        - **ValidationError**: Raised for invalid `by_server_id` values or if no server is found for the provided ID,
+          for an invalid cursor, ordering, `fields` or `expand`, and when `qty` is combined with pagination.
 
         ### Returns:
-        - **Response**: A `Response` object containing the serialized data of the filtered server list.
+        - **Response**: A `Response` object containing the serialized data of the filtered server list,
+          with an `ETag` header. When the `If-None-Match` request header matches it, an empty
+          `304 Not Modified` response is returned instead.
 
         ### Example Usage:
         ```python
@@ -62,63 +100,219 @@ class ServerListViewSet(viewsets.ViewSet):
 
         GET /servers/?by_server_id=123
         Returns the server with the ID 123
+
+        GET /servers/?category=gaming&page_size=20&cursor=eyJvIjpbImlkIl0...
+        Returns {"next": <cursor or null>, "results": [...]} with the next 20 servers
+
+        GET /servers/?fields=id,name,channel_server.name&expand=channel_server
+        Returns only the id, name and channel names of each server
         ```
         """
         ################################
         # Get the query parameters
         ################################
-        category = request.query_params.get("category")
-        qty = request.query_params.get("qty")
-        by_user = (
-            request.query_params.get("by_user") == "true"
-        )  # Convert the "by_user" query parameter to a boolean; comparison with "true" checks if the parameter is explicitly set to "true"
-        by_server_id = request.query_params.get("by_server_id")
-        with_num_members = request.query_params.get("with_num_members") == "true"
-
-        # Filter the queryset to only include servers in the specified category.
-        # __name means that we are filtering by the name of the category table as we have relation with category and server table.
-        if category:
-            self.queryset = self.queryset.filter(category__name=category)
-
-        # Filter the queryset to only include servers by the current user if the 'by_user' query parameter is set to 'true'.
-        if by_user:
-            if not request.user.is_authenticated:
-                raise AuthenticationFailed()
-            user_id = request.user.id
-            self.queryset = self.queryset.filter(
-                members=user_id
-            )  # only query servers what have the current user as a member
-
-        if with_num_members:
-            self.queryset = self.queryset.annotate(num_members=Count("members"))
-
-        # The user provided a quantity, so we need to limit the queryset to the specified number of items.
-        # We use list slicing to achieve this.
-        # The syntax is: queryset[start:stop]
-        # Where start is the index of the first item we want to include, and stop is the index of the last item we want to include + 1.
-        # Since we want to include the first 'qty' items, we start at index 0, and stop at index 'qty'.
-        # We use int(qty) to convert the string 'qty' to an integer, because list slicing requires integer indices.
-        # The queryset will now only contain the first 'qty' items of the original queryset.
-        if qty:
-            self.queryset = self.queryset[: int(qty)]
-
-        if by_server_id:
-            if not request.user.is_authenticated:
-                raise AuthenticationFailed()
-
-            try:
-                self.queryset = self.queryset.filter(id=by_server_id)
-                if not self.queryset.exists():
-                    raise ValidationError(
-                        detail=f"Server with id {by_server_id} not found"
-                    )
-            except ValueError:
-                raise ValidationError("Server value error")
-
-        # Serialize the queryset into a JSON response.
-        serializer = ServerSerializer(
-            self.queryset, many=True, context={"num_members": with_num_members}
-        )
+        params = ServerListParams(request.query_params, request.user)
+
+        if_none_match = request.headers.get("If-None-Match")
+
+        # Listings are cached under a key that embeds a version counter, which the
+        # signals in server/signals.py bump whenever a server, channel or
+        # membership changes.
+        cache_key = server_list_cache.make_key(**params.cache_params())
+        cached = server_list_cache.get(cache_key)
+        if cached is not None:
+            etag, data = cached
+            if etag_matches(if_none_match, etag):
+                return Response(
+                    status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+                )
+            return Response(data, headers={"ETag": etag})
+
+        # A miss is rebuilt from the primary: the listing is cached for every client,
+        # and a lagging replica would cache the data from before the change.
+        with primary_reads():
+            # The plan turns the filters into a single queryset; the members and
+            # channels are loaded with one query each, so the number of queries does
+            # not grow with the number of servers returned.
+            plan = ServerQueryPlan(**params.filters)
+            self.queryset = plan.apply(self.queryset)
+
+            # The ETag comes from one aggregate over the matching servers, so a client
+            # that already has the listing gets a 304 without anything being serialized.
+            stamp = listing_stamp(plan)
+            etag = make_etag(stamp, params.cache_params())
+            if etag_matches(if_none_match, etag):
+                return Response(
+                    status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+                )
+
+            if params.server_id and not stamp["count"]:
+                raise ValidationError(
+                    detail=f"Server with id {params.server_id} not found"
+                )
+
+            # Servers are read as .values() rows and serialized by ServerRowSerializer,
+            # which produces the same data as ServerSerializer without building models.
+            serializer = ServerRowSerializer(
+                params.with_num_members, params.fields, params.channel_fields
+            )
+            rows, next_cursor = serializer.values(self.queryset), None
+
+            # With a cursor or page_size the servers are paged on a stable keyset
+            # ordering and wrapped with the cursor of the next page.
+            if params.paginate:
+                paginator = KeysetPagination(params.ordering)
+                rows, next_cursor = paginator.paginate(
+                    rows,
+                    params.pagination["cursor"],
+                    params.pagination["page_size"],
+                )
+
+            # Serialize the rows into a JSON response.
+            rows = list(rows)
+            related = serializer.fetch_related(rows)
+            with serialization():
+                data = serializer.serialize(rows, *related)
+            if params.paginate:
+                data = {"next": next_cursor, "results": data}
+            server_list_cache.set(cache_key, (etag, data))
 
         # Return the serialized queryset as the response.
-        return Response(serializer.data)
+        return Response(data, headers={"ETag": etag})
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    **SearchViewSet**
+
+    A Django REST Framework ViewSet for full-text search over servers, channels and categories.
+
+    ### Methods:
+    - `list(request)`: Returns the best matching servers, channels and categories.
+    """
+
+    default_limit = 20
+    max_limit = 50
+
+    @search_docs
+    def list(self, request):
+        """
+        **Searches the full-text index.**
+
+        Results are read from the search index (FTS5 on SQLite, a `tsvector` GIN index on
+        PostgreSQL) kept up to date by the signals in `server/signals.py`, never by
+        scanning the tables, so the cost does not grow with the number of servers.
+
+        ### Query Parameters:
+        - `q` **(str)**: The words to search for, each one may be the start of a word.
+        - `type` **(str, optional)**: Comma separated kinds to return, `category`, `server` and/or `channel`.
+        - `limit` **(str, optional)**: The maximum number of results (default 20, max 50).
+
+        ### Raises:
+        - **ValidationError**: Raised for a missing `q`, an unknown `type` or an invalid `limit`.
+
+        ### Returns:
+        - **Response**: The results, best ranked first.
+
+        ### Example Usage:
+        ```python
+        GET /api/v1/search/?q=gam
+        Returns categories, servers and channels with a word starting with "gam"
+
+        GET /api/v1/search/?q=lofi beats&type=server
+        Returns the servers matching both words
+        ```
+        """
+        query = request.query_params.get("q", "")
+        if not query.strip():
+            raise ValidationError("q is required")
+
+        kinds = None
+        if request.query_params.get("type"):
+            kinds = request.query_params["type"].split(",")
+            unknown = set(kinds) - set(KINDS)
+            if unknown:
+                raise ValidationError(f"Unknown type {', '.join(sorted(unknown))}")
+
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            raise ValidationError("limit must be an integer")
+        if limit < 1:
+            raise ValidationError("limit must be positive")
+
+        results = search(query, kinds, min(limit, self.max_limit))
+        return Response(SearchResultSerializer(results, many=True).data)
+
+
+class MembershipViewSet(viewsets.ViewSet):
+    """
+    **MembershipViewSet**
+
+    A Django REST Framework ViewSet for adding or removing many members of a server at once.
+
+    ### Methods:
+    - `join(request, pk)`: Adds the given accounts to the server.
+    - `leave(request, pk)`: Removes the given accounts from the server.
+    """
+
+    queryset = Server.objects.all()
+
+    @membership_batch_docs
+    @action(detail=True, methods=["post"])
+    def join(self, request, pk=None):
+        """
+        **Adds up to 10,000 accounts to a server in one transaction.**
+
+        ### Request Body:
+        - `accounts` **(list[int])**: The ids of the accounts to add.
+
+        ### Raises:
+        - **AuthenticationFailed**: Raised if the user is not authenticated.
+        - **PermissionDenied**: Raised if the user neither owns the server nor is staff.
+        - **NotFound**: Raised if the server does not exist.
+        - **ValidationError**: Raised for a missing, empty or too long `accounts` list.
+
+        ### Returns:
+        - **Response**: `{"accounts": [<ids added>], "num_members": <count>}`, accounts
+          that were already members or do not exist are left out.
+
+        ### Example Usage:
+        ```python
+        POST /api/v1/server/members/3/join/ {"accounts": [7, 8, 9]}
+        Adds accounts 7, 8 and 9 to server 3
+        ```
+        """
+        return self.change_members(request, pk, bulk_join)
+
+    @membership_batch_docs
+    @action(detail=True, methods=["post"])
+    def leave(self, request, pk=None):
+        """
+        **Removes up to 10,000 accounts from a server in one transaction.**
+
+        Same request, errors and response as `join`, `accounts` lists the removed members.
+
+        ### Example Usage:
+        ```python
+        POST /api/v1/server/members/3/leave/ {"accounts": [7, 8, 9]}
+        Removes accounts 7, 8 and 9 from server 3
+        ```
+        """
+        return self.change_members(request, pk, bulk_leave)
+
+    def change_members(self, request, pk, change):
+        if not request.user.is_authenticated:
+            raise AuthenticationFailed()
+        server = get_object_or_404(Server, pk=pk)
+        if server.owner_id != request.user.pk and not request.user.is_staff:
+            raise PermissionDenied(
+                "Only the owner of the server can change its members"
+            )
+
+        batch = MembershipBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        account_ids = change(server, batch.validated_data["accounts"])
+        server.refresh_from_db(fields=["member_count"])
+        result = {"accounts": account_ids, "num_members": server.member_count}
+        return Response(MembershipBatchResultSerializer(result).data)
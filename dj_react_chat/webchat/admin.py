@@ -0,0 +1,12 @@
+from django.contrib import admin
+from dj_react_chat.admin import ScalableModelAdmin
+from .models import Message
+
+
+@admin.register(Message)
+class MessageAdmin(ScalableModelAdmin):
+    list_display = ["id", "channel", "sender", "timestamp"]
+    list_select_related = ["channel", "sender"]
+    autocomplete_fields = ["channel", "sender"]
+    # The snowflake ids are time ordered, newest first walks the primary key.
+    ordering = ["-id"]
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class WebchatConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "webchat"
+
+    def ready(self):
+        # Connect the signal receivers defined in webchat/signals.py
+        from . import signals  # noqa: F401
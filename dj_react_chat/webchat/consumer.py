@@ -0,0 +1,148 @@
+# dj_react_chat\webchat\consumer.py
+
+import asyncio
+import json
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.utils import timezone
+from server.members import Membership
+from server.models import Channel
+
+from .fanout import get_hub
+from .models import Message
+from .presence import get_presence
+from .writer import get_read_marker, get_writer
+
+# Close codes sent to the client
+CLOSE_UNAUTHENTICATED = 4001
+CLOSE_FORBIDDEN = 4003
+CLOSE_NOT_FOUND = 4004
+CLOSE_TOO_SLOW = 4008
+
+
+@database_sync_to_async
+def channel_server_id(channel_id):
+    """Return the id of the server of a channel, ``None`` if it does not exist."""
+    return (
+        Channel.objects.filter(pk=channel_id)
+        .values_list("server_id", flat=True)
+        .first()
+    )
+
+
+@database_sync_to_async
+def is_member(server_id, account_id):
+    return Membership.objects.filter(
+        server_id=server_id, account_id=account_id
+    ).exists()
+
+
+class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for a single ``server.models.Channel``.
+
+    Each socket subscribes to the channel on the fan-out hub. Incoming messages are
+    broadcast to every subscriber right away and handed to the message writer, which
+    persists them in batches, so the database never delays delivery. The socket also
+    keeps its account online in the channel's server, see ``webchat/presence.py``.
+
+    Client -> server frames: ``{"message": "<text>"}``, ``{"type": "heartbeat"}``
+    (renews the online status, send one well within ``WEBCHAT_PRESENCE_TTL``),
+    ``{"type": "typing"}`` (shows the typing indicator for ``WEBCHAT_TYPING_TTL``) and
+    ``{"type": "read", "id": "<snowflake>"}`` (the channel was read up to that message,
+    written in batches by the read marker, see ``webchat/readstate.py``)
+
+    Server -> client frames: ``{"type": "message", "id": "<snowflake>", "channel": <id>,
+    "sender": <id>, "username": "<name>", "content": "<text>",
+    "timestamp": "<iso 8601>"}``, plus the presence and typing frames of
+    ``PresenceService``.
+    """
+
+    async def connect(self):
+        self.subscription = None
+        self.user = self.scope.get("user")
+        self.channel_id = self.scope["url_route"]["kwargs"]["channel_id"]
+
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+        self.server_id = await channel_server_id(self.channel_id)
+        if self.server_id is None:
+            await self.close(code=CLOSE_NOT_FOUND)
+            return
+        if not await is_member(self.server_id, self.user.pk):
+            await self.close(code=CLOSE_FORBIDDEN)
+            return
+
+        await self.accept()
+        self.subscription = await get_hub().subscribe(self.channel_id)
+        self.forwarder = asyncio.create_task(self.forward())
+        get_presence().connect(self.server_id, self.user.pk, self.subscription)
+
+    async def forward(self):
+        """Send the messages queued on this socket's subscription."""
+        queue = self.subscription.queue
+        while True:
+            text = await queue.get()
+            if self.subscription.overflowed:
+                await self.close(code=CLOSE_TOO_SLOW)
+                return
+            await self.send(text_data=text)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.subscription is None or text_data is None:
+            return
+        try:
+            frame = json.loads(text_data)
+            kind = frame.get("type", "message")
+            content = str(frame.get("message", "")).strip()
+        except (ValueError, AttributeError):
+            return
+        if kind == "heartbeat":
+            get_presence().heartbeat(self.server_id, self.user.pk)
+            return
+        if kind == "typing":
+            get_presence().typing(self.channel_id, self.user.pk)
+            return
+        if kind == "read":
+            try:
+                message_id = int(frame["id"])
+            except (KeyError, TypeError, ValueError):
+                return
+            get_read_marker().enqueue((self.user.pk, self.channel_id, message_id))
+            return
+        if not content:
+            return
+        get_presence().stop_typing(self.channel_id, self.user.pk)
+
+        message = Message(
+            channel_id=self.channel_id,
+            sender_id=self.user.pk,
+            content=content,
+            timestamp=timezone.now(),
+        )
+        get_writer().enqueue(message)
+        await get_hub().publish(
+            self.channel_id,
+            {
+                "type": "message",
+                # ids are 64-bit, send them as strings so JavaScript keeps them exact
+                "id": str(message.id),
+                "channel": self.channel_id,
+                "sender": self.user.pk,
+                "username": self.user.get_username(),
+                "content": content,
+                "timestamp": message.timestamp.isoformat(),
+            },
+        )
+
+    async def disconnect(self, code):
+        if self.subscription is None:
+            return
+        self.forwarder.cancel()
+        presence = get_presence()
+        presence.stop_typing(self.channel_id, self.user.pk)
+        presence.disconnect(self.server_id, self.user.pk, self.subscription)
+        await get_hub().unsubscribe(self.subscription)
+        self.subscription = None
@@ -0,0 +1,174 @@
+# dj_react_chat\webchat\fanout.py
+
+import asyncio
+import json
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    A single socket's subscription to a channel.
+
+    Messages are buffered in a bounded queue which the consumer drains. When a socket
+    cannot keep up the queue overflows, the subscription is marked and the consumer
+    disconnects it instead of letting it slow down everybody else.
+
+    Attributes:
+        channel_id (int): The channel subscribed to.
+        queue (asyncio.Queue): Encoded messages waiting to be sent.
+        overflowed (bool): Whether a message had to be dropped.
+    """
+
+    def __init__(self, channel_id, maxsize):
+        self.channel_id = channel_id
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, text):
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class FanoutHub:
+    """
+    In-process pub/sub that broadcasts messages to every socket subscribed to a channel.
+
+    Payloads are JSON encoded once per message, not once per socket, and delivery is a
+    non-blocking ``put`` into each subscriber's queue. Publishing goes through a
+    backend: ``LocalBackend`` delivers straight back to this hub (single node), while
+    ``RedisBackend`` relays through Redis pub/sub so every node's hub delivers to its
+    own sockets.
+
+    Attributes:
+        backend: The publish/subscribe backend.
+        queue_size (int): The size of each subscriber's queue.
+    """
+
+    def __init__(self, backend, queue_size=256):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers = {}
+        backend.bind(self)
+
+    def subscriber_count(self, channel_id):
+        return len(self._subscribers.get(channel_id, ()))
+
+    async def subscribe(self, channel_id):
+        """Subscribe a socket to a channel and return its ``Subscription``."""
+        subscription = Subscription(channel_id, self.queue_size)
+        subscribers = self._subscribers.setdefault(channel_id, set())
+        subscribers.add(subscription)
+        if len(subscribers) == 1:
+            await self.backend.subscribe(channel_id)
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.channel_id)
+        if not subscribers or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.channel_id]
+            await self.backend.unsubscribe(subscription.channel_id)
+
+    async def publish(self, channel_id, payload):
+        """
+        Broadcast a payload to every subscriber of a channel, on every node.
+
+        Args:
+            channel_id (int): The channel to publish to.
+            payload (dict): The JSON-serializable message.
+        """
+        await self.backend.publish(channel_id, json.dumps(payload))
+
+    def deliver(self, channel_id, text):
+        """Put an encoded message into the queue of every local subscriber."""
+        for subscription in self._subscribers.get(channel_id, ()):
+            subscription.put(text)
+
+
+###########################
+# Backends
+###########################
+class LocalBackend:
+    """Single node backend, publishing delivers directly to the local hub."""
+
+    def bind(self, hub):
+        self.hub = hub
+
+    async def subscribe(self, channel_id):
+        pass
+
+    async def unsubscribe(self, channel_id):
+        pass
+
+    async def publish(self, channel_id, text):
+        self.hub.deliver(channel_id, text)
+
+
+class RedisBackend:
+    """
+    Multi node backend relaying messages through Redis pub/sub.
+
+    Each node subscribes once per channel that has local sockets, so Redis sends one
+    copy of a message per node and the local hub fans it out to the sockets.
+
+    Attributes:
+        url (str): The Redis url, defaults to ``settings.REDIS_URL``.
+        prefix (str): The prefix of the Redis pub/sub channel names.
+    """
+
+    def __init__(self, url=None, prefix="webchat:channel:"):
+        self.url = url or settings.REDIS_URL
+        self.prefix = prefix
+        self._redis = None
+        self._pubsub = None
+        self._listener = None
+
+    def bind(self, hub):
+        self.hub = hub
+
+    def _connect(self):
+        if self._redis is None:
+            # redis is only required when this backend is configured
+            import redis.asyncio
+
+            self._redis = redis.asyncio.from_url(self.url)
+            self._pubsub = self._redis.pubsub()
+        return self._redis
+
+    async def subscribe(self, channel_id):
+        self._connect()
+        await self._pubsub.subscribe(f"{self.prefix}{channel_id}")
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, channel_id):
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(f"{self.prefix}{channel_id}")
+
+    async def publish(self, channel_id, text):
+        await self._connect().publish(f"{self.prefix}{channel_id}", text)
+
+    async def _listen(self):
+        async for message in self._pubsub.listen():
+            if message["type"] != "message":
+                continue
+            channel_id = int(message["channel"].decode()[len(self.prefix) :])
+            self.hub.deliver(channel_id, message["data"].decode())
+
+
+_hub = None
+
+
+def get_hub():
+    """Return the process-wide hub, built from the ``WEBCHAT_*`` settings."""
+    global _hub
+    if _hub is None:
+        backend = import_string(settings.WEBCHAT_FANOUT_BACKEND)()
+        _hub = FanoutHub(backend, queue_size=settings.WEBCHAT_SUBSCRIBER_QUEUE_SIZE)
+    return _hub
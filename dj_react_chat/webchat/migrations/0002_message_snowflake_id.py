@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:30
+
+import webchat.snowflake
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0004_server_member_count"),
+        ("webchat", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="id",
+            field=models.BigIntegerField(
+                default=webchat.snowflake.next_id,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["channel", "id"], name="message_channel_id_idx"),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import webchat.snowflake
+
+
+def open_read_states(apps, schema_editor):
+    """Every member starts with every channel of its servers read."""
+    Channel = apps.get_model("server", "Channel")
+    Membership = apps.get_model("server", "Server").members.through
+    ReadState = apps.get_model("webchat", "ReadState")
+    last_read_id = webchat.snowflake.next_id()
+    for channel_id, server_id in Channel.objects.values_list("id", "server_id"):
+        members = Membership.objects.filter(server_id=server_id).values_list(
+            "account_id", flat=True
+        )
+        ReadState.objects.bulk_create(
+            (
+                ReadState(
+                    account_id=account_id,
+                    channel_id=channel_id,
+                    last_read_id=last_read_id,
+                )
+                for account_id in members.iterator(chunk_size=1000)
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0009_query_indexes"),
+        ("webchat", "0002_message_snowflake_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReadState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_read_id", models.BigIntegerField(default=0)),
+                ("unread_count", models.PositiveIntegerField(default=0)),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_states",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_states",
+                        to="server.channel",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("account", "channel"),
+                        name="readstate_account_channel_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(open_read_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# dj_react_chat\webchat\models.py
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from server.models import Channel
+
+from .snowflake import next_id
+
+
+class Message(models.Model):
+    """
+    Represents a message posted to a channel.
+
+    Messages are append-only. Their ids are time-ordered snowflakes assigned when the
+    instance is created, so a message can be broadcast with its id before it is
+    written, and scrollback is a keyset scan of the ``(channel, id)`` index.
+
+    Attributes:
+        id (int): The snowflake id, see ``webchat/snowflake.py``.
+        channel (Channel): The channel the message was posted to.
+        sender (User): The author of the message.
+        content (str): The text of the message.
+        timestamp (datetime): When the message was sent.
+    """
+
+    id = models.BigIntegerField(primary_key=True, default=next_id, editable=False)
+    channel = models.ForeignKey(
+        Channel, on_delete=models.CASCADE, related_name="channel_messages"
+    )
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="sent_messages",
+    )
+    content = models.TextField()
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["channel", "id"], name="message_channel_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.sender_id} in {self.channel_id}: {self.content[:50]}"
+
+
+class ReadState(models.Model):
+    """
+    How far an account has read a channel, with its number of unread messages.
+
+    A row exists for every channel of every server the account is a member of, it is
+    created with the membership (see ``webchat/signals.py``) and ``unread_count`` is
+    kept up to date when messages are written, so unread badges are read from these
+    rows instead of counted from the message history. See ``webchat/readstate.py``.
+
+    Attributes:
+        account (User): The reader.
+        channel (Channel): The channel read.
+        last_read_id (int): The snowflake id of the last message read, messages with
+            a greater id are unread.
+        unread_count (int): The number of messages after ``last_read_id`` that were
+            sent by someone else.
+    """
+
+    account = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="read_states",
+    )
+    channel = models.ForeignKey(
+        Channel, on_delete=models.CASCADE, related_name="read_states"
+    )
+    last_read_id = models.BigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index of the badge lookup, which filters on the account.
+            models.UniqueConstraint(
+                fields=["account", "channel"], name="readstate_account_channel_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} in {self.channel_id}: {self.unread_count} unread"
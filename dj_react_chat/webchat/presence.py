@@ -0,0 +1,425 @@
+# dj_react_chat\webchat\presence.py
+
+import asyncio
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .fanout import get_hub
+
+ONLINE = "online"
+TYPING = "typing"
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel for lease deadlines.
+
+    Deadlines are hashed into ``slots`` buckets of ``tick`` seconds. ``advance`` only
+    visits the buckets of the ticks that passed since the previous call, so expiring
+    costs the number of elapsed ticks plus the entries found there, never a scan of
+    every lease. Rescheduling a key is O(1): its old bucket entry is dropped lazily
+    when that bucket comes around.
+
+    Attributes:
+        tick (float): The resolution in seconds.
+        deadlines (dict): Key to its current ``(deadline, bucket index)``.
+        current (int): The first tick ``advance`` has not visited yet.
+    """
+
+    def __init__(self, tick=1.0, slots=64):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.deadlines = {}
+        self.current = None
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def schedule(self, key, deadline, now):
+        """Schedule ``key`` to expire at ``deadline``, replacing its previous deadline."""
+        if self.current is None:
+            self.current = int(now // self.tick)
+        # A deadline in a tick already visited goes into the next bucket visited.
+        index = max(int(deadline // self.tick), self.current) % len(self.slots)
+        self.deadlines[key] = (deadline, index)
+        self.slots[index].add(key)
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def advance(self, now):
+        """
+        Remove and return the keys whose deadline is at or before ``now``.
+
+        Args:
+            now (float): The current time, on the clock the deadlines use.
+
+        Returns:
+            list: The expired keys.
+        """
+        now_tick = int(now // self.tick)
+        if self.current is None:
+            self.current = now_tick
+        # After a long pause every bucket is visited once.
+        first = max(self.current, now_tick - len(self.slots) + 1)
+        expired = []
+        for tick in range(first, now_tick + 1):
+            index = tick % len(self.slots)
+            bucket = self.slots[index]
+            for key in list(bucket):
+                deadline, key_index = self.deadlines.get(key, (None, None))
+                if key_index != index:
+                    # Cancelled, or rescheduled into another bucket.
+                    bucket.discard(key)
+                elif deadline <= now:
+                    bucket.discard(key)
+                    del self.deadlines[key]
+                    expired.append(key)
+        # The current tick is visited again, its later deadlines are not due yet.
+        self.current = now_tick
+        return expired
+
+
+class PresenceTracker:
+    """
+    In-memory presence and typing state built from leases.
+
+    A lease says that ``account`` is ``online`` in a server or ``typing`` in a channel,
+    held by one ``origin`` (a worker process) until it is released or its TTL runs out.
+    Members are present while they hold at least one lease, and the set of present
+    members of every scope is maintained as leases come and go, so counts and lists
+    are read without computing anything.
+
+    Changes are collected per scope until ``drain`` and reported as net diffs: an
+    account that went offline and came back within a batch is not reported at all.
+
+    Attributes:
+        ttls (dict): Lease TTL in seconds per kind.
+        wheel (TimerWheel): The lease deadlines.
+    """
+
+    def __init__(self, online_ttl=60, typing_ttl=8, tick=1.0):
+        self.ttls = {ONLINE: online_ttl, TYPING: typing_ttl}
+        self.wheel = TimerWheel(tick)
+        # (kind, scope) -> {account: number of leases}
+        self.members = {}
+        # (kind, scope) -> {account: present before the pending batch}
+        self.pending = {}
+
+    def present(self, kind, scope):
+        """Return the accounts present in a scope, do not modify the result."""
+        return self.members.get((kind, scope), {}).keys()
+
+    def count(self, kind, scope):
+        return len(self.members.get((kind, scope), ()))
+
+    def _note(self, kind, scope, account, was_present):
+        self.pending.setdefault((kind, scope), {}).setdefault(account, was_present)
+
+    def touch(self, kind, scope, account, origin, now, ttl=None):
+        """
+        Take or renew a lease.
+
+        Returns:
+            bool: Whether the lease is new.
+        """
+        key = (kind, scope, account, origin)
+        ttl = self.ttls[kind] if ttl is None else ttl
+        is_new = key not in self.wheel.deadlines
+        self.wheel.schedule(key, now + ttl, now)
+        if is_new:
+            members = self.members.setdefault((kind, scope), {})
+            if account not in members:
+                self._note(kind, scope, account, False)
+            members[account] = members.get(account, 0) + 1
+        return is_new
+
+    def release(self, kind, scope, account, origin):
+        """Drop a lease before its TTL, returns whether it was held."""
+        key = (kind, scope, account, origin)
+        if key not in self.wheel.deadlines:
+            return False
+        self.wheel.cancel(key)
+        self._drop(key)
+        return True
+
+    def _drop(self, key):
+        kind, scope, account, _ = key
+        members = self.members[(kind, scope)]
+        members[account] -= 1
+        if not members[account]:
+            del members[account]
+            self._note(kind, scope, account, True)
+            if not members:
+                del self.members[(kind, scope)]
+
+    def expire(self, now):
+        """Drop the leases whose TTL ran out, returns how many."""
+        expired = self.wheel.advance(now)
+        for key in expired:
+            self._drop(key)
+        return len(expired)
+
+    def drain(self):
+        """
+        Return and forget the net changes since the previous call.
+
+        Returns:
+            list[tuple[str, int, list, list]]: ``(kind, scope, added, removed)`` of
+            every scope whose members changed.
+        """
+        diffs = []
+        for (kind, scope), accounts in self.pending.items():
+            members = self.members.get((kind, scope), {})
+            added = sorted(a for a, was in accounts.items() if not was and a in members)
+            removed = sorted(
+                a for a, was in accounts.items() if was and a not in members
+            )
+            if added or removed:
+                diffs.append((kind, scope, added, removed))
+        self.pending = {}
+        return diffs
+
+
+class PresenceService:
+    """
+    Presence and typing indicators for the sockets of this process.
+
+    Sockets report connects, heartbeats and typing here, nothing touches the database.
+    Every ``flush_interval`` the service expires leases, pushes the batched diffs to
+    the local sockets and publishes this worker's lease changes through the backend:
+    ``LocalPresenceBackend`` for a single process, ``RedisPresenceBackend`` to share
+    presence between workers. Each worker replays the leases of the others into its
+    own ``PresenceTracker``, so reads stay local and O(1).
+
+    Server -> client frames:
+    ``{"type": "presence", "server": <id>, "online": [<ids>], "offline": [<ids>],
+    "count": <n>}`` and ``{"type": "typing", "channel": <id>, "typing": [<ids>],
+    "stopped": [<ids>]}``
+
+    Attributes:
+        backend: The shared state backend.
+        tracker (PresenceTracker): The presence state of every worker.
+        origin (str): The id of this worker in shared leases.
+        flush_interval (float): Seconds between batches.
+    """
+
+    def __init__(
+        self, backend, online_ttl=60, typing_ttl=8, flush_interval=0.25, tick=1.0
+    ):
+        self.backend = backend
+        self.tracker = PresenceTracker(online_ttl, typing_ttl, tick)
+        self.origin = uuid.uuid4().hex
+        self.flush_interval = flush_interval
+        # (server, account) -> sockets of this process
+        self.sockets = {}
+        # server -> subscriptions of the sockets watching it
+        self.watchers = {}
+        # (kind, scope, account) -> "touch" or "release", published on flush
+        self.outgoing = {}
+        self._task = None
+        self._loop = None
+        backend.bind(self)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    def now(self):
+        return time.monotonic()
+
+    def _touch(self, kind, scope, account):
+        self.tracker.touch(kind, scope, account, self.origin, self.now())
+        self.outgoing[(kind, scope, account)] = "touch"
+
+    def _release(self, kind, scope, account):
+        self.tracker.release(kind, scope, account, self.origin)
+        self.outgoing[(kind, scope, account)] = "release"
+
+    ###########################
+    # Socket events
+    ###########################
+    def connect(self, server_id, account_id, subscription):
+        """Mark an account online in a server and send presence to ``subscription``."""
+        self._ensure_started()
+        key = (server_id, account_id)
+        self.sockets[key] = self.sockets.get(key, 0) + 1
+        self._touch(ONLINE, server_id, account_id)
+        self.watchers.setdefault(server_id, set()).add(subscription)
+        online = sorted(self.tracker.present(ONLINE, server_id))
+        subscription.put(self.encode_presence(server_id, online, []))
+
+    def heartbeat(self, server_id, account_id):
+        if (server_id, account_id) in self.sockets:
+            self._touch(ONLINE, server_id, account_id)
+
+    def disconnect(self, server_id, account_id, subscription):
+        key = (server_id, account_id)
+        watchers = self.watchers.get(server_id)
+        if watchers is not None:
+            watchers.discard(subscription)
+            if not watchers:
+                del self.watchers[server_id]
+        if key not in self.sockets:
+            return
+        self.sockets[key] -= 1
+        if not self.sockets[key]:
+            del self.sockets[key]
+            self._release(ONLINE, server_id, account_id)
+
+    def typing(self, channel_id, account_id):
+        self._ensure_started()
+        self._touch(TYPING, channel_id, account_id)
+
+    def stop_typing(self, channel_id, account_id):
+        if account_id in self.tracker.present(TYPING, channel_id):
+            self._release(TYPING, channel_id, account_id)
+
+    ###########################
+    # Reads
+    ###########################
+    def online_count(self, server_id):
+        return self.tracker.count(ONLINE, server_id)
+
+    def online(self, server_id):
+        return sorted(self.tracker.present(ONLINE, server_id))
+
+    def typing_in(self, channel_id):
+        return sorted(self.tracker.present(TYPING, channel_id))
+
+    ###########################
+    # Batching
+    ###########################
+    def apply(self, origin, events):
+        """Replay the lease changes published by another worker."""
+        if origin == self.origin:
+            return
+        now = self.now()
+        for op, kind, scope, account, ttl in events:
+            if op == "touch":
+                self.tracker.touch(kind, scope, account, origin, now, ttl)
+            else:
+                self.tracker.release(kind, scope, account, origin)
+
+    def encode_presence(self, server_id, online, offline):
+        return json.dumps(
+            {
+                "type": "presence",
+                "server": server_id,
+                "online": online,
+                "offline": offline,
+                "count": self.online_count(server_id),
+            }
+        )
+
+    async def flush(self):
+        """Expire leases, push the diffs to local sockets and publish our changes."""
+        self.tracker.expire(self.now())
+        hub = get_hub()
+        for kind, scope, added, removed in self.tracker.drain():
+            if kind == ONLINE:
+                text = self.encode_presence(scope, added, removed)
+                for subscription in self.watchers.get(scope, ()):
+                    subscription.put(text)
+            else:
+                payload = {
+                    "type": "typing",
+                    "channel": scope,
+                    "typing": added,
+                    "stopped": removed,
+                }
+                hub.deliver(scope, json.dumps(payload))
+        if self.outgoing:
+            events = [
+                (op, kind, scope, account, self.tracker.ttls[kind])
+                for (kind, scope, account), op in self.outgoing.items()
+            ]
+            self.outgoing = {}
+            await self.backend.publish(self.origin, events)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+###########################
+# Backends
+###########################
+class LocalPresenceBackend:
+    """Single process backend, there are no other workers to tell."""
+
+    def bind(self, service):
+        self.service = service
+
+    async def publish(self, origin, events):
+        pass
+
+
+class RedisPresenceBackend:
+    """
+    Shares leases between workers through a Redis pub/sub channel.
+
+    Every worker publishes its batched lease changes and replays the batches of the
+    others. A worker that starts later learns the existing leases as they are renewed
+    by heartbeats, within one ``WEBCHAT_PRESENCE_TTL``.
+
+    Attributes:
+        url (str): The Redis url, defaults to ``settings.REDIS_URL``.
+        channel (str): The Redis pub/sub channel.
+    """
+
+    def __init__(self, url=None, channel="webchat:presence"):
+        self.url = url or settings.REDIS_URL
+        self.channel = channel
+        self._redis = None
+        self._listener = None
+
+    def bind(self, service):
+        self.service = service
+
+    def _connect(self):
+        if self._redis is None:
+            # redis is only required when this backend is configured
+            import redis.asyncio
+
+            self._redis = redis.asyncio.from_url(self.url)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        return self._redis
+
+    async def publish(self, origin, events):
+        text = json.dumps({"origin": origin, "events": events})
+        await self._connect().publish(self.channel, text)
+
+    async def _listen(self):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            batch = json.loads(message["data"])
+            self.service.apply(batch["origin"], batch["events"])
+
+
+_service = None
+
+
+def get_presence():
+    """Return the process-wide presence service, built from the ``WEBCHAT_*`` settings."""
+    global _service
+    if _service is None:
+        backend = import_string(settings.WEBCHAT_PRESENCE_BACKEND)()
+        _service = PresenceService(
+            backend,
+            online_ttl=settings.WEBCHAT_PRESENCE_TTL,
+            typing_ttl=settings.WEBCHAT_TYPING_TTL,
+            flush_interval=settings.WEBCHAT_PRESENCE_FLUSH_INTERVAL,
+        )
+    return _service
@@ -0,0 +1,178 @@
+# dj_react_chat\webchat\readstate.py
+"""
+Per-account read state of channels and the unread badges derived from it.
+
+Counting the messages newer than a last-read marker would scan the history of every
+channel on every page load. Instead every (account, channel) pair has a ``ReadState``
+row holding the pointer and an ``unread_count`` that is maintained incrementally:
+
+- ``count_unread`` runs in the transaction that inserts a batch of messages and adds
+  the new messages to the counters of the channel's readers, one UPDATE per channel.
+- ``mark_read`` moves pointers forward, a batch of them in one transaction, and
+  recounts what is left after each pointer (usually nothing).
+- ``unread_badges`` reads every badge of an account with a single indexed query.
+
+Rows are opened with the membership and closed when the account leaves, see
+``webchat/signals.py``. A new row starts at the current snowflake id, what was sent
+before the account could see the channel is not unread.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from server.members import Membership, chunked
+from server.models import Channel
+
+from .models import Message, ReadState
+from .snowflake import next_id
+
+
+def _message_count(queryset):
+    """A subquery counting the rows of a ``Message`` queryset, 0 when there are none."""
+    counted = (
+        queryset.order_by().values("channel_id").annotate(n=Count("id")).values("n")
+    )
+    return Coalesce(Subquery(counted), Value(0))
+
+
+def open_read_states(channel_ids, account_ids, batch_size=1000):
+    """
+    Create the read state of every account in every channel, with nothing unread.
+
+    Existing rows are kept as they are.
+
+    Args:
+        channel_ids (Iterable[int]): The channels.
+        account_ids (Iterable[int]): The accounts.
+        batch_size (int): Number of rows per INSERT.
+    """
+    channel_ids = list(channel_ids)
+    if not channel_ids:
+        return
+    last_read_id = next_id()
+    for chunk in chunked(account_ids, max(batch_size // len(channel_ids), 1)):
+        ReadState.objects.bulk_create(
+            [
+                ReadState(
+                    account_id=account_id,
+                    channel_id=channel_id,
+                    last_read_id=last_read_id,
+                )
+                for account_id in chunk
+                for channel_id in channel_ids
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+
+def join_servers(server_ids, account_ids):
+    """Open the read states of the accounts in every channel of the servers."""
+    channel_ids = Channel.objects.filter(server_id__in=server_ids).values_list(
+        "id", flat=True
+    )
+    open_read_states(channel_ids, account_ids)
+
+
+def leave_servers(server_ids=None, account_ids=None):
+    """
+    Delete the read states of the accounts in the channels of the servers.
+
+    ``None`` stands for every server or every account, e.g. when an account leaves all
+    of its servers at once.
+    """
+    rows = ReadState.objects.all()
+    if server_ids is not None:
+        rows = rows.filter(channel__server_id__in=server_ids)
+    if account_ids is not None:
+        rows = rows.filter(account_id__in=account_ids)
+    rows.delete()
+
+
+def open_channel(channel, batch_size=1000):
+    """Open the read states of every member of the server of a new channel."""
+    members = (
+        Membership.objects.filter(server_id=channel.server_id)
+        .values_list("account_id", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+    open_read_states([channel.pk], members, batch_size=batch_size)
+
+
+def count_unread(messages):
+    """
+    Add newly inserted messages to the unread counters of their channels.
+
+    One UPDATE per channel of the batch. A reader's counter grows by the messages of
+    the batch that are after its pointer and not its own, pointers that were moved
+    past a message before it was written do not count it.
+
+    Args:
+        messages (list[Message]): Messages inserted in the current transaction.
+    """
+    by_channel = defaultdict(list)
+    for message in messages:
+        by_channel[message.channel_id].append(message.id)
+    for channel_id, ids in by_channel.items():
+        new_messages = Message.objects.filter(
+            channel_id=channel_id, id__in=ids, id__gt=OuterRef("last_read_id")
+        ).exclude(sender_id=OuterRef("account_id"))
+        ReadState.objects.filter(
+            channel_id=channel_id, last_read_id__lt=max(ids)
+        ).update(unread_count=F("unread_count") + _message_count(new_messages))
+
+
+@transaction.atomic
+def mark_read(pointers):
+    """
+    Move read pointers forward, in a single transaction.
+
+    Pointers never move backwards and are capped at the current snowflake id. Only the
+    messages after the new pointer are counted, with the ``(channel, id)`` index of
+    ``Message``, which is nothing when a channel was read up to its last message.
+
+    Args:
+        pointers (Iterable[tuple[int, int, int]]): ``(account_id, channel_id,
+            message_id)`` triples, the greatest id of an account and channel wins.
+
+    Returns:
+        int: The number of read states that moved.
+    """
+    latest = {}
+    for account_id, channel_id, message_id in pointers:
+        key = (account_id, channel_id)
+        latest[key] = max(message_id, latest.get(key, message_id))
+    limit = next_id()
+    moved = 0
+    for (account_id, channel_id), message_id in latest.items():
+        message_id = min(message_id, limit)
+        unread = Message.objects.filter(
+            channel_id=channel_id, id__gt=message_id
+        ).exclude(sender_id=account_id)
+        moved += ReadState.objects.filter(
+            account_id=account_id, channel_id=channel_id, last_read_id__lt=message_id
+        ).update(last_read_id=message_id, unread_count=_message_count(unread))
+    return moved
+
+
+def unread_badges(account_id):
+    """
+    Return the unread counts of an account per channel and per server.
+
+    One query over the account's read states, joined to their channels for the server
+    ids, channels without unread messages are left out.
+
+    Returns:
+        dict: ``{"channels": {channel_id: count}, "servers": {server_id: count}}``.
+    """
+    rows = ReadState.objects.filter(
+        account_id=account_id, unread_count__gt=0
+    ).values_list("channel_id", "channel__server_id", "unread_count")
+    channels = {}
+    servers = defaultdict(int)
+    for channel_id, server_id, count in rows:
+        channels[channel_id] = count
+        servers[server_id] += count
+    return {"channels": channels, "servers": dict(servers)}
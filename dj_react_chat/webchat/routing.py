@@ -0,0 +1,9 @@
+# dj_react_chat\webchat\routing.py
+
+from django.urls import path
+
+from .consumer import ChatConsumer
+
+websocket_urlpatterns = [
+    path("ws/channel/<int:channel_id>/", ChatConsumer.as_asgi()),
+]
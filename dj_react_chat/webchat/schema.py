@@ -0,0 +1,45 @@
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from drf_spectacular.types import OpenApiTypes
+from .serializer import MarkReadSerializer, MessageSerializer, UnreadBadgesSerializer
+
+message_list_docs = extend_schema(
+    responses={
+        200: MessageSerializer(many=True),
+        404: OpenApiResponse(
+            description="The channel does not exist or the user is not a member"
+        ),
+    },
+    parameters=[
+        OpenApiParameter(
+            name="channel_id",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            required=True,
+            description="The channel to read the history of",
+        ),
+        OpenApiParameter(
+            name="page_size",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Number of messages per page, newest first (default 50, max 100)",
+        ),
+        OpenApiParameter(
+            name="cursor",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description=(
+                "Opaque cursor from the 'next' field of the previous page, "
+                "returns the messages older than that page"
+            ),
+        ),
+    ],
+)
+
+unread_docs = extend_schema(responses=UnreadBadgesSerializer)
+
+mark_read_docs = extend_schema(
+    request=MarkReadSerializer,
+    responses={
+        204: OpenApiResponse(description="The read pointers were moved"),
+    },
+)
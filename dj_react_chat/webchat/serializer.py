@@ -0,0 +1,56 @@
+from rest_framework import serializers
+from .models import Message
+
+
+class MessageSerializer(serializers.ModelSerializer):
+    """Serializer for Message model.
+
+    Attributes:
+        id: The snowflake id as a string, 64-bit integers are not exact in JavaScript.
+        Meta.model: The model class that this serializer is associated with.
+        Meta.fields: Specifies which fields of the model should be included in the serialization.
+    """
+
+    id = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Message
+        fields = "__all__"
+
+
+class ReadPointerSerializer(serializers.Serializer):
+    """Serializer for how far a channel was read.
+
+    Attributes:
+        channel: The channel read.
+        message: The id of the last message read, as a string or an integer.
+    """
+
+    channel = serializers.IntegerField(min_value=1)
+    message = serializers.IntegerField(min_value=0)
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """Serializer for a batch of read pointers.
+
+    Attributes:
+        pointers: The channels read and how far.
+    """
+
+    MAX_POINTERS = 1000
+
+    pointers = serializers.ListField(
+        child=ReadPointerSerializer(), allow_empty=False, max_length=MAX_POINTERS
+    )
+
+
+class UnreadBadgesSerializer(serializers.Serializer):
+    """Serializer for the unread badges of an account.
+
+    Attributes:
+        channels: Channel id to its number of unread messages.
+        servers: Server id to the number of unread messages in its channels.
+    """
+
+    channels = serializers.DictField(child=serializers.IntegerField())
+    servers = serializers.DictField(child=serializers.IntegerField())
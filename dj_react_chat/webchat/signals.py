@@ -0,0 +1,51 @@
+# dj_react_chat\webchat\signals.py
+
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from server.members import Membership, members_bulk_changed
+from server.models import Channel
+
+from . import readstate
+
+
+###########################
+# Read state
+###########################
+@receiver(m2m_changed, sender=Membership)
+def membership_read_states(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Open read states when an account joins a server, delete them when it leaves.
+
+    ``instance`` is the server for ``server.members`` changes, or the account for
+    ``account.server_members`` changes, in which case ``pk_set`` holds server ids.
+    ``post_add`` only reports the rows that were actually inserted.
+    """
+    if action == "post_add":
+        if reverse:
+            readstate.join_servers(pk_set, [instance.pk])
+        else:
+            readstate.join_servers([instance.pk], pk_set)
+    elif action == "post_remove":
+        if reverse:
+            readstate.leave_servers(pk_set, [instance.pk])
+        else:
+            readstate.leave_servers([instance.pk], pk_set)
+    elif action == "post_clear":
+        if reverse:
+            readstate.leave_servers(account_ids=[instance.pk])
+        else:
+            readstate.leave_servers(server_ids=[instance.pk])
+
+
+@receiver(members_bulk_changed, sender=Membership)
+def bulk_membership_read_states(sender, server, action, account_ids, **kwargs):
+    if action == "join":
+        readstate.join_servers([server.pk], account_ids)
+    else:
+        readstate.leave_servers([server.pk], account_ids)
+
+
+@receiver(post_save, sender=Channel)
+def channel_read_states(sender, instance, created, **kwargs):
+    if created:
+        readstate.open_channel(instance)
@@ -0,0 +1,103 @@
+# dj_react_chat\webchat\snowflake.py
+
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# 2024-01-01T00:00:00Z in milliseconds
+EPOCH_MS = 1704067200000
+
+TIMESTAMP_BITS = 41
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+WORKER_COUNTER_KEY = "webchat:snowflake:worker"
+
+
+class SnowflakeGenerator:
+    """
+    Generates time-ordered 64-bit ids (snowflake style).
+
+    An id is ``timestamp (41 bits) | worker id (10 bits) | sequence (12 bits)``,
+    where the timestamp counts milliseconds since ``EPOCH_MS``. Ids from one
+    generator are strictly increasing, also when the clock steps backwards, and ids
+    from different workers never collide. Sorting by id sorts by creation time.
+
+    Attributes:
+        worker_id (int): The id of this worker, between 0 and 1023.
+    """
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def __call__(self):
+        with self._lock:
+            now = max(int(time.time() * 1000) - EPOCH_MS, self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 4096 ids in this millisecond, borrow the next one.
+                    now += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (
+                (now << (WORKER_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self._sequence
+            )
+
+
+def timestamp_ms(snowflake):
+    """Return the unix time in milliseconds encoded in an id."""
+    return (snowflake >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS
+
+
+def allocate_worker_id(cache=None):
+    """
+    Return a worker id for this process.
+
+    With a cache shared by every process (Redis), ids are taken from an atomic
+    counter in the cache, so the last 1024 processes started all have different
+    ids. A local memory cache cannot coordinate processes, the id is then derived
+    from the process id, which is only safe when a single process writes messages:
+    deployments running several processes without a shared cache must set
+    ``WEBCHAT_WORKER_ID`` for each of them.
+    """
+    cache = cache or caches["default"]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        return os.getpid() & MAX_WORKER_ID
+    cache.add(WORKER_COUNTER_KEY, -1, timeout=None)
+    return cache.incr(WORKER_COUNTER_KEY) & MAX_WORKER_ID
+
+
+_generator = None
+
+
+def next_id():
+    """
+    Return the next id of the process-wide generator.
+
+    The worker id comes from ``settings.WEBCHAT_WORKER_ID`` and falls back to
+    ``allocate_worker_id()``.
+    """
+    global _generator
+    if _generator is None:
+        worker_id = getattr(settings, "WEBCHAT_WORKER_ID", None)
+        if worker_id is None:
+            worker_id = allocate_worker_id()
+        _generator = SnowflakeGenerator(worker_id)
+    return _generator()
@@ -0,0 +1,51 @@
+# dj_react_chat\webchat\store.py
+
+from django.db import transaction
+from server.pagination import KeysetPagination
+
+from .models import Message
+from .readstate import count_unread
+
+# Newest first: scrollback walks the (channel, id) index backwards.
+history_pagination = KeysetPagination(ordering=("-id",))
+
+
+def append_messages(messages, batch_size=500):
+    """
+    Insert messages in bulk inside a single transaction.
+
+    Ids are assigned when the ``Message`` instances are created, so nothing has to be
+    read back after the insert and the batch commits once instead of per message. The
+    unread counters of the channels are updated in the same transaction.
+
+    Args:
+        messages (list[Message]): Unsaved messages.
+        batch_size (int): The number of rows per INSERT statement.
+
+    Returns:
+        list[Message]: The inserted messages.
+    """
+    with transaction.atomic():
+        messages = Message.objects.bulk_create(messages, batch_size=batch_size)
+        count_unread(messages)
+    return messages
+
+
+def fetch_history(channel_id, cursor=None, page_size=None):
+    """
+    Return a page of a channel's messages, newest first.
+
+    Each page is a range scan of the ``(channel, id)`` index starting below the cursor,
+    so loading older messages costs the same however long the channel's history is.
+
+    Args:
+        channel_id (int): The channel to read.
+        cursor (str): The ``next`` cursor of the previous (newer) page.
+        page_size (int | str): The number of messages per page.
+
+    Returns:
+        tuple[list[Message], str | None]: The messages and the cursor of the next
+        (older) page, or ``None`` when the start of the channel was reached.
+    """
+    queryset = Message.objects.filter(channel_id=channel_id)
+    return history_pagination.paginate(queryset, cursor, page_size)
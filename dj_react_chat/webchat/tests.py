@@ -0,0 +1,555 @@
+import asyncio
+import json
+import tempfile
+import time
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache.backends.filebased import FileBasedCache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from rest_framework.test import APIClient
+from server.members import bulk_join, bulk_leave
+from server.models import Category, Server, Channel
+
+from .consumer import CLOSE_FORBIDDEN, CLOSE_NOT_FOUND, CLOSE_UNAUTHENTICATED
+from .fanout import FanoutHub, LocalBackend, Subscription
+from . import presence, writer
+from .models import Message, ReadState
+from .readstate import mark_read, unread_badges
+from .routing import websocket_urlpatterns
+from .snowflake import SnowflakeGenerator, allocate_worker_id, timestamp_ms
+from .store import append_messages, fetch_history
+from .writer import MessageWriter, get_read_marker, get_writer
+
+application = URLRouter(websocket_urlpatterns)
+
+
+class ChatConsumerTests(TransactionTestCase):
+    def setUp(self):
+        presence._service = None
+        Account = get_user_model()
+        self.alice = Account.objects.create_user(username="alice", password="pw")
+        self.bob = Account.objects.create_user(username="bob", password="pw")
+        category = Category.objects.create(name="gaming")
+        server = Server.objects.create(name="s", owner=self.alice, category=category)
+        self.channel = Channel.objects.create(
+            name="general", owner=self.alice, topic="topic", server=server
+        )
+        server.members.add(self.alice, self.bob)
+
+    async def receive_message(self, socket):
+        """Return the next chat message, skipping presence and typing frames."""
+        while True:
+            frame = await socket.receive_json_from()
+            if frame["type"] == "message":
+                return frame
+
+    async def receive_no_message(self, socket):
+        frames = []
+        while not await socket.receive_nothing():
+            frames.append(await socket.receive_json_from())
+        return all(frame["type"] != "message" for frame in frames)
+
+    def communicator(self, user, channel_id=None):
+        channel_id = channel_id or self.channel.id
+        communicator = WebsocketCommunicator(application, f"/ws/channel/{channel_id}/")
+        communicator.scope["user"] = user
+        return communicator
+
+    async def test_message_is_broadcast_and_persisted(self):
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        self.assertTrue((await alice.connect())[0])
+        self.assertTrue((await bob.connect())[0])
+
+        await alice.send_json_to({"message": "hello"})
+        for socket in (alice, bob):
+            received = await self.receive_message(socket)
+            self.assertEqual(received["content"], "hello")
+            self.assertEqual(received["username"], "alice")
+
+        await get_writer().flush()
+        await alice.disconnect()
+        await bob.disconnect()
+        message = await Message.objects.aget()
+        self.assertEqual(
+            (str(message.id), message.channel_id, message.sender_id, message.content),
+            (received["id"], self.channel.id, self.alice.id, "hello"),
+        )
+
+    @override_settings(WEBCHAT_READ_FLUSH_INTERVAL=0)
+    async def test_read_frame(self):
+        writer._read_marker = None
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        self.assertTrue((await alice.connect())[0])
+        self.assertTrue((await bob.connect())[0])
+
+        await alice.send_json_to({"message": "hello"})
+        received = await self.receive_message(bob)
+        await get_writer().flush()
+        badges = await sync_to_async(unread_badges)(self.bob.pk)
+        self.assertEqual(badges["channels"], {self.channel.id: 1})
+
+        await bob.send_json_to({"type": "read", "id": received["id"]})
+        await bob.send_json_to({"type": "heartbeat"})
+        await bob.receive_nothing()
+        await get_read_marker().flush()
+        await alice.disconnect()
+        await bob.disconnect()
+        badges = await sync_to_async(unread_badges)(self.bob.pk)
+        self.assertEqual(badges["channels"], {})
+
+    async def test_other_channels_do_not_receive(self):
+        other = await Channel.objects.acreate(
+            name="other", owner=self.alice, topic="t", server_id=self.channel.server_id
+        )
+        alice, bob = self.communicator(self.alice), self.communicator(
+            self.bob, other.id
+        )
+        await alice.connect()
+        await bob.connect()
+        await alice.send_json_to({"message": "hello"})
+        await self.receive_message(alice)
+        self.assertTrue(await self.receive_no_message(bob))
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_presence_and_typing(self):
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        await alice.connect()
+        snapshot = await alice.receive_json_from()
+        self.assertEqual(
+            (snapshot["type"], snapshot["online"], snapshot["count"]),
+            ("presence", [self.alice.id], 1),
+        )
+        await bob.connect()
+        await bob.receive_json_from()
+
+        await bob.send_json_to({"type": "typing"})
+        await presence.get_presence().flush()
+        frames = [await alice.receive_json_from() for _ in range(2)]
+        by_type = {frame["type"]: frame for frame in frames}
+        self.assertEqual(by_type["presence"]["online"], [self.alice.id, self.bob.id])
+        self.assertEqual(by_type["typing"]["typing"], [self.bob.id])
+
+        await bob.disconnect()
+        await presence.get_presence().flush()
+        frames = [await alice.receive_json_from() for _ in range(2)]
+        by_type = {frame["type"]: frame for frame in frames}
+        self.assertEqual(by_type["presence"]["offline"], [self.bob.id])
+        self.assertEqual(by_type["typing"]["stopped"], [self.bob.id])
+        await alice.disconnect()
+
+    async def test_anonymous_is_rejected(self):
+        connected, code = await self.communicator(AnonymousUser()).connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, CLOSE_UNAUTHENTICATED)
+
+    async def test_unknown_channel_is_rejected(self):
+        connected, code = await self.communicator(self.alice, 999).connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, CLOSE_NOT_FOUND)
+
+    async def test_non_member_is_rejected(self):
+        carol = await sync_to_async(get_user_model().objects.create_user)("carol")
+        connected, code = await self.communicator(carol).connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, CLOSE_FORBIDDEN)
+
+
+class FanoutHubTests(SimpleTestCase):
+    async def test_publish_reaches_every_subscriber_once(self):
+        hub = FanoutHub(LocalBackend())
+        subscriptions = [await hub.subscribe(1) for _ in range(3)]
+        other = await hub.subscribe(2)
+        await hub.publish(1, {"content": "hi"})
+        for subscription in subscriptions:
+            self.assertEqual(
+                json.loads(subscription.queue.get_nowait())["content"], "hi"
+            )
+        self.assertTrue(other.queue.empty())
+
+    async def test_slow_subscriber_overflows(self):
+        hub = FanoutHub(LocalBackend(), queue_size=2)
+        subscription = await hub.subscribe(1)
+        for i in range(3):
+            await hub.publish(1, {"n": i})
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(subscription.queue.qsize(), 2)
+
+    async def test_unsubscribe(self):
+        hub = FanoutHub(LocalBackend())
+        subscription = await hub.subscribe(1)
+        await hub.unsubscribe(subscription)
+        self.assertEqual(hub.subscriber_count(1), 0)
+        await asyncio.sleep(0)
+
+
+class TimerWheelTests(SimpleTestCase):
+    def test_expires_due_keys_only(self):
+        wheel = presence.TimerWheel(tick=1, slots=8)
+        wheel.schedule("a", 3.5, now=0)
+        wheel.schedule("b", 20, now=0)
+        self.assertEqual(wheel.advance(3), [])
+        self.assertEqual(wheel.advance(4), ["a"])
+        # "b" shares a bucket with tick 4 but is two rounds away.
+        self.assertEqual(wheel.advance(19), [])
+        self.assertEqual(wheel.advance(20), ["b"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_reschedule_and_cancel(self):
+        wheel = presence.TimerWheel(tick=1, slots=8)
+        wheel.schedule("a", 2, now=0)
+        wheel.schedule("a", 5, now=1)
+        wheel.schedule("b", 2, now=1)
+        wheel.cancel("b")
+        self.assertEqual(wheel.advance(3), [])
+        self.assertEqual(wheel.advance(6), ["a"])
+
+    def test_long_pause_visits_every_bucket(self):
+        wheel = presence.TimerWheel(tick=1, slots=4)
+        for key in range(10):
+            wheel.schedule(key, key + 0.5, now=0)
+        self.assertEqual(sorted(wheel.advance(100)), list(range(10)))
+
+    def test_deadline_in_the_past(self):
+        wheel = presence.TimerWheel(tick=1, slots=8)
+        wheel.advance(10)
+        wheel.schedule("a", 3, now=10)
+        self.assertEqual(wheel.advance(10), ["a"])
+
+
+class PresenceTrackerTests(SimpleTestCase):
+    def setUp(self):
+        self.tracker = presence.PresenceTracker(online_ttl=30, typing_ttl=5, tick=1)
+
+    def test_counts_accounts_not_leases(self):
+        self.tracker.touch("online", 1, 10, "worker-a", now=0)
+        self.tracker.touch("online", 1, 10, "worker-b", now=0)
+        self.tracker.touch("online", 1, 11, "worker-a", now=0)
+        self.assertEqual(self.tracker.count("online", 1), 2)
+        self.tracker.release("online", 1, 10, "worker-a")
+        self.assertEqual(self.tracker.count("online", 1), 2)
+        self.tracker.release("online", 1, 10, "worker-b")
+        self.assertEqual(self.tracker.count("online", 1), 1)
+
+    def test_net_diffs(self):
+        self.tracker.touch("online", 1, 10, "w", now=0)
+        self.tracker.touch("online", 1, 11, "w", now=0)
+        self.tracker.release("online", 1, 11, "w")
+        self.assertEqual(self.tracker.drain(), [("online", 1, [10], [])])
+        # Leaving and coming back within a batch is not a change.
+        self.tracker.release("online", 1, 10, "w")
+        self.tracker.touch("online", 1, 10, "w", now=1)
+        self.assertEqual(self.tracker.drain(), [])
+
+    def test_ttl_expiry_and_heartbeat(self):
+        self.tracker.touch("online", 1, 10, "w", now=0)
+        self.tracker.touch("typing", 7, 10, "w", now=0)
+        self.tracker.touch("online", 1, 10, "w", now=20)
+        self.tracker.drain()
+        self.assertEqual(self.tracker.expire(now=31), 1)
+        self.assertEqual(self.tracker.count("online", 1), 1)
+        self.assertEqual(self.tracker.drain(), [("typing", 7, [], [10])])
+        self.tracker.expire(now=51)
+        self.assertEqual(self.tracker.count("online", 1), 0)
+
+
+class PresenceServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.service = presence.PresenceService(presence.LocalPresenceBackend())
+        self.subscription = Subscription(1, 16)
+
+    def frames(self):
+        frames = []
+        while not self.subscription.queue.empty():
+            frames.append(json.loads(self.subscription.queue.get_nowait()))
+        return frames
+
+    async def test_sockets_of_one_account(self):
+        self.service.connect(1, 10, self.subscription)
+        other = Subscription(1, 16)
+        self.service.connect(1, 10, other)
+        self.assertEqual(self.service.online_count(1), 1)
+        self.service.disconnect(1, 10, other)
+        self.assertEqual(self.service.online(1), [10])
+        self.service.disconnect(1, 10, self.subscription)
+        self.assertEqual(self.service.online_count(1), 0)
+
+    async def test_batched_diff(self):
+        watcher = Subscription(1, 16)
+        self.service.connect(1, 99, watcher)
+        for account in (10, 11, 12):
+            self.service.connect(1, account, Subscription(1, 16))
+        await self.service.flush()
+        frames = [json.loads(watcher.queue.get_nowait()) for _ in range(2)]
+        self.assertEqual(frames[1]["online"], [10, 11, 12, 99])
+        self.assertEqual(frames[1]["count"], 4)
+        self.assertTrue(watcher.queue.empty())
+
+    async def test_remote_leases(self):
+        other = presence.PresenceService(presence.LocalPresenceBackend())
+        published = []
+
+        async def publish(origin, events):
+            published.append((origin, events))
+
+        other.backend.publish = publish
+        other.connect(1, 20, Subscription(1, 16))
+        other.typing(5, 20)
+        await other.flush()
+        for origin, events in published:
+            self.service.apply(origin, events)
+        self.assertEqual(self.service.online(1), [20])
+        self.assertEqual(self.service.typing_in(5), [20])
+        # The remote lease expires with its TTL when the worker goes away.
+        self.service.now = lambda: time.monotonic() + 61
+        await self.service.flush()
+        self.assertEqual(self.service.online_count(1), 0)
+
+
+class SnowflakeTests(SimpleTestCase):
+    def test_ids_are_strictly_increasing(self):
+        generate = SnowflakeGenerator(worker_id=7)
+        ids = [generate() for _ in range(10000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertLess(ids[-1], 1 << 63)
+
+    def test_id_encodes_time_and_worker(self):
+        generate = SnowflakeGenerator(worker_id=5)
+        snowflake = generate()
+        self.assertEqual((snowflake >> 12) & 1023, 5)
+        self.assertAlmostEqual(timestamp_ms(snowflake) / 1000, time.time(), delta=5)
+
+    def test_invalid_worker_id(self):
+        with self.assertRaises(ValueError):
+            SnowflakeGenerator(worker_id=1024)
+
+    def test_worker_ids_from_a_shared_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = FileBasedCache(location, {})
+            self.assertEqual([allocate_worker_id(shared) for _ in range(3)], [0, 1, 2])
+            shared.set("webchat:snowflake:worker", 1023)
+            self.assertEqual(allocate_worker_id(shared), 0)
+
+
+class MessageHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Account = get_user_model()
+        cls.user = Account.objects.create_user(username="alice", password="pw")
+        category = Category.objects.create(name="gaming")
+        server = Server.objects.create(name="s", owner=cls.user, category=category)
+        server.members.add(cls.user)
+        cls.channel, cls.other = [
+            Channel.objects.create(name=n, owner=cls.user, topic="t", server=server)
+            for n in ("general", "other")
+        ]
+        cls.messages = append_messages(
+            [
+                Message(channel=channel, sender=cls.user, content=f"{i}")
+                for i in range(25)
+                for channel in (cls.channel, cls.other)
+            ]
+        )
+
+    def test_scrollback_newest_first(self):
+        expected = [m.id for m in self.messages if m.channel_id == self.channel.id]
+        ids, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page, cursor = fetch_history(self.channel.id, cursor, page_size=10)
+            ids.extend(m.id for m in page)
+            if cursor is None:
+                break
+        self.assertEqual(ids, expected[::-1])
+
+    def test_history_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(
+            "/api/v1/messages/", {"channel_id": self.channel.id, "page_size": 5}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertEqual(response.data["results"][0]["content"], "24")
+        self.assertIsInstance(response.data["results"][0]["id"], str)
+        older = client.get(
+            "/api/v1/messages/",
+            {"channel_id": self.channel.id, "cursor": response.data["next"]},
+        )
+        self.assertEqual(older.data["results"][0]["content"], "19")
+
+    def test_history_endpoint_requires_channel_id(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get("/api/v1/messages/").status_code, 400)
+
+    def test_bad_row_does_not_drop_the_batch(self):
+        batch = [
+            Message(channel=self.channel, sender=self.user, content="before"),
+            # a duplicate id, the INSERT of the batch fails
+            Message(
+                id=self.messages[0].id,
+                channel=self.channel,
+                sender=self.user,
+                content="duplicate",
+            ),
+            Message(channel=self.channel, sender=self.user, content="after"),
+        ]
+        with self.assertLogs("webchat.writer", "ERROR"):
+            MessageWriter().persist(batch)
+        contents = Message.objects.filter(id__in=[m.id for m in batch]).values_list(
+            "content", flat=True
+        )
+        self.assertEqual(sorted(contents), ["0", "after", "before"])
+
+    def test_history_endpoint_requires_membership(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user("bob"))
+        response = client.get("/api/v1/messages/", {"channel_id": self.channel.id})
+        self.assertEqual(response.status_code, 404)
+
+
+class ReadStateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Account = get_user_model()
+        cls.alice, cls.bob, cls.carol = [
+            Account.objects.create_user(username=name, password="pw")
+            for name in ("alice", "bob", "carol")
+        ]
+        category = Category.objects.create(name="gaming")
+        cls.server = Server.objects.create(name="s", owner=cls.alice, category=category)
+        cls.other_server = Server.objects.create(
+            name="t", owner=cls.bob, category=category
+        )
+        cls.general, cls.random = [
+            Channel.objects.create(
+                name=n, owner=cls.alice, topic="t", server=cls.server
+            )
+            for n in ("general", "random")
+        ]
+        cls.news = Channel.objects.create(
+            name="news", owner=cls.bob, topic="t", server=cls.other_server
+        )
+        cls.server.members.add(cls.alice, cls.bob)
+        cls.other_server.members.add(cls.bob)
+
+    def send(self, channel, sender, count=1):
+        return append_messages(
+            [
+                Message(channel=channel, sender=sender, content=f"{i}")
+                for i in range(count)
+            ]
+        )
+
+    def states(self, account):
+        return dict(
+            ReadState.objects.filter(account=account).values_list(
+                "channel_id", "unread_count"
+            )
+        )
+
+    def test_read_states_follow_memberships(self):
+        self.assertEqual(
+            self.states(self.bob),
+            {self.general.id: 0, self.random.id: 0, self.news.id: 0},
+        )
+        self.carol.server_members.add(self.server)
+        self.assertEqual(
+            set(self.states(self.carol)), {self.general.id, self.random.id}
+        )
+        voice = Channel.objects.create(
+            name="voice", owner=self.alice, topic="t", server=self.server
+        )
+        self.assertIn(voice.id, self.states(self.carol))
+        self.server.members.remove(self.carol)
+        self.assertEqual(self.states(self.carol), {})
+
+        bulk_join(self.other_server, [self.alice.pk, self.carol.pk])
+        self.assertEqual(list(self.states(self.carol)), [self.news.id])
+        bulk_leave(self.other_server, [self.carol.pk])
+        self.assertEqual(self.states(self.carol), {})
+        self.other_server.members.clear()
+        self.assertNotIn(self.news.id, self.states(self.alice))
+
+    def test_messages_count_for_the_other_readers(self):
+        self.send(self.general, self.alice, 3)
+        self.send(self.news, self.bob)
+        self.assertEqual(self.states(self.bob)[self.general.id], 3)
+        self.assertEqual(self.states(self.alice)[self.general.id], 0)
+        self.assertEqual(self.states(self.bob)[self.news.id], 0)
+
+    def test_badges_are_one_query(self):
+        self.send(self.general, self.alice, 2)
+        self.send(self.random, self.alice, 1)
+        with self.assertNumQueries(1):
+            badges = unread_badges(self.bob.pk)
+        self.assertEqual(
+            badges,
+            {
+                "channels": {self.general.id: 2, self.random.id: 1},
+                "servers": {self.server.id: 3},
+            },
+        )
+        self.assertEqual(unread_badges(self.alice.pk), {"channels": {}, "servers": {}})
+
+    def test_mark_read(self):
+        messages = self.send(self.general, self.alice, 3)
+        moved = mark_read(
+            [
+                (self.bob.pk, self.general.id, messages[0].id),
+                (self.bob.pk, self.general.id, messages[1].id),
+            ]
+        )
+        self.assertEqual(moved, 1)
+        self.assertEqual(self.states(self.bob)[self.general.id], 1)
+        # pointers do not move backwards
+        self.assertEqual(mark_read([(self.bob.pk, self.general.id, 0)]), 0)
+        self.assertEqual(self.states(self.bob)[self.general.id], 1)
+        # nor into channels the account cannot see
+        self.assertEqual(mark_read([(self.carol.pk, self.general.id, 0)]), 0)
+
+    def test_read_before_written(self):
+        # The socket shows a message before the writer persists it.
+        message = Message(channel=self.general, sender=self.alice, content="hi")
+        mark_read([(self.bob.pk, self.general.id, message.id)])
+        append_messages([message])
+        self.assertEqual(self.states(self.bob)[self.general.id], 0)
+
+    def test_endpoints(self):
+        messages = self.send(self.general, self.alice, 2)
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        response = client.get("/api/v1/messages/unread/")
+        self.assertEqual(
+            response.json(),
+            {
+                "channels": {str(self.general.id): 2},
+                "servers": {str(self.server.id): 2},
+            },
+        )
+        response = client.post(
+            "/api/v1/messages/read/",
+            {
+                "pointers": [
+                    {"channel": self.general.id, "message": str(messages[1].id)}
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(client.get("/api/v1/messages/unread/").json()["channels"], {})
+        response = client.post(
+            "/api/v1/messages/read/", {"pointers": []}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(APIClient().get("/api/v1/messages/unread/").status_code, 403)
@@ -0,0 +1,137 @@
+# dj_react_chat\webchat\views.py
+
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError, AuthenticationFailed, NotFound
+from server.models import Channel
+from .readstate import mark_read, unread_badges
+from .schema import mark_read_docs, message_list_docs, unread_docs
+from .serializer import MarkReadSerializer, MessageSerializer, UnreadBadgesSerializer
+from .store import fetch_history
+
+
+class MessageViewSet(viewsets.ViewSet):
+    """
+    **MessageViewSet**
+
+    A Django REST Framework ViewSet for reading the message history of a channel and
+    the read state of the user.
+
+    ### Methods:
+    - `list(request)`: Returns one page of a channel's messages, newest first.
+    - `unread(request)`: Returns the unread badges of the user.
+    - `read(request)`: Marks channels as read up to a message.
+    """
+
+    @message_list_docs
+    def list(self, request):
+        """
+        **Returns a page of a channel's message history.**
+
+        Pages are keyset scans backwards from the cursor, so scrolling back costs the
+        same on every page regardless of the size of the channel.
+
+        ### Query Parameters:
+        - `channel_id` **(str)**: The channel to read.
+        - `page_size` **(str, optional)**: The number of messages per page.
+        - `cursor` **(str, optional)**: The `next` cursor of the previous page.
+
+        ### Raises:
+        - **AuthenticationFailed**: Raised if the user is not authenticated.
+        - **ValidationError**: Raised for a missing or invalid `channel_id` or an invalid cursor.
+        - **NotFound**: Raised if the channel does not exist or the user is not a member of its server.
+
+        ### Returns:
+        - **Response**: `{"next": <cursor or null>, "results": [...]}`
+
+        ### Example Usage:
+        ```python
+        GET /api/v1/messages/?channel_id=3
+        Returns the last 50 messages of channel 3
+
+        GET /api/v1/messages/?channel_id=3&cursor=eyJvIjpbIi1pZCJd...
+        Returns the 50 messages before those
+        ```
+        """
+        if not request.user.is_authenticated:
+            raise AuthenticationFailed()
+
+        try:
+            channel_id = int(request.query_params["channel_id"])
+        except (KeyError, ValueError):
+            raise ValidationError("channel_id is required and must be an integer")
+        if not Channel.objects.filter(
+            pk=channel_id, server__members=request.user
+        ).exists():
+            raise NotFound("Channel not found")
+
+        messages, next_cursor = fetch_history(
+            channel_id,
+            cursor=request.query_params.get("cursor"),
+            page_size=request.query_params.get("page_size"),
+        )
+        serializer = MessageSerializer(messages, many=True)
+        return Response({"next": next_cursor, "results": serializer.data})
+
+    @unread_docs
+    @action(detail=False, methods=["get"])
+    def unread(self, request):
+        """
+        **Returns the number of unread messages per channel and per server.**
+
+        The counters are maintained when messages are written, this is one query over
+        the user's read states whatever the size of the channels.
+
+        ### Raises:
+        - **AuthenticationFailed**: Raised if the user is not authenticated.
+
+        ### Returns:
+        - **Response**: `{"channels": {<id>: <count>}, "servers": {<id>: <count>}}`,
+          channels and servers without unread messages are left out.
+
+        ### Example Usage:
+        ```python
+        GET /api/v1/messages/unread/
+        Returns {"channels": {"3": 2, "4": 1}, "servers": {"1": 3}}
+        ```
+        """
+        if not request.user.is_authenticated:
+            raise AuthenticationFailed()
+        badges = unread_badges(request.user.pk)
+        return Response(UnreadBadgesSerializer(badges).data)
+
+    @mark_read_docs
+    @action(detail=False, methods=["post"])
+    def read(self, request):
+        """
+        **Marks up to 1,000 channels as read in one transaction.**
+
+        Pointers only move forward, pointers of channels the user cannot see are ignored.
+
+        ### Request Body:
+        - `pointers` **(list)**: `{"channel": <id>, "message": "<snowflake>"}` items, the
+          last message read in each channel.
+
+        ### Raises:
+        - **AuthenticationFailed**: Raised if the user is not authenticated.
+        - **ValidationError**: Raised for a missing, empty or too long `pointers` list.
+
+        ### Returns:
+        - **Response**: `204 No Content`.
+
+        ### Example Usage:
+        ```python
+        POST /api/v1/messages/read/ {"pointers": [{"channel": 3, "message": "7130..."}]}
+        Marks channel 3 as read up to message 7130...
+        ```
+        """
+        if not request.user.is_authenticated:
+            raise AuthenticationFailed()
+        batch = MarkReadSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        mark_read(
+            (request.user.pk, pointer["channel"], pointer["message"])
+            for pointer in batch.validated_data["pointers"]
+        )
+        return Response(status=status.HTTP_204_NO_CONTENT)
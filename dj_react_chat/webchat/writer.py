@@ -0,0 +1,139 @@
+# dj_react_chat\webchat\writer.py
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from .readstate import mark_read
+from .store import append_messages
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Persists messages in batches off the delivery path.
+
+    ``enqueue`` never waits for the database: messages are buffered and a background
+    task writes them with ``append_messages``, one transaction per batch, flushing
+    when a batch is full or when ``flush_interval`` seconds have passed since its
+    first message. A batch that fails is retried one message at a time, see
+    ``persist``.
+
+    Attributes:
+        batch_size (int): The maximum number of messages per insert.
+        flush_interval (float): The longest time a message waits to be written.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=0.05):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = None
+        self._task = None
+        self._loop = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    def enqueue(self, message):
+        """Buffer an unsaved ``Message`` to be written by the background task."""
+        self._ensure_started()
+        self._queue.put_nowait(message)
+
+    async def flush(self):
+        """Wait until every message enqueued so far has been written."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await database_sync_to_async(self.persist)(batch)
+            except Exception:
+                logger.exception("Failed to persist %d messages", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def persist(self, batch):
+        """
+        Write a batch, or each of its items on its own when the batch fails.
+
+        A batch is written in one transaction, so a single bad row (a deleted channel,
+        a duplicate id) rolls back the whole batch. Writing the items one by one
+        isolates it, only that row is dropped and logged.
+        """
+        try:
+            self.write(batch)
+            return
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("Failed to persist %r", batch[0])
+                return
+            logger.warning("Batch of %d failed, writing one by one", len(batch))
+        for item in batch:
+            try:
+                self.write([item])
+            except Exception:
+                logger.exception("Failed to persist %r", item)
+
+    def write(self, batch):
+        append_messages(batch)
+
+
+_writer = None
+
+
+def get_writer():
+    """Return the process-wide writer, built from the ``WEBCHAT_*`` settings."""
+    global _writer
+    if _writer is None:
+        _writer = MessageWriter(
+            batch_size=settings.WEBCHAT_WRITE_BATCH_SIZE,
+            flush_interval=settings.WEBCHAT_WRITE_FLUSH_INTERVAL,
+        )
+    return _writer
+
+
+class ReadMarker(MessageWriter):
+    """
+    Writes read pointers in batches, like ``MessageWriter`` writes messages.
+
+    A socket reports every message it displays, ``enqueue`` takes
+    ``(account_id, channel_id, message_id)`` triples and ``mark_read`` keeps only the
+    latest of each account and channel of a batch, so a busy channel costs one UPDATE
+    per reader and flush instead of one per message.
+    """
+
+    def write(self, batch):
+        mark_read(batch)
+
+
+_read_marker = None
+
+
+def get_read_marker():
+    """Return the process-wide read marker, built from the ``WEBCHAT_READ_*`` settings."""
+    global _read_marker
+    if _read_marker is None:
+        _read_marker = ReadMarker(
+            batch_size=settings.WEBCHAT_READ_BATCH_SIZE,
+            flush_interval=settings.WEBCHAT_READ_FLUSH_INTERVAL,
+        )
+    return _read_marker